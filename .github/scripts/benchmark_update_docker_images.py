@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Benchmark of DockerImageUpdater over synthetic values files, offline.
+
+Registry responses are generated into a fixture directory and replayed, so the
+numbers measure the updater itself: YAML loading, image discovery, version
+resolution and patching every image tag in place.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from registry_clients import save_fixture
+from update_docker_images import DockerImageUpdater
+
+
+DOCKER_HUB_URL = 'https://hub.docker.com'
+PAGE_SIZE = 100
+MIN_REGRESSION = 0.1
+
+
+def write_values_file(path: Path, images: int, repositories: int):
+    """Write a values file with `images` image blocks spread over nested components."""
+    lines = ['components:']
+    for i in range(images):
+        repository = f"bench/app{i % repositories}"
+        lines.extend([
+            f"  component{i}:",
+            "    enabled: true",
+            "    resources:",
+            "      limits:",
+            f"        memory: {64 + i % 8 * 64}Mi",
+        ])
+        if i % 4 == 0:
+            lines.append(f"    image: {repository}:1.{i % 10}.0")
+        else:
+            lines.extend([
+                "    image:",
+                f"      repository: {repository}",
+                f"      tag: \"1.{i % 10}.0\"",
+                "      pullPolicy: IfNotPresent",
+            ])
+    path.write_text('\n'.join(lines) + '\n')
+
+
+def write_registry_fixtures(fixtures_dir: Path, repositories: int, tags: int):
+    """Record Docker Hub tag pages (newest first) for every synthetic repository."""
+    names = [f"1.{tags - i}.0" for i in range(tags)]
+    for j in range(repositories):
+        url = f"{DOCKER_HUB_URL}/v2/repositories/bench/app{j}/tags"
+        params = {'page_size': PAGE_SIZE, 'ordering': 'last_updated'}
+        for page, start in enumerate(range(0, tags, PAGE_SIZE), 1):
+            next_url = None
+            if start + PAGE_SIZE < tags:
+                next_url = f"{url}?page_size={PAGE_SIZE}&ordering=last_updated&page={page + 1}"
+            body = json.dumps({
+                'count': tags,
+                'next': next_url,
+                'results': [{'name': name, 'last_updated': None} for name in names[start:start + PAGE_SIZE]]
+            })
+            save_fixture(fixtures_dir, url, 200, {'Content-Type': 'application/json'}, body, params)
+            url, params = next_url, None
+
+
+def run_once(values_path: Path, fixtures_dir: Path) -> Dict[str, float]:
+    """Time each updater phase once, with a fresh updater so no lookup is reused."""
+    updater = DockerImageUpdater(github_token='', dry_run=True, fixtures_dir=fixtures_dir)
+    updater.logger.setLevel(logging.WARNING)
+    timings = {}
+
+    start = time.perf_counter()
+    with open(values_path, 'r') as f:
+        content = f.read()
+    yaml_data = updater.yaml.load(content)
+    timings['load'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    images = updater.find_images_in_yaml(yaml_data)
+    timings['find_images'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    updater.resolve_latest_versions([(image['repository'], image['tag']) for image in images])
+    timings['resolve'] = time.perf_counter() - start
+
+    patches = []
+    for image in images:
+        if 'image_key' in image:
+            patches.append((image['position'], f"{image['repository']}:{image['tag']}", f"{image['repository']}:9.9.9"))
+        else:
+            patches.append((image['position'], image['tag'], '9.9.9'))
+    start = time.perf_counter()
+    updater.patch_scalars(content, patches)
+    timings['patch'] = time.perf_counter() - start
+
+    return timings
+
+
+def compare_with_baseline(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    """Return descriptions of phases slower than the baseline by more than `tolerance` times.
+
+    Phases taking milliseconds are noisy, differences under MIN_REGRESSION seconds are ignored.
+    """
+    regressions = []
+    for phase, seconds in results.items():
+        expected = baseline.get(phase)
+        if expected and seconds > max(expected * tolerance, expected + MIN_REGRESSION):
+            regressions.append(f"{phase}: {seconds:.3f}s, baseline {expected:.3f}s")
+    return regressions
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark DockerImageUpdater offline")
+    parser.add_argument('--images', type=int, default=5000, help="image references in the values file")
+    parser.add_argument('--repositories', type=int, default=500, help="distinct image repositories")
+    parser.add_argument('--tags', type=int, default=300, help="tags per repository")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per phase, the fastest one is reported")
+    parser.add_argument('--baseline', type=Path, help="fail if a phase is slower than in this results file")
+    parser.add_argument('--tolerance', type=float, default=3.0, help="allowed slowdown against the baseline")
+    parser.add_argument('--output', type=Path, help="write results as JSON, e.g. to update the baseline")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        values_path = tmp_path / 'values.yaml'
+        fixtures_dir = tmp_path / 'fixtures'
+        os.environ['DOCKER_TAG_CACHE'] = str(tmp_path / 'tags.json')
+
+        write_values_file(values_path, args.images, args.repositories)
+        write_registry_fixtures(fixtures_dir, args.repositories, args.tags)
+
+        runs = [run_once(values_path, fixtures_dir) for _ in range(args.repeat)]
+        results = {phase: min(run[phase] for run in runs) for phase in runs[0]}
+
+    print(f"{args.images} images, {args.repositories} repositories, {args.tags} tags each")
+    for phase, seconds in results.items():
+        print(f"  {phase:<12} {seconds:8.3f}s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({phase: round(seconds, 3) for phase, seconds in results.items()}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Slower than baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,656 @@
+"""Container registry clients used by update_docker_images.py to list image tags."""
+
+import abc
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+DOCKER_HUB_HOSTS = ('docker.io', 'index.docker.io', 'registry-1.docker.io')
+
+# Requests per second allowed for each registry
+DEFAULT_RATE_LIMITS = {
+    'docker.io': 5,
+    'registry-1.docker.io': 5,
+    'ghcr.io': 10,
+    'quay.io': 5,
+    'gcr.io': 10,
+}
+
+# Number of tags requested per page from each registry
+DEFAULT_PAGE_SIZES = {
+    'docker.io': 100,
+    'ghcr.io': 100,
+    'quay.io': 100,
+    'gcr.io': 1000,
+}
+DEFAULT_PAGE_SIZE = 100
+
+# Docker Hub serves the registry API (manifests, blobs) from a separate host
+DOCKER_HUB_REGISTRY = 'registry-1.docker.io'
+
+# Manifest lists and OCI indexes are preferred, single manifests are accepted too
+MANIFEST_MEDIA_TYPES = ', '.join([
+    'application/vnd.oci.image.index.v1+json',
+    'application/vnd.docker.distribution.manifest.list.v2+json',
+    'application/vnd.oci.image.manifest.v1+json',
+    'application/vnd.docker.distribution.manifest.v2+json',
+])
+
+
+class RateLimiter:
+    """Spaces out requests so that at most `rate` of them start per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def acquire(self):
+        """Block until the next request slot is available."""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class TagCache:
+    """On-disk cache of registry responses keyed by registry/repository and request URL.
+
+    Entries keep the ETag/Last-Modified validators of the response they came from,
+    so they can be revalidated with a conditional request on the next run.
+    """
+
+    def __init__(self, path: Path, logger: logging.Logger):
+        self.path = path
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+
+        if self.path.exists():
+            try:
+                with open(self.path, 'r') as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                self.logger.warning(f"Ignoring unreadable tag cache {self.path}: {e}")
+
+    def get(self, key: str, url: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry for a request URL of a repository."""
+        with self.lock:
+            return self.entries.get(key, {}).get(url)
+
+    def put(self, key: str, url: str, headers: Any, data: Any):
+        """Store response data together with its validators."""
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+
+        with self.lock:
+            self.entries.setdefault(key, {})[url] = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'data': data
+            }
+
+    def save(self):
+        """Write the cache to disk."""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.lock:
+                with open(self.path, 'w') as f:
+                    json.dump(self.entries, f)
+        except Exception as e:
+            self.logger.warning(f"Failed to save tag cache {self.path}: {e}")
+
+
+class RegistryHttp:
+    """HTTP access shared by all registry clients: pooled session, rate limits and tag cache."""
+
+    def __init__(self, logger: logging.Logger, cache: TagCache, timeout: int = 30, pool_size: int = 8,
+                 rate_limits: Optional[Dict[str, float]] = None, metrics: Optional[Any] = None):
+        self.logger = logger
+        self.cache = cache
+        self.timeout = timeout
+        self.metrics = metrics
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        limits = DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits
+        self.rate_limiters = {registry: RateLimiter(rate) for registry, rate in limits.items()}
+
+    def request(self, method: str, registry: str, url: str, **kwargs) -> requests.Response:
+        """Send a request through the shared session, respecting the registry rate limit."""
+        limiter = self.rate_limiters.get(registry)
+        if limiter:
+            limiter.acquire()
+        response = self._send(method, registry, url, **kwargs)
+        if self.metrics is not None:
+            self.metrics.record_request(registry, method, response)
+        return response
+
+    def _send(self, method: str, registry: str, url: str, **kwargs) -> requests.Response:
+        """Perform the request."""
+        return self.session.request(method, url, timeout=self.timeout, **kwargs)
+
+    def get(self, registry: str, url: str, **kwargs) -> requests.Response:
+        """Send a GET request."""
+        return self.request('GET', registry, url, **kwargs)
+
+    def head(self, registry: str, url: str, **kwargs) -> requests.Response:
+        """Send a HEAD request."""
+        return self.request('HEAD', registry, url, **kwargs)
+
+    def get_json_cached(self, registry: str, cache_key: str, url: str, extract: Callable[[requests.Response], Any],
+                        params: Optional[Dict] = None, headers: Optional[Dict] = None) -> Any:
+        """GET a resource, revalidating a cached copy with a conditional request.
+
+        `extract` reduces the response to the data worth caching.
+        """
+        request_url = requests.Request('GET', url, params=params).prepare().url
+        request_headers = dict(headers or {})
+
+        cached = self.cache.get(cache_key, request_url)
+        if cached:
+            if cached.get('etag'):
+                request_headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                request_headers['If-Modified-Since'] = cached['last_modified']
+
+        response = self.get(registry, request_url, headers=request_headers)
+        if response.status_code == 304 and cached:
+            self.logger.debug(f"Not modified: {request_url}")
+            return cached['data']
+        response.raise_for_status()
+
+        data = extract(response)
+        self.cache.put(cache_key, request_url, response.headers, data)
+        return data
+
+
+def fixture_path(fixtures_dir: Path, url: str, params: Optional[Dict] = None, method: str = 'GET') -> Path:
+    """Return the file a recorded response for a request is kept in."""
+    request_url = requests.Request('GET', url, params=params).prepare().url
+    key = request_url if method == 'GET' else f"{method} {request_url}"
+    return fixtures_dir / f"{hashlib.sha256(key.encode()).hexdigest()[:24]}.json"
+
+
+def save_fixture(fixtures_dir: Path, url: str, status: int, headers: Dict[str, str], body: str,
+                 params: Optional[Dict] = None, method: str = 'GET'):
+    """Write a registry response in the format ReplayRegistryHttp serves."""
+    fixtures_dir.mkdir(parents=True, exist_ok=True)
+    with open(fixture_path(fixtures_dir, url, params, method), 'w') as f:
+        json.dump({
+            'method': method,
+            'url': requests.Request('GET', url, params=params).prepare().url,
+            'status': status,
+            'headers': {key: value for key, value in headers.items() if key.lower() != 'set-cookie'},
+            'body': body
+        }, f, indent=2)
+
+
+class RecordingRegistryHttp(RegistryHttp):
+    """Records every registry response into a fixture directory for later offline runs."""
+
+    def __init__(self, logger: logging.Logger, cache: TagCache, fixtures_dir: Path, **kwargs):
+        super().__init__(logger, cache, **kwargs)
+        self.fixtures_dir = fixtures_dir
+
+    def _send(self, method: str, registry: str, url: str, **kwargs) -> requests.Response:
+        """Send the request without cache validators, so the full response gets recorded."""
+        headers = {key: value for key, value in (kwargs.pop('headers', None) or {}).items()
+                   if key not in ('If-None-Match', 'If-Modified-Since')}
+        response = super()._send(method, registry, url, headers=headers, **kwargs)
+        save_fixture(self.fixtures_dir, url, response.status_code, dict(response.headers), response.text,
+                     kwargs.get('params'), method)
+        return response
+
+
+class ReplayRegistryHttp(RegistryHttp):
+    """Serves recorded registry responses from a fixture directory without touching the network.
+
+    Requests without a recorded response get 404.
+    """
+
+    def __init__(self, logger: logging.Logger, cache: TagCache, fixtures_dir: Path, **kwargs):
+        kwargs.setdefault('rate_limits', {})
+        super().__init__(logger, cache, **kwargs)
+        self.fixtures_dir = fixtures_dir
+
+    def _send(self, method: str, registry: str, url: str, **kwargs) -> requests.Response:
+        """Return the recorded response for a request."""
+        path = fixture_path(self.fixtures_dir, url, kwargs.get('params'), method)
+        response = requests.Response()
+        response.url = requests.Request('GET', url, params=kwargs.get('params')).prepare().url
+
+        if not path.exists():
+            self.logger.debug(f"No recorded response for {response.url}")
+            response.status_code = 404
+            response.reason = 'Not Found'
+            response._content = b''
+            return response
+
+        with open(path, 'r') as f:
+            recorded = json.load(f)
+        response.status_code = recorded['status']
+        response.reason = 'Recorded'
+        response.headers = CaseInsensitiveDict(recorded['headers'])
+        response._content = recorded['body'].encode()
+        response.encoding = 'utf-8'
+        return response
+
+
+class RegistryClient(abc.ABC):
+    """Lists tags of repositories in one registry."""
+
+    registry = ''
+
+    def __init__(self, http: RegistryHttp, page_size: int = DEFAULT_PAGE_SIZE, page_workers: int = 4):
+        self.http = http
+        self.logger = http.logger
+        self.page_size = page_size
+        self.page_workers = page_workers
+
+    @abc.abstractmethod
+    def list_tags(self, repository: str, until: Optional[str] = None) -> List[str]:
+        """Return tags of a repository given without the registry host.
+
+        `until` is the tag currently in use, clients listing tags newest first may stop once they reach it.
+        """
+
+    def _fetch_pages(self, fetch_page: Callable[[int], List[str]], pages: range) -> List[str]:
+        """Fetch numbered pages concurrently, keeping their order.
+
+        Each page gets a span under the span of the caller, the worker threads have none of their own.
+        """
+        metrics = self.http.metrics
+        parent = metrics.current_span() if metrics is not None else None
+
+        def fetch(page: int) -> List[str]:
+            if metrics is None:
+                return fetch_page(page)
+            with metrics.span('tag_page', parent=parent, registry=self.registry, page=page):
+                return fetch_page(page)
+
+        with ThreadPoolExecutor(max_workers=self.page_workers) as executor:
+            return [tag for page in executor.map(fetch, pages) for tag in page]
+
+
+class DockerHubClient(RegistryClient):
+    """Docker Hub repositories API."""
+
+    registry = 'docker.io'
+
+    def __init__(self, http: RegistryHttp, page_size: int = DEFAULT_PAGE_SIZE, limit: int = 200,
+                 base_url: str = 'https://hub.docker.com'):
+        super().__init__(http, page_size)
+        self.limit = limit
+        self.base_url = base_url
+
+    def iter_tag_pages(self, repository: str) -> Iterator[List[Dict[str, Any]]]:
+        """Yield pages of tags (name, last_updated), most recently pushed first."""
+        repo_path = repository if '/' in repository else f"library/{repository}"
+        url = f"{self.base_url}/v2/repositories/{repo_path}/tags"
+        params = {'page_size': self.page_size, 'ordering': 'last_updated'}
+
+        while url:
+            self.logger.debug(f"Fetching Docker Hub tags for {repository}")
+            page = self.http.get_json_cached(
+                self.registry, f"docker.io/{repo_path}", url,
+                lambda response: {
+                    'tags': [
+                        {'name': tag['name'], 'last_updated': tag.get('last_updated')}
+                        for tag in response.json().get('results', [])
+                    ],
+                    'next': response.json().get('next')
+                },
+                params=params)
+            yield page['tags']
+
+            url = page['next']
+            params = None  # next URL already carries the query
+
+    def list_tags(self, repository: str, until: Optional[str] = None) -> List[str]:
+        """Fetch limited tags from Docker Hub API, newest first.
+
+        Paging stops after the page containing tag `until` (the current tag), tags
+        on later pages were pushed before it and cannot be newer releases.
+        """
+        try:
+            all_tags = []
+            for page in self.iter_tag_pages(repository):
+                names = [tag['name'] for tag in page]
+                all_tags.extend(names)
+                if len(all_tags) >= self.limit or (until and until in names):
+                    break
+
+            self.logger.info(f"Found {len(all_tags)} tags for {repository}")
+            return all_tags[:self.limit]
+
+        except Exception as e:
+            self.logger.error(f"Failed to fetch Docker Hub tags for {repository}: {e}")
+            return []
+
+
+class GhcrClient(RegistryClient):
+    """GitHub Container Registry through the GitHub packages API, with release tags as fallback."""
+
+    registry = 'ghcr.io'
+
+    def __init__(self, http: RegistryHttp, github_token: str, github: Any, page_size: int = DEFAULT_PAGE_SIZE,
+                 max_pages: int = 10, base_url: str = 'https://api.github.com'):
+        super().__init__(http, page_size)
+        self.github_token = github_token
+        self.github = github
+        self.max_pages = max_pages
+        self.base_url = base_url
+
+    def list_tags(self, repository: str, until: Optional[str] = None) -> List[str]:
+        """Fetch tags from GitHub Container Registry."""
+        try:
+            parts = repository.split('/')
+            if len(parts) < 2:
+                return []
+
+            owner = parts[0]
+            package_name = '/'.join(parts[1:])
+
+            tags = self._get_api_tags(owner, package_name)
+            if tags:
+                return tags
+
+            return self._get_release_tags(owner, parts[1])
+
+        except Exception as e:
+            self.logger.error(f"Failed to fetch GHCR tags for {repository}: {e}")
+            return []
+
+    def _get_api_tags(self, owner: str, package_name: str) -> List[str]:
+        """Get tags from GHCR API, pages after the first one concurrently."""
+        headers = {
+            'Authorization': f'token {self.github_token}',
+            'Accept': 'application/vnd.github.v3+json'
+        }
+
+        def extract(response: requests.Response) -> Dict[str, Any]:
+            last_url = response.links.get('last', {}).get('url', '')
+            last_page = re.search(r'[?&]page=(\d+)', last_url)
+            return {
+                'tags': [
+                    tag
+                    for version_info in response.json()
+                    for tag in version_info.get('metadata', {}).get('container', {}).get('tags') or []
+                ],
+                'last_page': int(last_page.group(1)) if last_page else 1
+            }
+
+        urls_to_try = [
+            f"{self.base_url}/orgs/{owner}/packages/container/{package_name}/versions",
+            f"{self.base_url}/users/{owner}/packages/container/{package_name}/versions"
+        ]
+
+        for url in urls_to_try:
+            def fetch_page(page: int) -> Dict[str, Any]:
+                return self.http.get_json_cached(
+                    self.registry, f"ghcr.io/{owner}/{package_name}", url, extract,
+                    params={'per_page': self.page_size, 'page': page}, headers=headers)
+
+            try:
+                first_page = fetch_page(1)
+            except Exception as e:
+                self.logger.debug(f"GHCR API failed for {url}: {e}")
+                continue
+
+            page_count = min(first_page['last_page'], self.max_pages)
+            return first_page['tags'] + self._fetch_pages(
+                lambda page: fetch_page(page)['tags'], range(2, page_count + 1))
+
+        return []
+
+    def _get_release_tags(self, owner: str, repo_name: str) -> List[str]:
+        """Get tags from GitHub releases as fallback."""
+        try:
+            releases_repo = self.github.get_repo(f"{owner}/{repo_name}")
+            releases = releases_repo.get_releases()
+            tags = [release.tag_name for release in releases[:50]]
+            self.logger.info(f"Found {len(tags)} release tags for {owner}/{repo_name}")
+            return tags
+
+        except Exception as e:
+            self.logger.debug(f"GitHub releases failed for {owner}/{repo_name}: {e}")
+            return []
+
+
+class OciRegistryClient(RegistryClient):
+    """Any registry implementing the OCI Distribution API (/v2/<name>/tags/list).
+
+    Pages are followed through the `Link` header, which makes them sequential.
+    Anonymous bearer tokens are requested when the registry challenges with 401.
+    """
+
+    def __init__(self, http: RegistryHttp, host: str, page_size: int = DEFAULT_PAGE_SIZE, max_pages: int = 50,
+                 scheme: str = 'https'):
+        super().__init__(http, page_size)
+        self.registry = host
+        self.max_pages = max_pages
+        self.scheme = scheme
+        self.tokens: Dict[str, str] = {}
+        self.tokens_lock = threading.Lock()
+
+    def list_tags(self, repository: str, until: Optional[str] = None) -> List[str]:
+        """Fetch tags following `Link: <...>; rel="next"` pagination."""
+        try:
+            url = f"{self.scheme}://{self.registry}/v2/{repository}/tags/list"
+            params = {'n': self.page_size}
+            all_tags = []
+
+            for _ in range(self.max_pages):
+                page = self._get_page(repository, url, params)
+                all_tags.extend(page['tags'])
+                url = page['next']
+                params = None
+                if not url:
+                    break
+
+            self.logger.info(f"Found {len(all_tags)} tags for {self.registry}/{repository}")
+            return all_tags
+
+        except Exception as e:
+            self.logger.error(f"Failed to fetch tags for {self.registry}/{repository}: {e}")
+            return []
+
+    def get_manifest(self, repository: str, reference: str) -> Optional[Dict[str, Any]]:
+        """Resolve a tag to its manifest (list) digest and the `os/architecture` platforms it provides.
+
+        A HEAD request tells whether the digest is still the cached one, only manifests
+        that changed are downloaded again. Returns None if the tag cannot be resolved.
+        """
+        url = f"{self.scheme}://{self.registry}/v2/{repository}/manifests/{reference}"
+        cache_key = f"{self.registry}/{repository}"
+        headers = {'Accept': MANIFEST_MEDIA_TYPES}
+
+        try:
+            cached = self.http.cache.get(cache_key, url)
+            if cached:
+                try:
+                    response = self._send('HEAD', repository, url, headers=headers)
+                    if response.headers.get('Docker-Content-Digest') == cached['data']['digest']:
+                        return cached['data']
+                except requests.RequestException as e:
+                    self.logger.debug(f"HEAD {url} failed, downloading the manifest: {e}")
+
+            response = self._send('GET', repository, url, headers=headers)
+            manifest = response.json()
+            digest = response.headers.get('Docker-Content-Digest') or f"sha256:{hashlib.sha256(response.content).hexdigest()}"
+            platforms = [
+                f"{entry['platform'].get('os')}/{entry['platform'].get('architecture')}"
+                for entry in manifest.get('manifests', [])
+                if entry.get('platform')
+            ]
+
+            # A single image manifest names its platform in the config blob
+            config_digest = manifest.get('config', {}).get('digest')
+            if not manifest.get('manifests') and config_digest:
+                config = self._send('GET', repository,
+                                    f"{self.scheme}://{self.registry}/v2/{repository}/blobs/{config_digest}").json()
+                platforms = [f"{config.get('os')}/{config.get('architecture')}"]
+
+            data = {'digest': digest, 'platforms': sorted(set(platforms))}
+            self.http.cache.put(cache_key, url, {'ETag': digest}, data)
+            return data
+
+        except Exception as e:
+            self.logger.warning(f"Failed to resolve manifest {self.registry}/{repository}:{reference}: {e}")
+            return None
+
+    def _send(self, method: str, repository: str, url: str, headers: Optional[Dict] = None) -> requests.Response:
+        """Send a request, authenticating once the registry asks for it or the cached token expired."""
+        headers = dict(headers or {})
+        token = self.tokens.get(repository)
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+
+        response = self.http.request(method, self.registry, url, headers=headers)
+        if response.status_code == 401:
+            self._drop_token(repository, token)
+            token = self._fetch_token(repository, response.headers.get('WWW-Authenticate', ''))
+            headers['Authorization'] = f'Bearer {token}'
+            response = self.http.request(method, self.registry, url, headers=headers)
+
+        response.raise_for_status()
+        return response
+
+    def _get_page(self, repository: str, url: str, params: Optional[Dict]) -> Dict[str, Any]:
+        """Get one page of tags, authenticating once the registry asks for it or the cached token expired."""
+        def extract(response: requests.Response) -> Dict[str, Any]:
+            next_url = response.links.get('next', {}).get('url')
+            return {
+                'tags': response.json().get('tags') or [],
+                'next': urljoin(response.url, next_url) if next_url else None
+            }
+
+        cache_key = f"{self.registry}/{repository}"
+        token = self.tokens.get(repository)
+        headers = {'Authorization': f'Bearer {token}'} if token else None
+        try:
+            return self.http.get_json_cached(self.registry, cache_key, url, extract, params=params, headers=headers)
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 401:
+                raise
+            self._drop_token(repository, token)
+            token = self._fetch_token(repository, e.response.headers.get('WWW-Authenticate', ''))
+            headers = {'Authorization': f'Bearer {token}'}
+            return self.http.get_json_cached(self.registry, cache_key, url, extract, params=params, headers=headers)
+
+    def _drop_token(self, repository: str, token: Optional[str]):
+        """Forget a token the registry rejected, anonymous tokens expire after a few minutes."""
+        with self.tokens_lock:
+            if token and self.tokens.get(repository) == token:
+                del self.tokens[repository]
+
+    def _fetch_token(self, repository: str, challenge: str) -> str:
+        """Request a pull token from the realm named in a `WWW-Authenticate: Bearer ...` challenge."""
+        if not challenge.lower().startswith('bearer '):
+            raise ValueError(f"Unsupported authentication challenge from {self.registry}: {challenge}")
+
+        fields = dict(re.findall(r'(\w+)="([^"]*)"', challenge))
+        params = {'scope': fields.get('scope', f"repository:{repository}:pull")}
+        if 'service' in fields:
+            params['service'] = fields['service']
+
+        response = self.http.get(self.registry, fields['realm'], params=params)
+        response.raise_for_status()
+        data = response.json()
+        token = data.get('token') or data.get('access_token')
+
+        with self.tokens_lock:
+            self.tokens[repository] = token
+        return token
+
+
+def split_image_reference(repository: str) -> Tuple[Optional[str], str]:
+    """Split an image repository into registry host (None for Docker Hub) and repository name.
+
+    Like Docker, the first path component is a host only if it contains '.' or ':' or is 'localhost'.
+    """
+    clean_repo = repository.strip()
+    for prefix in ('https://', 'http://'):
+        if clean_repo.startswith(prefix):
+            clean_repo = clean_repo[len(prefix):]
+
+    first, _, rest = clean_repo.partition('/')
+    if rest and ('.' in first or ':' in first or first == 'localhost'):
+        host = None if first in DOCKER_HUB_HOSTS else first
+        return host, rest
+    return None, clean_repo
+
+
+class RegistryClients:
+    """Picks the client for an image repository, one client per registry host."""
+
+    def __init__(self, http: RegistryHttp, github_token: str, github: Any,
+                 page_sizes: Optional[Dict[str, int]] = None, insecure_hosts: Tuple[str, ...] = ()):
+        self.http = http
+        self.page_sizes = DEFAULT_PAGE_SIZES if page_sizes is None else page_sizes
+        self.insecure_hosts = insecure_hosts
+        self.clients: Dict[str, RegistryClient] = {
+            'docker.io': DockerHubClient(http, self.page_size('docker.io')),
+            'ghcr.io': GhcrClient(http, github_token, github, self.page_size('ghcr.io')),
+        }
+        self.manifest_clients: Dict[str, OciRegistryClient] = {}
+        self.lock = threading.Lock()
+
+    def page_size(self, registry: str) -> int:
+        """Return the page size configured for a registry."""
+        return self.page_sizes.get(registry, DEFAULT_PAGE_SIZE)
+
+    def resolve(self, repository: str) -> Tuple[RegistryClient, str]:
+        """Return the client serving a repository and the repository name within that registry."""
+        host, name = split_image_reference(repository)
+        registry = host or 'docker.io'
+
+        with self.lock:
+            client = self.clients.get(registry)
+            if client is None:
+                scheme = 'http' if registry in self.insecure_hosts else 'https'
+                client = OciRegistryClient(self.http, registry, self.page_size(registry), scheme=scheme)
+                self.clients[registry] = client
+
+        return client, name
+
+    def resolve_manifests(self, repository: str) -> Tuple[OciRegistryClient, str]:
+        """Return the registry API client serving manifests of a repository and the name to use with it.
+
+        Docker Hub and GHCR list tags through their own APIs, manifests always come from the registry API.
+        """
+        host, name = split_image_reference(repository)
+        if host is None:
+            host = DOCKER_HUB_REGISTRY
+            if '/' not in name:
+                name = f"library/{name}"
+
+        with self.lock:
+            client = self.clients.get(host)
+            if not isinstance(client, OciRegistryClient):
+                client = self.manifest_clients.get(host)
+            if client is None:
+                scheme = 'http' if host in self.insecure_hosts else 'https'
+                client = OciRegistryClient(self.http, host, self.page_size(host), scheme=scheme)
+                self.manifest_clients[host] = client
+
+        return client, name
@@ -0,0 +1,201 @@
+"""Timing spans and API call statistics of an update_docker_images.py run."""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+import requests
+
+
+# Response headers describing rate limits: Docker Hub (RateLimit-*), GitHub (X-RateLimit-*)
+RATE_LIMIT_HEADERS = (
+    'ratelimit-limit',
+    'ratelimit-remaining',
+    'ratelimit-reset',
+    'x-ratelimit-limit',
+    'x-ratelimit-remaining',
+    'x-ratelimit-reset',
+    'x-ratelimit-used',
+)
+
+
+class RunMetrics:
+    """Collects spans (phases with duration and request counts) and per-registry API statistics.
+
+    Spans nest per thread, work handed to other threads names its parent span explicitly.
+    """
+
+    def __init__(self, service_name: str = 'docker-image-updater'):
+        self.service_name = service_name
+        self.trace_id = os.urandom(16).hex()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.spans: List[Dict[str, Any]] = []
+        self.registries: Dict[str, Dict[str, Any]] = {}
+
+    def current_span(self) -> Optional[Dict[str, Any]]:
+        """Return the innermost open span of the calling thread."""
+        stack = getattr(self.local, 'stack', None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Dict[str, Any]] = None, **attributes) -> Iterator[Dict[str, Any]]:
+        """Record the duration of a block, requests sent from it are counted on the span."""
+        parent = parent or self.current_span()
+        span = {
+            'name': name,
+            'span_id': os.urandom(8).hex(),
+            'parent_span_id': parent['span_id'] if parent else '',
+            'start_time_unix_nano': time.time_ns(),
+            'attributes': dict(attributes),
+            'requests': 0,
+            'bytes': 0,
+        }
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        self.local.stack.append(span)
+        start = time.perf_counter()
+
+        try:
+            yield span
+        except Exception as e:
+            span['error'] = str(e)
+            raise
+        finally:
+            span['duration_seconds'] = time.perf_counter() - start
+            span['end_time_unix_nano'] = span['start_time_unix_nano'] + int(span['duration_seconds'] * 1e9)
+            self.local.stack.pop()
+            with self.lock:
+                self.spans.append(span)
+
+    def record_request(self, registry: str, method: str, response: requests.Response):
+        """Count a registry response, its size, time and rate limit headers."""
+        size = 0 if method == 'HEAD' else len(response.content or b'')
+        with self.lock:
+            stats = self._registry_stats(registry)
+            stats['requests'] += 1
+            stats['bytes'] += size
+            stats['seconds'] += response.elapsed.total_seconds() if response.elapsed else 0.0
+            status = str(response.status_code)
+            stats['status_codes'][status] = stats['status_codes'].get(status, 0) + 1
+            for key, value in response.headers.items():
+                if key.lower() in RATE_LIMIT_HEADERS:
+                    stats['rate_limit'][key.lower()] = value
+
+        span = self.current_span()
+        if span:
+            span['requests'] += 1
+            span['bytes'] += size
+
+    def record_request_count(self, registry: str, count: int):
+        """Count requests of a client library whose responses are not seen, their size stays unknown."""
+        with self.lock:
+            self._registry_stats(registry)['requests'] += count
+
+        span = self.current_span()
+        if span:
+            span['requests'] += count
+
+    def record_rate_limit(self, registry: str, remaining: int, limit: int):
+        """Store a rate limit reported by a client library instead of response headers."""
+        with self.lock:
+            stats = self._registry_stats(registry)
+            stats['rate_limit'].update({'x-ratelimit-remaining': str(remaining), 'x-ratelimit-limit': str(limit)})
+
+    def _registry_stats(self, registry: str) -> Dict[str, Any]:
+        """Statistics entry of a registry, callers hold the lock."""
+        return self.registries.setdefault(registry, {
+            'requests': 0,
+            'bytes': 0,
+            'seconds': 0.0,
+            'status_codes': {},
+            'rate_limit': {}
+        })
+
+    def phase_durations(self) -> Dict[str, float]:
+        """Total seconds spent per span name."""
+        durations: Dict[str, float] = {}
+        with self.lock:
+            for span in self.spans:
+                durations[span['name']] = durations.get(span['name'], 0.0) + span['duration_seconds']
+        return durations
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Spans in start order and registry statistics, for the changes JSON."""
+        with self.lock:
+            spans = sorted(self.spans, key=lambda span: span['start_time_unix_nano'])
+            return {
+                'trace_id': self.trace_id,
+                'spans': [dict(span) for span in spans],
+                'registries': json.loads(json.dumps(self.registries))
+            }
+
+    def to_otlp_json(self) -> Dict[str, Any]:
+        """Spans as an OTLP-JSON trace, registry statistics become events of the root spans."""
+        data = self.to_dict()
+        registry_events = [
+            {
+                'timeUnixNano': str(time.time_ns()),
+                'name': 'registry.stats',
+                'attributes': _otlp_attributes({
+                    'registry': registry,
+                    'http.requests': stats['requests'],
+                    'http.response_bytes': stats['bytes'],
+                    'http.seconds': stats['seconds'],
+                    **{f"http.{key}": value for key, value in stats['rate_limit'].items()}
+                })
+            }
+            for registry, stats in data['registries'].items()
+        ]
+
+        spans = []
+        for span in data['spans']:
+            otlp_span = {
+                'traceId': self.trace_id,
+                'spanId': span['span_id'],
+                'parentSpanId': span['parent_span_id'],
+                'name': span['name'],
+                'kind': 1,
+                'startTimeUnixNano': str(span['start_time_unix_nano']),
+                'endTimeUnixNano': str(span['end_time_unix_nano']),
+                'attributes': _otlp_attributes({
+                    **span['attributes'],
+                    'http.requests': span['requests'],
+                    'http.response_bytes': span['bytes']
+                }),
+                'status': {'code': 2, 'message': span['error']} if 'error' in span else {'code': 1}
+            }
+            if not span['parent_span_id']:
+                otlp_span['events'] = registry_events
+            spans.append(otlp_span)
+
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': _otlp_attributes({'service.name': self.service_name})},
+                'scopeSpans': [{'scope': {'name': 'update_docker_images'}, 'spans': spans}]
+            }]
+        }
+
+    def write_otlp_json(self, path: Path):
+        """Write the OTLP-JSON trace as one line, the format of the collector file exporter."""
+        with open(path, 'w') as f:
+            f.write(json.dumps(self.to_otlp_json()) + '\n')
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Encode attributes as OTLP-JSON key/value pairs."""
+    encoded = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            encoded_value = {'boolValue': value}
+        elif isinstance(value, int):
+            encoded_value = {'intValue': str(value)}
+        elif isinstance(value, float):
+            encoded_value = {'doubleValue': value}
+        else:
+            encoded_value = {'stringValue': str(value)}
+        encoded.append({'key': key, 'value': encoded_value})
+    return encoded
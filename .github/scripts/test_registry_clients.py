@@ -0,0 +1,210 @@
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from registry_clients import DockerHubClient, OciRegistryClient, RegistryClients, RegistryHttp, TagCache, split_image_reference
+from run_metrics import RunMetrics
+
+
+TAGS = [f"1.{minor}.0" for minor in range(7)]
+TOKEN = 'stub-token'
+MANIFEST_DIGEST = 'sha256:0123456789abcdef'
+
+
+class StubRegistryHandler(BaseHTTPRequestHandler):
+    """OCI Distribution tags/list with bearer token auth and Link pagination."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    def do_GET(self, head=False):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.server.requests.append(f'HEAD {self.path}' if head else self.path)
+
+        if url.path.startswith('/v2/repositories/'):
+            self._send_hub_page(query)
+            return
+
+        if url.path == '/token':
+            self._send_json({'token': TOKEN})
+            return
+
+        if self.headers.get('Authorization') != f'Bearer {TOKEN}':
+            self.send_response(401)
+            self.send_header('WWW-Authenticate',
+                             f'Bearer realm="http://{self.headers["Host"]}/token",service="stub",scope="repository:team/app:pull"')
+            self.end_headers()
+            return
+
+        if '/manifests/' in url.path:
+            self._send_manifest_index(head)
+            return
+
+        page_size = int(query.get('n', ['100'])[0])
+        last = query.get('last', [None])[0]
+        start = TAGS.index(last) + 1 if last else 0
+        page = TAGS[start:start + page_size]
+        headers = {}
+        if start + page_size < len(TAGS):
+            headers['Link'] = f'</v2/team/app/tags/list?n={page_size}&last={page[-1]}>; rel="next"'
+        self._send_json({'name': 'team/app', 'tags': page}, headers)
+
+    def _send_hub_page(self, query):
+        # Docker Hub ordering=last_updated lists the most recently pushed tags first
+        page_size = int(query['page_size'][0])
+        page = int(query.get('page', ['1'])[0])
+        tags = list(reversed(TAGS))
+        start = (page - 1) * page_size
+        data = {
+            'count': len(tags),
+            'results': [{'name': tag, 'last_updated': f'2024-01-0{len(TAGS) - i}T00:00:00Z'}
+                        for i, tag in enumerate(tags[start:start + page_size], start)],
+            'next': None
+        }
+        if start + page_size < len(tags):
+            data['next'] = (f'http://{self.headers["Host"]}/v2/repositories/team/app/tags'
+                            f'?page_size={page_size}&ordering=last_updated&page={page + 1}')
+        self._send_json(data)
+
+    def _send_manifest_index(self, head):
+        body = json.dumps({
+            'mediaType': 'application/vnd.oci.image.index.v1+json',
+            'manifests': [{'digest': f'sha256:{arch}', 'platform': {'os': 'linux', 'architecture': arch}}
+                          for arch in ('amd64', 'arm64')]
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/vnd.oci.image.index.v1+json')
+        self.send_header('Docker-Content-Digest', MANIFEST_DIGEST)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _send_json(self, data, headers=None):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def stub_registry():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubRegistryHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def registry_http(tmp_path):
+    logger = logging.getLogger('test_registry_clients')
+    return RegistryHttp(logger, TagCache(tmp_path / 'tags.json', logger), timeout=5, rate_limits={})
+
+
+def test_oci_client_follows_link_pagination_with_token_auth(stub_registry, registry_http):
+    host = f'127.0.0.1:{stub_registry.server_address[1]}'
+    client = OciRegistryClient(registry_http, host, page_size=3, scheme='http')
+
+    assert client.list_tags('team/app') == TAGS
+    assert sum(1 for path in stub_registry.requests if path.startswith('/token')) == 1
+
+
+def test_oci_client_replaces_expired_token(stub_registry, registry_http):
+    host = f'127.0.0.1:{stub_registry.server_address[1]}'
+    client = OciRegistryClient(registry_http, host, page_size=3, scheme='http')
+    client.tokens['team/app'] = 'expired-token'
+
+    assert client.list_tags('team/app') == TAGS
+    assert client.tokens['team/app'] == TOKEN
+
+    client.tokens['team/app'] = 'expired-token'
+    assert client.get_manifest('team/app', '1.0.0')['digest'] == MANIFEST_DIGEST
+    assert sum(1 for path in stub_registry.requests if path.startswith('/token')) == 2
+
+
+def test_docker_hub_client_stops_paging_at_current_tag(stub_registry, registry_http):
+    base_url = f'http://127.0.0.1:{stub_registry.server_address[1]}'
+    client = DockerHubClient(registry_http, page_size=2, base_url=base_url)
+
+    assert client.list_tags('team/app', until='1.4.0') == ['1.6.0', '1.5.0', '1.4.0', '1.3.0']
+    assert len(stub_registry.requests) == 2
+    assert 'ordering=last_updated' in stub_registry.requests[0]
+
+    assert client.list_tags('team/app') == list(reversed(TAGS))
+
+
+def test_pages_fetched_concurrently_are_counted_under_the_calling_span(stub_registry, registry_http):
+    base_url = f'http://127.0.0.1:{stub_registry.server_address[1]}'
+    client = DockerHubClient(registry_http, page_size=2, base_url=base_url)
+    registry_http.metrics = metrics = RunMetrics()
+
+    def fetch_page(page):
+        params = {'page_size': 2, 'ordering': 'last_updated', 'page': page}
+        response = registry_http.request('GET', 'docker.io', f'{base_url}/v2/repositories/team/app/tags', params=params)
+        return [tag['name'] for tag in response.json()['results']]
+
+    with metrics.span('tag_fetch') as parent:
+        assert client._fetch_pages(fetch_page, range(2, 5)) == ['1.4.0', '1.3.0', '1.2.0', '1.1.0', '1.0.0']
+
+    pages = [span for span in metrics.spans if span['name'] == 'tag_page']
+    assert sorted(span['attributes']['page'] for span in pages) == [2, 3, 4]
+    assert all(span['parent_span_id'] == parent['span_id'] and span['requests'] == 1 for span in pages)
+    assert metrics.registries['docker.io']['requests'] == 3
+
+def test_registry_clients_route_hosts(stub_registry, registry_http):
+    host = f'127.0.0.1:{stub_registry.server_address[1]}'
+    clients = RegistryClients(registry_http, 'token', github=None, insecure_hosts=(host,))
+
+    client, name = clients.resolve(f'{host}/team/app')
+
+    assert isinstance(client, OciRegistryClient)
+    assert name == 'team/app'
+    assert client.list_tags(name) == TAGS
+    assert clients.resolve('busybox')[0].registry == 'docker.io'
+    assert clients.resolve('ghcr.io/open-telemetry/opentelemetry-operator/opentelemetry-operator')[0].registry == 'ghcr.io'
+
+
+def test_oci_client_resolves_manifest_and_revalidates_it_with_head(stub_registry, registry_http):
+    host = f'127.0.0.1:{stub_registry.server_address[1]}'
+    client = OciRegistryClient(registry_http, host, scheme='http')
+
+    expected = {'digest': MANIFEST_DIGEST, 'platforms': ['linux/amd64', 'linux/arm64']}
+    assert client.get_manifest('team/app', '1.0.0') == expected
+    assert client.get_manifest('team/app', '1.0.0') == expected
+
+    manifest_requests = [path for path in stub_registry.requests if '/manifests/' in path]
+    assert manifest_requests == ['/v2/team/app/manifests/1.0.0', '/v2/team/app/manifests/1.0.0',
+                                 'HEAD /v2/team/app/manifests/1.0.0']
+
+
+def test_manifests_of_docker_hub_images_come_from_the_registry_api(registry_http):
+    clients = RegistryClients(registry_http, 'token', github=None)
+
+    client, name = clients.resolve_manifests('busybox')
+
+    assert (client.registry, name) == ('registry-1.docker.io', 'library/busybox')
+
+
+@pytest.mark.parametrize('repository, expected', [
+    ('busybox', (None, 'busybox')),
+    ('solarwinds/swo-agent', (None, 'solarwinds/swo-agent')),
+    ('docker.io/grafana/beyla', (None, 'grafana/beyla')),
+    ('quay.io/prometheus/node-exporter', ('quay.io', 'prometheus/node-exporter')),
+    ('localhost:5000/app', ('localhost:5000', 'app')),
+    ('https://ghcr.io/owner/pkg', ('ghcr.io', 'owner/pkg')),
+])
+def test_split_image_reference(repository, expected):
+    assert split_image_reference(repository) == expected
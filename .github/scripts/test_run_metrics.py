@@ -0,0 +1,58 @@
+import threading
+
+import requests
+
+from run_metrics import RunMetrics
+
+
+def response(status=200, body=b'{}', headers=None):
+    result = requests.Response()
+    result.status_code = status
+    result._content = body
+    result.headers.update(headers or {})
+    return result
+
+
+def test_spans_nest_and_count_requests_across_threads():
+    metrics = RunMetrics()
+
+    with metrics.span('run') as run:
+        parent = metrics.current_span()
+
+        def fetch():
+            with metrics.span('tag_fetch', parent=parent, registry='docker.io'):
+                metrics.record_request('docker.io', 'GET', response(headers={'RateLimit-Remaining': '42'}))
+
+        thread = threading.Thread(target=fetch)
+        thread.start()
+        thread.join()
+
+    spans = {span['name']: span for span in metrics.to_dict()['spans']}
+    assert spans['tag_fetch']['parent_span_id'] == run['span_id']
+    assert (spans['tag_fetch']['requests'], spans['tag_fetch']['bytes']) == (1, 2)
+    assert spans['run']['requests'] == 0
+    assert metrics.registries['docker.io']['rate_limit'] == {'ratelimit-remaining': '42'}
+
+
+def test_otlp_json_trace():
+    metrics = RunMetrics()
+    with metrics.span('run'):
+        metrics.record_request('ghcr.io', 'HEAD', response(body=b'ignored'))
+
+    spans = metrics.to_otlp_json()['resourceSpans'][0]['scopeSpans'][0]['spans']
+
+    assert [span['name'] for span in spans] == ['run']
+    attributes = {attr['key']: attr['value'] for attr in spans[0]['attributes']}
+    assert attributes['http.requests'] == {'intValue': '1'}
+    assert attributes['http.response_bytes'] == {'intValue': '0'}
+    assert spans[0]['events'][0]['name'] == 'registry.stats'
+    assert len(spans[0]['traceId']) == 32 and len(spans[0]['spanId']) == 16
+
+
+def test_request_count_of_client_library():
+    metrics = RunMetrics()
+    with metrics.span('github_pr') as span:
+        metrics.record_request_count('api.github.com', 3)
+
+    assert (span['requests'], span['bytes']) == (3, 0)
+    assert metrics.registries['api.github.com']['requests'] == 3
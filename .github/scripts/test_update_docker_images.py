@@ -0,0 +1,200 @@
+import json
+
+import pytest
+
+from registry_clients import save_fixture
+from update_docker_images import DockerImageUpdater
+
+
+VALUES = '''image:
+  repository: team/app
+  tag: "1.1.0"
+sidecar:
+  image: team/sidecar:2.0.0
+'''
+
+
+def save_manifest(fixtures_dir, repository, tag, digest, architectures):
+    body = json.dumps({'manifests': [{'platform': {'os': 'linux', 'architecture': arch}} for arch in architectures]})
+    save_fixture(fixtures_dir, f'https://registry-1.docker.io/v2/{repository}/manifests/{tag}', 200,
+                 {'Docker-Content-Digest': digest}, body)
+
+
+class StubGithub:
+    """Rate limit of a GitHub token as PyGithub reports it."""
+
+    def __init__(self, remaining, limit=5000, reset=1700000000):
+        self.rate_limiting = (remaining, limit)
+        self.rate_limiting_resettime = reset
+
+
+def hub_page(tags):
+    return json.dumps({'count': len(tags), 'next': None,
+                       'results': [{'name': tag, 'last_updated': None} for tag in tags]})
+
+
+@pytest.fixture
+def offline_updater(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('DOCKER_TAG_CACHE', str(tmp_path / 'tags.json'))
+    fixtures_dir = tmp_path / 'fixtures'
+    params = {'page_size': 100, 'ordering': 'last_updated'}
+    save_fixture(fixtures_dir, 'https://hub.docker.com/v2/repositories/team/app/tags', 200, {},
+                 hub_page(['1.3.0', '1.2.0', 'latest', '1.1.0']), params)
+    save_fixture(fixtures_dir, 'https://hub.docker.com/v2/repositories/team/sidecar/tags', 200, {},
+                 hub_page(['2.0.0']), params)
+
+    values_path = tmp_path / 'deploy/helm/values.yaml'
+    values_path.parent.mkdir(parents=True)
+    values_path.write_text(VALUES)
+    return DockerImageUpdater(github_token='', fixtures_dir=fixtures_dir)
+
+
+def test_offline_run_reports_updates_without_writing(offline_updater, tmp_path):
+    save_manifest(tmp_path / 'fixtures', 'team/app', '1.3.0', 'sha256:new', ['amd64', 'arm64'])
+    assert offline_updater.dry_run
+    assert offline_updater.github is None
+
+    updates = offline_updater.update_values_yaml()
+
+    assert [(u['repository'], u['old_tag'], u['new_tag']) for u in updates] == [('team/app', '1.1.0', '1.3.0')]
+    assert (tmp_path / 'deploy/helm/values.yaml').read_text() == VALUES
+    assert offline_updater.run()
+    assert not (tmp_path / 'tags.json').exists()
+
+
+def test_missing_recording_means_no_tags(offline_updater):
+    assert offline_updater.get_latest_version('team/unknown', '1.0.0') is None
+
+
+def test_patch_scalars_keeps_formatting(offline_updater):
+    content = 'a:\n  tag: "1.0.0"  # pinned\n  image: team/app:1.0.0\nb: 1.0.0x\n'
+    patches = [((1, 7), '1.0.0', '1.1.0'), ((2, 9), 'team/app:1.0.0', 'team/app:1.2.0'), ((3, 3), '1.0.0', '2.0.0')]
+
+    patched, failed = offline_updater.patch_scalars(content, patches)
+
+    assert patched == 'a:\n  tag: "1.1.0"  # pinned\n  image: team/app:1.2.0\nb: 1.0.0x\n'
+    assert failed == [2]
+
+
+def test_iter_images_recognizes_registry_digest_and_strings(offline_updater):
+    yaml_data = offline_updater.yaml.load('''exporter:
+  image:
+    registry: quay.io
+    repository: prometheus/node-exporter
+    digest: sha256:abc
+containers:
+  - image: ghcr.io/team/app:1.0.0@sha256:def
+  - image: "{{ .Values.image }}"
+sidecar:
+  image: team/sidecar:2.0.0
+''')
+
+    index = offline_updater.build_image_index(yaml_data)
+
+    assert list(index) == ['exporter.image', 'containers[0].image', 'sidecar.image']
+    assert index['exporter.image']['repository'] == 'quay.io/prometheus/node-exporter'
+    assert index['exporter.image']['digest'] == 'sha256:abc'
+    assert (index['containers[0].image']['tag'], index['containers[0].image']['digest']) == ('1.0.0', 'sha256:def')
+    assert index['sidecar.image']['yaml_data'] is yaml_data['sidecar']
+
+
+def test_update_dropping_a_platform_is_skipped(offline_updater, tmp_path):
+    save_manifest(tmp_path / 'fixtures', 'team/app', '1.1.0', 'sha256:old', ['amd64', 'arm64'])
+    save_manifest(tmp_path / 'fixtures', 'team/app', '1.3.0', 'sha256:new', ['amd64'])
+
+    assert offline_updater.update_values_yaml() == []
+
+
+def test_update_with_required_platforms_fetches_only_the_new_manifest(offline_updater, tmp_path):
+    save_manifest(tmp_path / 'fixtures', 'team/app', '1.1.0', 'sha256:old', ['amd64', 'arm64'])
+    save_manifest(tmp_path / 'fixtures', 'team/app', '1.3.0', 'sha256:new', ['amd64', 'arm64', 's390x'])
+
+    updates = offline_updater.update_values_yaml()
+
+    assert [(u['repository'], u['new_tag']) for u in updates] == [('team/app', '1.3.0')]
+    assert [span['name'] for span in offline_updater.metrics.spans].count('manifest_fetch') == 1
+
+
+def test_update_narrowed_to_platforms_of_current_tag(offline_updater, tmp_path):
+    save_manifest(tmp_path / 'fixtures', 'team/app', '1.1.0', 'sha256:old', ['amd64'])
+    save_manifest(tmp_path / 'fixtures', 'team/app', '1.3.0', 'sha256:new', ['amd64'])
+
+    assert [u['new_tag'] for u in offline_updater.update_values_yaml()] == ['1.3.0']
+
+
+def test_update_with_unverifiable_platforms_is_skipped(offline_updater, caplog):
+    assert offline_updater.update_values_yaml() == []
+    assert 'Not updating team/app to 1.3.0, could not verify its platforms' in caplog.text
+
+
+def test_pin_digests_writes_tag_with_digest(offline_updater, tmp_path):
+    save_manifest(tmp_path / 'fixtures', 'team/app', '1.3.0', 'sha256:new', ['amd64', 'arm64'])
+    save_manifest(tmp_path / 'fixtures', 'team/sidecar', '2.0.0', 'sha256:side', ['amd64', 'arm64'])
+    offline_updater.pin_digests = True
+    offline_updater.dry_run = False
+
+    updates = offline_updater.update_values_yaml()
+
+    assert [(u['repository'], u['new_tag'], u['new_digest']) for u in updates] == [
+        ('team/app', '1.3.0', 'sha256:new'), ('team/sidecar', '2.0.0', 'sha256:side')]
+    values = (tmp_path / 'deploy/helm/values.yaml').read_text()
+    assert 'tag: "1.3.0@sha256:new"' in values
+    assert 'image: team/sidecar:2.0.0@sha256:side' in values
+
+
+def test_pinned_image_stays_pinned(offline_updater, tmp_path):
+    values_path = tmp_path / 'deploy/helm/values.yaml'
+    values_path.write_text('image:\n  repository: team/app\n  tag: 1.1.0@sha256:old\n')
+    save_manifest(tmp_path / 'fixtures', 'team/app', '1.3.0', 'sha256:new', ['amd64', 'arm64'])
+    offline_updater.dry_run = False
+
+    offline_updater.update_values_yaml()
+
+    assert values_path.read_text() == 'image:\n  repository: team/app\n  tag: 1.3.0@sha256:new\n'
+
+
+def test_repository_used_at_two_tags_is_listed_once(offline_updater, monkeypatch):
+    client, _ = offline_updater.registries.resolve('team/app')
+    list_tags = client.list_tags
+    listed_until = []
+
+    def recording_list_tags(name, until=None):
+        listed_until.append(until)
+        return list_tags(name, until=until)
+
+    monkeypatch.setattr(client, 'list_tags', recording_list_tags)
+    latest = offline_updater.resolve_latest_versions([('team/app', '1.2.0'), ('team/app', '1.1.0')])
+
+    assert latest == {('team/app', '1.2.0'): '1.3.0', ('team/app', '1.1.0'): '1.3.0'}
+    assert listed_until == ['1.1.0']
+
+
+def test_github_span_counts_requests_by_rate_limit_used(offline_updater):
+    offline_updater.github = StubGithub(4990)
+
+    with offline_updater._github_span('github_commit') as span:
+        offline_updater.github.rate_limiting = (4985, 5000)
+    with offline_updater._github_span('github_pr') as reset_span:
+        # the limit was reset during the phase
+        offline_updater.github = StubGithub(4998, reset=1700003600)
+
+    assert span['requests'] == 5
+    assert reset_span['requests'] == 2
+    stats = offline_updater.metrics.registries['api.github.com']
+    assert stats['requests'] == 7
+    assert stats['rate_limit']['x-ratelimit-remaining'] == '4998'
+
+
+def test_metrics_are_saved_without_updates(offline_updater, tmp_path, monkeypatch):
+    otlp_file = tmp_path / 'trace.json'
+    offline_updater.otlp_file = otlp_file
+    monkeypatch.setattr(offline_updater, 'dry_run', False)
+    monkeypatch.setattr(offline_updater, 'update_values_yaml', lambda: [])
+
+    assert offline_updater.run()
+
+    changes_log = json.loads(next(tmp_path.glob('changes_*.json')).read_text())
+    assert changes_log['summary']['total_updates'] == 0
+    assert [span['name'] for span in changes_log['metrics']['spans']] == ['run']
+    assert json.loads(otlp_file.read_text())['resourceSpans']
@@ -1,19 +1,34 @@
 #!/usr/bin/env python3
 
+import argparse
 import os
 import re
 import json
 import logging
 import sys
+import threading
 import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any, Tuple
 from pathlib import Path
-from urllib.parse import urlparse
-import requests
 from github import Github, GithubException, InputGitTreeElement
 from packaging import version
 from ruamel.yaml import YAML
+from registry_clients import (RecordingRegistryHttp, RegistryClients, RegistryHttp, ReplayRegistryHttp, TagCache,
+                              split_image_reference)
+from run_metrics import RunMetrics
+
+
+VERSION_PATTERN = re.compile(r'^v?(\d+\.\d+\.\d+(?:-[\w\.-]+)?)$')
+
+# Platforms an updated image has to keep providing, windows ones only for images under a `windows` key
+REQUIRED_PLATFORMS = ('linux/amd64', 'linux/arm64')
+WINDOWS_PLATFORMS = ('windows/amd64',)
+
+# Files holding image references that batch mode keeps up to date
+IMAGE_FILE_PATTERNS = ('**/values.yaml', '**/*.clusterserviceversion.yaml')
 
 
 def setup_logging():
@@ -29,17 +44,51 @@ def setup_logging():
 class DockerImageUpdater:
     """Main class for updating Docker images in Helm charts."""
     
-    def __init__(self, github_token: str):
+    def __init__(self, github_token: str, batch: bool = False, dry_run: bool = False,
+                 fixtures_dir: Optional[Path] = None, record_fixtures_dir: Optional[Path] = None,
+                 pin_digests: bool = False, otlp_file: Optional[Path] = None):
         self.github_token = github_token
-        self.github = Github(github_token)
+        self.batch = batch
+        self.pin_digests = pin_digests
         self.logger = setup_logging()
         
+        # Phase timings and API call statistics, saved with the changes log and optionally as OTLP-JSON
+        self.metrics = RunMetrics()
+        self.otlp_file = otlp_file
+        
+        # Dry runs (and offline runs replaying recorded registry responses) write no files and do not use GitHub
+        self.dry_run = dry_run or fixtures_dir is not None
+        self.github = None if self.dry_run else Github(github_token)
+        
         self.timeout = 30
         self.branch_name = "update-docker-images"
         
+        # Tag lookups run concurrently, registry clients share one pooled session
+        self.max_workers = 8
+        
+        # Registry responses (tag lists, manifest digests) are cached between runs and each repository is fetched once per run
+        self.tag_cache = TagCache(Path(os.environ.get('DOCKER_TAG_CACHE', '.cache/docker-image-tags.json')), self.logger)
+        self.lookups: Dict[Any, Future] = {}
+        self.lookups_lock = threading.Lock()
+        
+        if fixtures_dir is not None:
+            self.registry_http = ReplayRegistryHttp(self.logger, self.tag_cache, fixtures_dir,
+                                                    timeout=self.timeout, pool_size=self.max_workers, metrics=self.metrics)
+        elif record_fixtures_dir is not None:
+            self.registry_http = RecordingRegistryHttp(self.logger, self.tag_cache, record_fixtures_dir,
+                                                       timeout=self.timeout, pool_size=self.max_workers, metrics=self.metrics)
+        else:
+            self.registry_http = RegistryHttp(self.logger, self.tag_cache, timeout=self.timeout, pool_size=self.max_workers,
+                                              metrics=self.metrics)
+        self.registries = RegistryClients(self.registry_http, github_token, self.github)
+        
         
         self.values_file_path = Path("deploy/helm/values.yaml")
         self.chart_file_path = Path("deploy/helm/Chart.yaml")
+        self.changed_files: List[Path] = []
+        
+        # Image references of the files checked last, by file and path
+        self.image_index: Dict[Path, Dict[str, Dict[str, Any]]] = {}
         
         # YAML configuration
         self.yaml = YAML()
@@ -50,168 +99,67 @@ class DockerImageUpdater:
         
         # Repository info
         repo_info = os.environ.get('GITHUB_REPOSITORY', '').split('/')
-        if len(repo_info) == 2:
+        if self.dry_run:
+            self.repo_owner, self.repo_name = repo_info if len(repo_info) == 2 else ('', '')
+            self.repo = None
+        elif len(repo_info) == 2:
             self.repo_owner, self.repo_name = repo_info
             self.repo = self.github.get_repo(f"{self.repo_owner}/{self.repo_name}")
         else:
             raise ValueError("GITHUB_REPOSITORY environment variable not set properly")
 
-    def get_docker_hub_tags(self, repository: str, limit: int = 200) -> List[str]:
-        """Fetch limited tags from Docker Hub API."""
-        try:
-            all_tags = []
-            
-            if '/' not in repository:
-                repo_path = f"library/{repository}"
-            else:
-                repo_path = repository
-                
-            url = f"https://hub.docker.com/v2/repositories/{repo_path}/tags"
-            params = {"page_size": 100}
-            
-            while url and len(all_tags) < limit:
-                self.logger.debug(f"Fetching Docker Hub tags for {repository}")
-                response = requests.get(url, params=params, timeout=self.timeout)
-                response.raise_for_status()
+    def _fetch_once(self, key: Any, fetch):
+        """Run `fetch` once per key and run, concurrent callers wait for the first one."""
+        with self.lookups_lock:
+            future = self.lookups.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self.lookups[key] = future
                 
-                data = response.json()
-                tags = [tag['name'] for tag in data.get('results', [])]
-                all_tags.extend(tags)
-                
-                url = data.get('next')
-                params = {}  # Clear params for subsequent requests
-                    
-            self.logger.info(f"Found {len(all_tags)} tags for {repository}")
-            return all_tags[:limit]
-            
-        except Exception as e:
-            self.logger.error(f"Failed to fetch Docker Hub tags for {repository}: {e}")
-            return []
-
-    def get_ghcr_tags(self, repository: str) -> List[str]:
-        """Fetch tags from GitHub Container Registry."""
-        try:
-            repo_url = repository if repository.startswith(('http://', 'https://')) else f'https://{repository}'
-            parsed_url = urlparse(repo_url)
-            
-            if parsed_url.hostname == 'ghcr.io':
-                repo_path = parsed_url.path.lstrip('/')
-            else:
-                repo_path = repository
-                
-            parts = repo_path.split('/')
-            if len(parts) < 2:
-                return []
-                
-            owner = parts[0]
-            package_name = '/'.join(parts[1:])
-            
-            tags = self._get_ghcr_api_tags(owner, package_name)
-            if tags:
-                return tags
+        if is_owner:
+            try:
+                future.set_result(fetch())
+            except Exception as e:
+                future.set_exception(e)
                 
-            return self._get_github_release_tags(owner, parts[1])
-            
-        except Exception as e:
-            self.logger.error(f"Failed to fetch GHCR tags for {repository}: {e}")
-            return []
-
-    def _get_ghcr_api_tags(self, owner: str, package_name: str) -> List[str]:
-        """Get tags from GHCR API."""
-        try:
-            headers = {
-                'Authorization': f'token {self.github_token}',
-                'Accept': 'application/vnd.github.v3+json'
-            }
-            
-            urls_to_try = [
-                f"https://api.github.com/orgs/{owner}/packages/container/{package_name}/versions",
-                f"https://api.github.com/users/{owner}/packages/container/{package_name}/versions"
-            ]
-            
-            for url in urls_to_try:
-                try:
-                    response = requests.get(url, headers=headers, timeout=self.timeout)
-                    if response.status_code == 200:
-                        data = response.json()
-                        tags = []
-                        for version_info in data:
-                            if version_info.get('metadata', {}).get('container', {}).get('tags'):
-                                tags.extend(version_info['metadata']['container']['tags'])
-                        return tags
-                except Exception:
-                    continue
-                    
-            return []
-            
-        except Exception as e:
-            self.logger.debug(f"GHCR API failed for {owner}/{package_name}: {e}")
-            return []
-
-    def _get_github_release_tags(self, owner: str, repo_name: str) -> List[str]:
-        """Get tags from GitHub releases as fallback."""
-        try:
-            releases_repo = self.github.get_repo(f"{owner}/{repo_name}")
-            releases = releases_repo.get_releases()
-            tags = [release.tag_name for release in releases[:50]]
-            self.logger.info(f"Found {len(tags)} release tags for {owner}/{repo_name}")
-            return tags
-            
-        except Exception as e:
-            self.logger.debug(f"GitHub releases failed for {owner}/{repo_name}: {e}")
-            return []
+        return future.result()
 
-    def get_latest_version(self, repository: str, current_version: str = "") -> Optional[str]:
-        """Get the latest semantic version for a Docker image."""
-        clean_repo = repository.strip()
-        
-        repo_url = clean_repo if clean_repo.startswith(('http://', 'https://')) else f'https://{clean_repo}'
-        parsed_url = urlparse(repo_url)
-        hostname = parsed_url.hostname
+    def get_latest_version(self, repository: str, current_version: str = "", until: Optional[str] = None) -> Optional[str]:
+        """Get the latest semantic version for a Docker image.
         
-        if hostname in ['docker.io', 'index.docker.io']:
-            clean_repo = parsed_url.path.lstrip('/')
-        elif hostname == 'ghcr.io':
-            clean_repo = parsed_url.path.lstrip('/')
-        
-        if hostname == 'ghcr.io':
-            tags = self.get_ghcr_tags(repository)
-        elif hostname in ['docker.io', 'index.docker.io', None]:
-            tags = self.get_docker_hub_tags(clean_repo)
-        elif hostname in ['gcr.io', 'quay.io']:
-            tags = self.get_docker_hub_tags(clean_repo)
-        else:
-            tags = self.get_docker_hub_tags(clean_repo)
+        Tags of a repository are listed once per run, up to `until` (default: the current version).
+        Callers sharing the repository pass the oldest tag any of them uses, see oldest_tags().
+        """
+        client, name = self.registries.resolve(repository)
+        until = current_version if until is None else until
+        tags = self._fetch_once((client.registry, name), lambda: client.list_tags(name, until=until or None))
             
         if not tags:
             self.logger.warning(f"No tags found for {repository}")
             return None
             
-        valid_versions = []
-        version_pattern = re.compile(r'^v?(\d+\.\d+\.\d+(?:-[\w\.-]+)?)$')
+        latest = None
         
         for tag in tags:
-            match = version_pattern.match(tag)
+            match = VERSION_PATTERN.match(tag)
             if match:
                 try:
-                    if 'solarwinds-otel-collector' in repository and not tag.startswith('v'):
-                        valid_versions.append((version.parse(match.group(1)), tag))
-                    else:
-                        valid_versions.append((version.parse(match.group(1)), tag))
+                    parsed = version.parse(match.group(1))
                 except Exception:
                     continue
+                if latest is None or parsed > latest[0]:
+                    latest = (parsed, tag)
                     
-        if not valid_versions:
+        if latest is None:
             self.logger.warning(f"No valid semantic versions found for {repository}")
             return None
             
-        valid_versions.sort(key=lambda x: x[0], reverse=True)
-        latest_tag = valid_versions[0][1]
+        latest_parsed, latest_tag = latest
         
         if current_version:
             try:
                 current_parsed = version.parse(current_version.lstrip('v'))
-                latest_parsed = valid_versions[0][0]
                 
                 if latest_parsed <= current_parsed:
                     return None
@@ -221,71 +169,427 @@ class DockerImageUpdater:
         self.logger.info(f"{repository}: Latest version {latest_tag} (current: {current_version})")
         return latest_tag
 
-    def find_images_in_yaml(self, yaml_data: Any, path: str = "") -> List[Dict[str, Any]]:
-        """Recursively find image configurations in YAML data."""
-        images = []
+    def resolve_latest_versions(self, images: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[str]]:
+        """Look up latest versions of unique (repository, current tag) pairs concurrently."""
+        unique_images = list(dict.fromkeys(images))
+        oldest_tags = self.oldest_tags(unique_images)
+        parent = self.metrics.current_span()
         
-        if isinstance(yaml_data, dict):
-            if 'repository' in yaml_data and 'tag' in yaml_data:
-                images.append({
-                    'path': path,
-                    'repository': yaml_data['repository'],
-                    'tag': yaml_data['tag'],
-                    'yaml_data': yaml_data
-                })
-            else:
-                for key, value in yaml_data.items():
-                    new_path = f"{path}.{key}" if path else key
-                    images.extend(self.find_images_in_yaml(value, new_path))
+        def resolve(image):
+            repository, current_tag = image
+            self.logger.info(f"Checking {repository}:{current_tag}")
+            client, name = self.registries.resolve(repository)
+            with self.metrics.span('tag_fetch', parent=parent, registry=client.registry, repository=repository):
+                return self.get_latest_version(repository, current_tag, until=oldest_tags[(client.registry, name)])
+            
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            latest_tags = list(executor.map(resolve, unique_images))
+            
+        return dict(zip(unique_images, latest_tags))
+
+    def oldest_tags(self, images: List[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+        """Oldest current tag per (registry, repository), tags listed up to it serve every image using it.
+        
+        An image without a semantic version tag needs the full listing, its repository maps to ''.
+        """
+        oldest: Dict[Tuple[str, str], Tuple[Any, str]] = {}
+        for repository, current_tag in images:
+            client, name = self.registries.resolve(repository)
+            key = (client.registry, name)
+            parsed = self._parse_version(current_tag)
+            if parsed is None:
+                oldest[key] = (None, '')
+            elif key not in oldest or (oldest[key][0] is not None and parsed < oldest[key][0]):
+                oldest[key] = (parsed, current_tag)
+        return {key: tag for key, (_, tag) in oldest.items()}
+
+    @staticmethod
+    def _parse_version(tag: str) -> Optional[Any]:
+        """Parsed semantic version of a tag, None if it is not one."""
+        match = VERSION_PATTERN.match(tag or '')
+        if not match:
+            return None
+        try:
+            return version.parse(match.group(1))
+        except Exception:
+            return None
+
+    def resolve_manifests(self, images: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[Dict[str, Any]]]:
+        """Resolve unique (repository, tag) pairs to manifest digests and platforms concurrently."""
+        unique_images = list(dict.fromkeys(images))
+        parent = self.metrics.current_span()
+        
+        def resolve(image):
+            repository, tag = image
+            client, name = self.registries.resolve_manifests(repository)
+            with self.metrics.span('manifest_fetch', parent=parent, registry=client.registry, repository=repository):
+                return self._fetch_once(('manifest', client.registry, name, tag), lambda: client.get_manifest(name, tag))
+            
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            manifests = list(executor.map(resolve, unique_images))
+            
+        return dict(zip(unique_images, manifests))
+
+    def select_targets(self, candidates: List[Dict[str, Any]],
+                       latest_tags: Dict[Tuple[str, str], Optional[str]]) -> List[Tuple[Dict[str, Any], str, str]]:
+        """Pick the new tag (and digest when pinning) of each image, returns only images that change.
+        
+        Images already pinned by digest stay pinned. An update is dropped if the new tag
+        lacks a required platform the current tag provides, or if its platforms cannot be verified.
+        Manifest GETs count against the Docker Hub pull limit, so the manifest of the current tag
+        is only fetched when the new tag lacks a required platform or the image is pinned.
+        """
+        targets = {}
+        for image_config in candidates:
+            current_tag = image_config['tag']
+            latest_tag = latest_tags.get((image_config['repository'], current_tag))
+            if (latest_tag and latest_tag != current_tag) or self._pinned(image_config):
+                targets[id(image_config)] = latest_tag or current_tag
+                
+        manifests = self.resolve_manifests(
+            [(image_config['repository'], targets[id(image_config)])
+             for image_config in candidates if id(image_config) in targets])
+        
+        def needs_current(image_config: Dict[str, Any]) -> bool:
+            target_manifest = manifests.get((image_config['repository'], targets[id(image_config)]))
+            return bool(self._missing_platforms(image_config, None, target_manifest)
+                        or (target_manifest is None and self._pinned(image_config)))
+            
+        manifests.update(self.resolve_manifests(
+            [(image_config['repository'], image_config['tag'])
+             for image_config in candidates if id(image_config) in targets
+             and targets[id(image_config)] != image_config['tag'] and needs_current(image_config)]))
+        
+        selected = []
+        for image_config in candidates:
+            if id(image_config) not in targets:
+                continue
+                
+            repository = image_config['repository']
+            current_tag = image_config['tag']
+            target_tag = targets[id(image_config)]
+            target_manifest = manifests.get((repository, target_tag))
+            
+            if target_tag != current_tag:
+                if target_manifest is None:
+                    self.logger.warning(f"Not updating {repository} to {target_tag}, could not verify its platforms")
+                    target_tag, target_manifest = current_tag, manifests.get((repository, current_tag))
+                else:
+                    missing = self._missing_platforms(image_config, manifests.get((repository, current_tag)), target_manifest)
+                    if missing:
+                        self.logger.warning(f"Not updating {repository} to {target_tag}, missing platforms: {', '.join(missing)}")
+                        target_tag, target_manifest = current_tag, manifests.get((repository, current_tag))
+                    
+            target_digest = ''
+            if self._pinned(image_config):
+                if target_manifest:
+                    target_digest = target_manifest['digest']
+                elif target_tag == current_tag:
+                    target_digest = image_config['digest']
                     
-        elif isinstance(yaml_data, list):
-            for i, item in enumerate(yaml_data):
-                new_path = f"{path}[{i}]"
-                images.extend(self.find_images_in_yaml(item, new_path))
+            if target_tag != current_tag or target_digest != image_config['digest']:
+                selected.append((image_config, target_tag, target_digest))
                 
-        return images
+        return selected
 
-    def update_values_yaml(self) -> List[Dict[str, Any]]:
-        """Update image tags in values.yaml file."""
-        if not self.values_file_path.exists():
-            self.logger.error(f"Values file not found: {self.values_file_path}")
+    def _pinned(self, image_config: Dict[str, Any]) -> bool:
+        """Whether the image reference is (to be) pinned by digest."""
+        return self.pin_digests or bool(image_config['digest'])
+
+    def _missing_platforms(self, image_config: Dict[str, Any], current_manifest: Optional[Dict[str, Any]],
+                           target_manifest: Optional[Dict[str, Any]]) -> List[str]:
+        """Required platforms the current image provides (all of them if unknown) but the target does not."""
+        if target_manifest is None:
             return []
             
-        with open(self.values_file_path, 'r') as f:
-            yaml_data = self.yaml.load(f)
+        required = set(REQUIRED_PLATFORMS)
+        if 'windows' in re.split(r'[.\[\]]', image_config['path']):
+            required.update(WINDOWS_PLATFORMS)
+        if current_manifest:
+            required &= set(current_manifest['platforms'])
             
-        images = self.find_images_in_yaml(yaml_data)
-        updates = []
+        return sorted(required - set(target_manifest['platforms']))
+
+    def _image_patches(self, image_config: Dict[str, Any], new_tag: str,
+                       new_digest: str) -> List[Tuple[Optional[Tuple[int, int]], str, str]]:
+        """Scalar patches writing a new tag and digest to an image reference."""
+        pinned = f"{new_tag}@{new_digest}" if new_digest else new_tag
+        if 'image_key' in image_config:
+            return [(image_config['position'], image_config['image_value'], f"{image_config['repository']}:{pinned}")]
+            
+        if 'digest_position' not in image_config:
+            return [(image_config['position'], image_config['tag_value'], pinned)]
+            
+        # Separate `digest` field next to the tag
+        patches = []
+        if new_tag != image_config['tag']:
+            patches.append((image_config['position'], image_config['tag_value'], new_tag))
+        if new_digest != image_config['digest']:
+            patches.append((image_config['digest_position'], image_config['digest'], new_digest))
+        return patches
+
+    def iter_images(self, yaml_data: Any, path: str = "") -> Iterator[Dict[str, Any]]:
+        """Lazily yield image references in document order, walking YAML data with an explicit stack.
+
+        Recognizes mappings with `repository` and `tag` or `digest` (optionally `registry`)
+        and `image: [registry/]repository[:tag][@digest]` strings.
+        """
+        # Entries are (path, node, key), key is set for an image string held by node[key]
+        stack: List[Tuple[str, Any, Any]] = [(path, yaml_data, None)]
         
-        for image_config in images:
-            repository = image_config['repository']
-            current_tag = image_config['tag']
-            path = image_config['path']
+        while stack:
+            node_path, node, image_key = stack.pop()
+            
+            if image_key is not None:
+                image = self._image_from_string(node, image_key, node_path)
+                if image:
+                    yield image
+                    
+            elif isinstance(node, dict):
+                if 'repository' in node and ('tag' in node or 'digest' in node):
+                    yield self._image_from_mapping(node, node_path)
+                    continue
+                    
+                children = []
+                for key, value in node.items():
+                    child_path = f"{node_path}.{key}" if node_path else str(key)
+                    if key == 'image' and isinstance(value, str):
+                        children.append((child_path, node, key))
+                    else:
+                        children.append((child_path, value, None))
+                stack.extend(reversed(children))
                 
-            if not current_tag or current_tag.startswith('<') or current_tag.startswith('${'):
-                self.logger.debug(f"Skipping {repository} with placeholder tag: {current_tag}")
+            elif isinstance(node, list):
+                stack.extend(reversed([(f"{node_path}[{i}]", item, None) for i, item in enumerate(node)]))
+
+    def find_images_in_yaml(self, yaml_data: Any, path: str = "") -> List[Dict[str, Any]]:
+        """Find image configurations in YAML data."""
+        return list(self.iter_images(yaml_data, path))
+
+    def build_image_index(self, yaml_data: Any) -> Dict[str, Dict[str, Any]]:
+        """Index image references of a document by their path, e.g. `otel.image`."""
+        return {image['path']: image for image in self.iter_images(yaml_data)}
+
+    def _image_from_mapping(self, node: Dict[str, Any], path: str) -> Dict[str, Any]:
+        """Image reference of a `repository`/`tag`/`digest`/`registry` mapping."""
+        registry = node.get('registry') or ''
+        repository = str(node['repository'])
+        tag_value = '' if node.get('tag') is None else str(node['tag'])
+        
+        # Tags may carry their pin inline, `tag: 1.2.3@sha256:...`
+        tag, _, digest = tag_value.partition('@')
+        image = {
+            'path': path,
+            'repository': f"{registry}/{repository}" if registry else repository,
+            'registry': registry,
+            'tag': tag,
+            'tag_value': tag_value,
+            'digest': digest,
+            'yaml_data': node,
+            'position': self._value_position(node, 'tag')
+        }
+        if isinstance(node.get('digest'), str):
+            image['digest'] = node['digest']
+            image['digest_position'] = self._value_position(node, 'digest')
+        return image
+
+    def _image_from_string(self, node: Dict[str, Any], key: str, path: str) -> Optional[Dict[str, Any]]:
+        """Image reference of an `image: repo:tag` string, None for templated values."""
+        value = node[key]
+        reference = self._parse_image_reference(value)
+        if not reference:
+            return None
+            
+        repository, tag, digest = reference
+        return {
+            'path': path,
+            'repository': repository,
+            'registry': split_image_reference(repository)[0] or '',
+            'tag': tag,
+            'digest': digest,
+            'yaml_data': node,
+            'image_key': key,
+            'image_value': value,
+            'position': self._value_position(node, key)
+        }
+
+    def _value_position(self, yaml_data: Any, key: str) -> Optional[Tuple[int, int]]:
+        """Line and column (0-based) where the value of `key` starts in the loaded file."""
+        try:
+            return tuple(yaml_data.lc.value(key))
+        except (AttributeError, KeyError, TypeError):
+            return None
+
+    def patch_scalars(self, content: str, patches: List[Tuple[Tuple[int, int], str, str]]) -> Tuple[str, List[int]]:
+        """Replace plain or quoted scalars at the given positions, keeping everything else byte for byte.
+
+        Each patch is ((line, column), old value, new value). Returns the new content
+        and indexes of patches which did not apply because the scalar there differs.
+        """
+        lines = content.splitlines(keepends=True)
+        failed = []
+        
+        # Right to left within a line, so earlier columns stay valid
+        order = sorted(range(len(patches)), key=lambda i: patches[i][0] or (-1, -1), reverse=True)
+        for i in order:
+            position, old_value, new_value = patches[i]
+            if position is None or position[0] >= len(lines):
+                failed.append(i)
                 continue
                 
-            self.logger.info(f"Checking {repository}:{current_tag}")
-            latest_tag = self.get_latest_version(repository, current_tag)
+            line_no, column = position
+            patched = self._replace_scalar(lines[line_no], column, old_value, new_value)
+            if patched is None:
+                failed.append(i)
+            else:
+                lines[line_no] = patched
+                
+        return ''.join(lines), sorted(failed)
+
+    def _replace_scalar(self, line: str, column: int, old_value: str, new_value: str) -> Optional[str]:
+        """Replace the scalar starting at `column` if it is `old_value`, quotes are kept."""
+        quote = line[column:column + 1]
+        if quote in ('"', "'"):
+            end = line.find(quote, column + 1)
+            if end < 0 or line[column + 1:end] != old_value:
+                return None
+            return f"{line[:column + 1]}{new_value}{line[end:]}"
+            
+        end = column + len(old_value)
+        if line[column:end] != old_value or (end < len(line) and not line[end].isspace()):
+            return None
+        return f"{line[:column]}{new_value}{line[end:]}"
+
+    def _parse_image_reference(self, image: str) -> Optional[Tuple[str, str, str]]:
+        """Split `repository[:tag][@digest]` image strings, templated values are skipped."""
+        if '{{' in image or '$' in image:
+            return None
             
-            if latest_tag and latest_tag != current_tag:
-                image_config['yaml_data']['tag'] = latest_tag
+        reference, _, digest = image.partition('@')
+        repository, separator, tag = reference.rpartition(':')
+        if not separator or '/' in tag:
+            repository, tag = reference, ''
+        if not repository or (not tag and not digest):
+            return None
+        return repository, tag, digest
+
+    def discover_image_files(self) -> List[Path]:
+        """Find all values files and operator CSVs in the repository, the chart values first."""
+        paths = {self.values_file_path}
+        for pattern in IMAGE_FILE_PATTERNS:
+            for path in Path('.').glob(pattern):
+                if not any(part.startswith('.') for part in path.parts):
+                    paths.add(path)
+                    
+        return sorted(paths, key=lambda path: (path != self.values_file_path, str(path)))
+
+    def _load_image_files(self, file_paths: List[Path]) -> Tuple[Dict[Path, str], List[Dict[str, Any]]]:
+        """Read files, index their image references and pick the ones with a version tag to check."""
+        contents = {}
+        candidates = []
+        self.image_index = {}
+        
+        for file_path in file_paths:
+            if not file_path.exists():
+                self.logger.error(f"Values file not found: {file_path}")
+                continue
+                
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                yaml_data = self.yaml.load(content)
+            except Exception as e:
+                self.logger.error(f"Failed to parse {file_path}: {e}")
+                continue
+                
+            contents[file_path] = content
+            self.image_index[file_path] = self.build_image_index(yaml_data)
+            
+            for image_config in self.image_index[file_path].values():
+                repository = image_config['repository']
+                current_tag = image_config['tag']
+                    
+                if not current_tag or current_tag.startswith('<') or current_tag.startswith('${'):
+                    self.logger.debug(f"Skipping {repository} with placeholder tag: {current_tag}")
+                    continue
+                    
+                if not VERSION_PATTERN.match(current_tag):
+                    self.logger.debug(f"Skipping {repository} with non-version tag: {current_tag}")
+                    continue
+                    
+                image_config['file'] = file_path
+                candidates.append(image_config)
+                
+        return contents, candidates
+
+    def update_image_files(self, file_paths: List[Path]) -> List[Dict[str, Any]]:
+        """Update image tags in the given YAML files, resolving each unique image once."""
+        with self.metrics.span('discovery', files=len(file_paths)):
+            contents, candidates = self._load_image_files(file_paths)
+            
+        with self.metrics.span('resolve_versions', images=len(candidates)):
+            latest_tags = self.resolve_latest_versions(
+                [(image_config['repository'], image_config['tag']) for image_config in candidates])
+            
+        with self.metrics.span('version_selection'):
+            targets = {id(image_config): (new_tag, new_digest)
+                       for image_config, new_tag, new_digest in self.select_targets(candidates, latest_tags)}
+        
+        with self.metrics.span('yaml_write', images=len(targets)):
+            # Only the changed scalars are rewritten, files are never re-serialized, so
+            # comments and formatting stay as they are
+            patches_by_file: Dict[Path, List[Tuple[Dict[str, Any], Tuple, str, str]]] = {}
+            for image_config in candidates:
+                if id(image_config) in targets:
+                    for patch in self._image_patches(image_config, *targets[id(image_config)]):
+                        patches_by_file.setdefault(image_config['file'], []).append((image_config, *patch))
+                
+            patched_configs = set()
+            for file_path, file_patches in patches_by_file.items():
+                content, failed = self.patch_scalars(contents[file_path], [patch[1:] for patch in file_patches])
+                for i in failed:
+                    image_config = file_patches[i][0]
+                    self.logger.error(f"Could not patch {image_config['path']} in {file_path}, leaving it unchanged")
+                
+                if len(failed) == len(file_patches):
+                    continue
+                
+                failed_configs = set(id(file_patches[i][0]) for i in failed)
+                patched_configs.update(id(patch[0]) for patch in file_patches if id(patch[0]) not in failed_configs)
+                if self.dry_run:
+                    self.logger.info(f"Dry run, not writing {file_path}")
+                else:
+                    with open(file_path, 'w', encoding='utf-8') as f:
+                        f.write(content)
+                self.changed_files.append(file_path)
                 
-                updates.append({
-                    'path': path,
+        # Report in document order so the changes log does not depend on lookup timing
+        updates = []
+        for image_config in candidates:
+            if id(image_config) in patched_configs:
+                repository = image_config['repository']
+                current_tag = image_config['tag']
+                latest_tag, new_digest = targets[id(image_config)]
+                
+                update = {
+                    'file': str(image_config['file']),
+                    'path': image_config['path'],
                     'repository': repository,
                     'old_tag': current_tag,
                     'new_tag': latest_tag
-                })
-                self.logger.info(f"Updated {repository}: {current_tag} → {latest_tag}")
-                
-        if updates:
-            with open(self.values_file_path, 'w') as f:
-                self.yaml.dump(yaml_data, f)
+                }
+                if self._pinned(image_config):
+                    update['old_digest'] = image_config['digest']
+                    update['new_digest'] = new_digest
+                updates.append(update)
+                self.logger.info(f"Updated {repository} in {image_config['file']}: {current_tag} → {latest_tag}")
                 
         return updates
 
+    def update_values_yaml(self) -> List[Dict[str, Any]]:
+        """Update image tags in values.yaml file."""
+        return self.update_image_files([self.values_file_path])
+
     def _bump_version(self, old_version: str) -> str:
         """Bump version using semantic versioning rules."""
         try:
@@ -313,6 +617,7 @@ class DockerImageUpdater:
 
     def update_chart_version(self, updates: List[Dict[str, Any]]) -> bool:
         """Update Chart.yaml version and appVersion minimally."""
+        updates = [update for update in updates if update['file'] == str(self.values_file_path)]
         if not updates or not self.chart_file_path.exists():
             return False
             
@@ -323,39 +628,28 @@ class DockerImageUpdater:
             original_content = content
             
             # Find main collector image update for appVersion
-            main_image_update = None
+            new_app_version = None
             for update in updates:
                 if 'solarwinds-otel-collector' in update['repository']:
-                    main_image_update = update
+                    new_app_version = update['new_tag'].lstrip('v')
                     break
                     
-            # Update appVersion if main image was updated
-            if main_image_update:
-                new_app_version = main_image_update['new_tag'].lstrip('v')
-                content = re.sub(
-                    r'^appVersion:\s+.*$',
-                    f'appVersion: {new_app_version}',
-                    content,
-                    flags=re.MULTILINE
-                )
+            # One pass over the top level version and appVersion lines
+            def replace(match: re.Match) -> str:
+                key, old_value = match.group(1), match.group(2)
+                if key == 'appVersion':
+                    return f'appVersion: {new_app_version}' if new_app_version else match.group(0)
                     
-            # Bump chart version (patch version)
-            version_match = re.search(r'^version:\s+(.+)$', content, re.MULTILINE)
-            if version_match:
-                old_version = version_match.group(1)
-                new_version = self._bump_version(old_version)
+                new_version = self._bump_version(old_value)
+                if new_version == old_value:
+                    return match.group(0)
+                self.logger.info(f"Updated Chart version: {old_value} → {new_version}")
+                return f'version: {new_version}'
                 
-                if new_version != old_version:
-                    content = re.sub(
-                        r'^version:\s+.*$',
-                        f'version: {new_version}',
-                        content,
-                        flags=re.MULTILINE
-                    )
-                    self.logger.info(f"Updated Chart version: {old_version} → {new_version}")
+            content = re.sub(r'^(version|appVersion):\s+(.*)$', replace, content, flags=re.MULTILINE)
                 
             # Only write if content changed
-            if content != original_content:
+            if content != original_content and not self.dry_run:
                 with open(self.chart_file_path, 'w') as f:
                     f.write(content)
                     
@@ -399,10 +693,10 @@ class DockerImageUpdater:
             return True
             
         try:
-            commit_message = f"chore: update docker image versions\n\n"
+            commit_message = "chore: update docker image versions\n\n"
             
-            for update in updates:
-                commit_message += f"- {update['repository']}: {update['old_tag']} → {update['new_tag']}\n"
+            for repository, old_tag, new_tag in self._unique_updates(updates):
+                commit_message += f"- {repository}: {old_tag} → {new_tag}\n"
                 
             branch_ref = self.repo.get_git_ref(f"heads/{self.branch_name}")
             base_commit = self.repo.get_git_commit(branch_ref.object.sha)
@@ -413,24 +707,16 @@ class DockerImageUpdater:
             # Prepare updated files
             tree_elements = []
             
-            if self.values_file_path.exists():
-                with open(self.values_file_path, 'r', encoding='utf-8') as f:
-                    values_content = f.read()
-                tree_elements.append(InputGitTreeElement(
-                    path=str(self.values_file_path),
-                    mode='100644',
-                    type='blob',
-                    content=values_content
-                ))
-                
-            if self.chart_file_path.exists():
-                with open(self.chart_file_path, 'r', encoding='utf-8') as f:
-                    chart_content = f.read()
+            for file_path in self.changed_files + [self.chart_file_path]:
+                if not file_path.exists():
+                    continue
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    file_content = f.read()
                 tree_elements.append(InputGitTreeElement(
-                    path=str(self.chart_file_path),
+                    path=str(file_path),
                     mode='100644',
                     type='blob',
-                    content=chart_content
+                    content=file_content
                 ))
                 
             # Create new tree based on current tree
@@ -462,15 +748,19 @@ class DockerImageUpdater:
                 existing_pr = pr
                 break
                 
-            title = f"update docker image versions"
+            title = "update docker image versions"
             
             body_parts = [
                 "## Updated Images",
                 ""
             ]
             
-            for update in updates:
-                body_parts.append(f"- **{update['repository']}**: `{update['old_tag']}` → `{update['new_tag']}`")
+            for repository, old_tag, new_tag in self._unique_updates(updates):
+                body_parts.append(f"- **{repository}**: `{old_tag}` → `{new_tag}`")
+            
+            if self.batch:
+                body_parts.extend(["", "## Updated Files", ""])
+                body_parts.extend(f"- `{file_path}`" for file_path in self.changed_files)
             
             body = "\n".join(body_parts)
             
@@ -492,15 +782,66 @@ class DockerImageUpdater:
             self.logger.error(f"Failed to create/update PR: {e}")
             return None
 
+    def _unique_updates(self, updates: List[Dict[str, Any]]) -> List[Tuple[str, str, str]]:
+        """Image updates without repeats, an image may be updated in several files. Pins are shortened."""
+        def pinned(tag: str, digest: Optional[str]) -> str:
+            return f"{tag}@{digest[:19]}" if digest else tag
+            
+        return list(dict.fromkeys(
+            (u['repository'], pinned(u['old_tag'], u.get('old_digest')), pinned(u['new_tag'], u.get('new_digest')))
+            for u in updates))
+
+    @contextmanager
+    def _github_span(self, name: str) -> Iterator[Dict[str, Any]]:
+        """Span of a GitHub API phase, counting its requests by the rate limit they used.
+
+        PyGithub exposes no response hook, so requests that do not count against the
+        limit (conditional 304s) are missed and response bytes are not known.
+        """
+        with self.metrics.span(name) as span:
+            before = self._github_rate_limit()
+            try:
+                yield span
+            finally:
+                after = self._github_rate_limit()
+                if after:
+                    remaining, limit, reset = after
+                    self.metrics.record_rate_limit('api.github.com', remaining, limit)
+                    if before:
+                        # After a reset of the limit only the requests since the reset are known
+                        used = before[0] - remaining if reset == before[2] else limit - remaining
+                        self.metrics.record_request_count('api.github.com', max(used, 0))
+
+    def _github_rate_limit(self) -> Optional[Tuple[int, int, int]]:
+        """Remaining requests, limit and reset time of the GitHub token, as of its last response."""
+        try:
+            remaining, limit = self.github.rate_limiting
+            return remaining, limit, self.github.rate_limiting_resettime
+        except Exception as e:
+            self.logger.debug(f"GitHub rate limit unavailable: {e}")
+            return None
+
+    def log_metrics_summary(self):
+        """Log time per phase and API usage per registry."""
+        for phase, seconds in self.metrics.phase_durations().items():
+            self.logger.info(f"Phase {phase}: {seconds:.2f}s")
+        for registry, stats in self.metrics.registries.items():
+            remaining = stats['rate_limit'].get('ratelimit-remaining') or stats['rate_limit'].get('x-ratelimit-remaining')
+            self.logger.info(f"Registry {registry}: {stats['requests']} requests, {stats['bytes']} bytes, "
+                             f"{stats['seconds']:.2f}s" + (f", rate limit remaining {remaining}" if remaining else ""))
+
     def save_changes_log(self, updates: List[Dict[str, Any]]):
-        """Save changes to JSON file for debugging."""
+        """Save changes, phase timings and API statistics to JSON file for debugging."""
         log_data = {
             'timestamp': datetime.now(timezone.utc).isoformat(),
             'updates': updates,
             'summary': {
                 'total_updates': len(updates),
-                'repositories_updated': len(set(u['repository'] for u in updates))
-            }
+                'repositories_updated': len(set(u['repository'] for u in updates)),
+                'files_updated': [str(file_path) for file_path in self.changed_files],
+                'phase_seconds': self.metrics.phase_durations()
+            },
+            'metrics': self.metrics.to_dict()
         }
         
         filename = f"changes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
@@ -512,46 +853,94 @@ class DockerImageUpdater:
     def run(self) -> bool:
         """Main execution method."""
         self.logger.info("Starting Docker Image Updater")
+        updates = []
         
         try:
-            updates = self.update_values_yaml()
-            
-            if not updates:
-                self.logger.info("No image updates found")
-                return True
+            with self.metrics.span('run', batch=self.batch, dry_run=self.dry_run):
+                return self._run(updates)
                 
-            self.logger.info(f"Found {len(updates)} image updates")
+        except Exception as e:
+            self.logger.error(f"Docker Image Updater failed: {e}")
+            self.logger.error(traceback.format_exc())
+            return False
+            
+        finally:
+            self.log_metrics_summary()
+            # Saved without updates too, the metrics of every run are kept
+            if not self.dry_run:
+                self.save_changes_log(updates)
+            if self.otlp_file:
+                self.metrics.write_otlp_json(self.otlp_file)
+                self.logger.info(f"Saved run trace to {self.otlp_file}")
+
+    def _run(self, updates: List[Dict[str, Any]]) -> bool:
+        """Run the update, `updates` is filled in as soon as they are known."""
+        if self.batch:
+            file_paths = self.discover_image_files()
+            self.logger.info(f"Batch mode, checking images in {len(file_paths)} files")
+            updates.extend(self.update_image_files(file_paths))
+        else:
+            updates.extend(self.update_values_yaml())
+        
+        if self.dry_run:
+            for repository, old_tag, new_tag in self._unique_updates(updates):
+                self.logger.info(f"Dry run, would update {repository}: {old_tag} → {new_tag}")
+            self.logger.info(f"Dry run found {len(updates)} image updates, nothing written")
+            return True
+            
+        self.tag_cache.save()
+        
+        if not updates:
+            self.logger.info("No image updates found")
+            return True
             
+        self.logger.info(f"Found {len(updates)} image updates")
+        
+        with self.metrics.span('chart_update'):
             self.update_chart_version(updates)
-            self.save_changes_log(updates)
-                
+            
+        with self._github_span('github_branch'):
             if not self.create_or_update_branch(updates):
                 return False
                 
+        with self._github_span('github_commit'):
             if not self.commit_changes(updates):
                 return False
                 
+        with self._github_span('github_pr'):
             pr_url = self.create_or_update_pr(updates)
-            if pr_url:
-                self.logger.info(f"PR available at: {pr_url}")
-                
-            self.logger.info("Docker Image Updater completed successfully")
-            return True
+        if pr_url:
+            self.logger.info(f"PR available at: {pr_url}")
             
-        except Exception as e:
-            self.logger.error(f"Docker Image Updater failed: {e}")
-            self.logger.error(traceback.format_exc())
-            return False
+        self.logger.info("Docker Image Updater completed successfully")
+        return True
 
 
 def main():
     """Main entry point."""
-    github_token = os.environ.get('GITHUB_TOKEN')
-    if not github_token:
+    parser = argparse.ArgumentParser(description="Update Docker image versions in Helm charts")
+    parser.add_argument('--batch', action='store_true',
+                        help="update images in all values files and operator CSVs with a single commit")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="only report updates, write no files and do not connect to GitHub")
+    parser.add_argument('--fixtures', type=Path,
+                        help="replay recorded registry responses from this directory (implies --dry-run)")
+    parser.add_argument('--pin-digests', action='store_true',
+                        help="write tags pinned to their manifest digest, e.g. 1.2.3@sha256:...")
+    parser.add_argument('--otlp-file', type=Path,
+                        help="write phase timings and API statistics of the run as an OTLP-JSON trace")
+    parser.add_argument('--record-fixtures', type=Path,
+                        help="record registry responses into this directory")
+    args = parser.parse_args()
+    
+    github_token = os.environ.get('GITHUB_TOKEN', '')
+    if not github_token and not (args.dry_run or args.fixtures):
         print("ERROR: GITHUB_TOKEN environment variable is required")
         sys.exit(1)
         
-    updater = DockerImageUpdater(github_token=github_token)
+    updater = DockerImageUpdater(github_token=github_token, batch=args.batch, dry_run=args.dry_run,
+                                 fixtures_dir=args.fixtures, record_fixtures_dir=args.record_fixtures,
+                                 pin_digests=args.pin_digests, otlp_file=args.otlp_file)
     
     success = updater.run()
     sys.exit(0 if success else 1)
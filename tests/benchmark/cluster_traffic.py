@@ -0,0 +1,382 @@
+"""Synthetic kube-state-metrics, cAdvisor, kubelet, container log and Kubernetes event traffic.
+
+Series, labels and record shapes follow what the collectors receive in a real
+cluster, so the collector pipelines do the same work per pod as in production.
+"""
+
+import time
+import uuid
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class Container:
+    name: str
+    image: str
+    container_id: str
+
+
+@dataclass
+class Pod:
+    name: str
+    namespace: str
+    uid: str
+    node: str
+    ip: str
+    owner: str
+    containers: List[Container] = field(default_factory=list)
+
+    def replaced(self, generation: int) -> 'Pod':
+        """The pod of the same deployment on the same node replacing this one after `generation` rollouts."""
+        if generation == 0:
+            return self
+        key = f"{self.uid}-{generation}"
+        return replace(
+            self,
+            name=f"{self.owner}-{uuid.uuid5(uuid.NAMESPACE_DNS, key).hex[:5]}",
+            uid=str(uuid.uuid5(uuid.NAMESPACE_URL, key)),
+            containers=[replace(c, container_id=f"containerd://{uuid.uuid5(uuid.NAMESPACE_OID, f'{key}-{c.name}').hex}")
+                        for c in self.containers],
+        )
+
+
+@dataclass
+class ClusterShape:
+    """A cluster of `nodes` nodes with `pods_per_node` pods of `containers_per_pod` containers each.
+
+    Pods are grouped into deployments of `replicas` pods spread over `namespaces` namespaces.
+    """
+
+    nodes: int = 3
+    pods_per_node: int = 30
+    containers_per_pod: int = 2
+    namespaces: int = 10
+    replicas: int = 3
+
+    def node_names(self) -> List[str]:
+        """Names of all nodes."""
+        return [f"node-{i}" for i in range(self.nodes)]
+
+    def pods(self, node: Optional[str] = None) -> List[Pod]:
+        """All pods, or the pods scheduled on `node`, with stable names and uids."""
+        pods = []
+        for n, node_name in enumerate(self.node_names()):
+            if node is not None and node_name != node:
+                continue
+            for p in range(self.pods_per_node):
+                index = n * self.pods_per_node + p
+                deployment = f"app-{index // self.replicas}"
+                pod = Pod(
+                    name=f"{deployment}-{uuid.uuid5(uuid.NAMESPACE_DNS, str(index)).hex[:5]}",
+                    namespace=f"namespace-{(index // self.replicas) % self.namespaces}",
+                    uid=str(uuid.uuid5(uuid.NAMESPACE_URL, f"pod-{index}")),
+                    node=node_name,
+                    ip=f"10.{n % 256}.{p // 256}.{p % 256}",
+                    owner=deployment,
+                )
+                for c in range(self.containers_per_pod):
+                    pod.containers.append(Container(
+                        name=f"container{c}",
+                        image=f"registry.example.com/{deployment}/container{c}:1.0.{c}",
+                        container_id=f"containerd://{uuid.uuid5(uuid.NAMESPACE_OID, f'{index}-{c}').hex}",
+                    ))
+                pods.append(pod)
+        return pods
+
+    def to_dict(self) -> Dict[str, int]:
+        """Parameters as stored with benchmark results."""
+        return {
+            'nodes': self.nodes,
+            'pods_per_node': self.pods_per_node,
+            'containers_per_pod': self.containers_per_pod,
+            'namespaces': self.namespaces,
+            'replicas': self.replicas,
+        }
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+
+class Exposition:
+    """Prometheus text exposition builder, samples are grouped under their metric family."""
+
+    def __init__(self):
+        self.families: Dict[str, List[str]] = {}
+        self.types: Dict[str, str] = {}
+        self.samples = 0
+
+    def add(self, name: str, metric_type: str, labels: str, value: float):
+        """Add one sample of family `name`."""
+        self.types.setdefault(name, metric_type)
+        self.families.setdefault(name, []).append(f"{name}{labels} {value}")
+        self.samples += 1
+
+    def text(self) -> str:
+        """The exposition in text format 0.0.4."""
+        lines = []
+        for name, samples in self.families.items():
+            lines.append(f"# TYPE {name} {self.types[name]}")
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+def kube_state_metrics(shape: ClusterShape, pods: List[Pod]) -> Exposition:
+    """kube-state-metrics series of nodes, namespaces, deployments, pods and containers."""
+    exposition = Exposition()
+    created = int(time.time() - 86400)
+
+    for node in shape.node_names():
+        exposition.add('kube_node_info', 'gauge', _labels(node=node, kernel_version='6.1.0', os_image='Ubuntu 22.04',
+                                                         container_runtime_version='containerd://1.7.0',
+                                                         kubelet_version='v1.30.0', internal_ip='192.168.0.1'), 1)
+        exposition.add('kube_node_created', 'gauge', _labels(node=node), created)
+        exposition.add('kube_node_spec_unschedulable', 'gauge', _labels(node=node), 0)
+        for condition in ('Ready', 'MemoryPressure', 'DiskPressure', 'PIDPressure'):
+            for status in ('true', 'false', 'unknown'):
+                expected = 'true' if condition == 'Ready' else 'false'
+                exposition.add('kube_node_status_condition', 'gauge',
+                               _labels(node=node, condition=condition, status=status), int(status == expected))
+        for resource, unit, value in (('cpu', 'core', 8), ('memory', 'byte', 32 * 2**30), ('pods', 'integer', 110)):
+            exposition.add('kube_node_status_capacity', 'gauge', _labels(node=node, resource=resource, unit=unit), value)
+            exposition.add('kube_node_status_allocatable', 'gauge', _labels(node=node, resource=resource, unit=unit), value)
+
+    for i in range(shape.namespaces):
+        namespace = f"namespace-{i}"
+        exposition.add('kube_namespace_created', 'gauge', _labels(namespace=namespace), created)
+        exposition.add('kube_namespace_status_phase', 'gauge', _labels(namespace=namespace, phase='Active'), 1)
+
+    deployments = {}
+    for pod in pods:
+        deployments.setdefault((pod.namespace, pod.owner), []).append(pod)
+    for (namespace, deployment), replicas in deployments.items():
+        labels = _labels(namespace=namespace, deployment=deployment)
+        exposition.add('kube_deployment_created', 'gauge', labels, created)
+        exposition.add('kube_deployment_spec_replicas', 'gauge', labels, len(replicas))
+        exposition.add('kube_deployment_status_replicas', 'gauge', labels, len(replicas))
+        exposition.add('kube_deployment_status_replicas_available', 'gauge', labels, len(replicas))
+        exposition.add('kube_deployment_status_replicas_ready', 'gauge', labels, len(replicas))
+        exposition.add('kube_deployment_status_observed_generation', 'gauge', labels, 1)
+        for condition in ('Available', 'Progressing'):
+            for status in ('true', 'false', 'unknown'):
+                exposition.add('kube_deployment_status_condition', 'gauge',
+                               _labels(namespace=namespace, deployment=deployment, condition=condition, status=status),
+                               int(status == 'true'))
+
+    for pod in pods:
+        pod_labels = dict(namespace=pod.namespace, pod=pod.name, uid=pod.uid)
+        exposition.add('kube_pod_info', 'gauge', _labels(**pod_labels, node=pod.node, host_ip='192.168.0.1', pod_ip=pod.ip,
+                                                        created_by_kind='ReplicaSet', created_by_name=pod.owner), 1)
+        exposition.add('kube_pod_created', 'gauge', _labels(**pod_labels), created)
+        exposition.add('kube_pod_start_time', 'gauge', _labels(**pod_labels), created)
+        exposition.add('kube_pod_owner', 'gauge', _labels(**pod_labels, owner_kind='ReplicaSet', owner_name=pod.owner,
+                                                         owner_is_controller='true'), 1)
+        exposition.add('kube_pod_labels', 'gauge', _labels(**pod_labels, label_app=pod.owner), 1)
+        for phase in ('Pending', 'Running', 'Succeeded', 'Failed', 'Unknown'):
+            exposition.add('kube_pod_status_phase', 'gauge', _labels(**pod_labels, phase=phase), int(phase == 'Running'))
+        for status in ('true', 'false', 'unknown'):
+            exposition.add('kube_pod_status_ready', 'gauge', _labels(**pod_labels, condition=status), int(status == 'true'))
+
+        for container in pod.containers:
+            container_labels = dict(**pod_labels, container=container.name)
+            exposition.add('kube_pod_container_info', 'gauge',
+                           _labels(**container_labels, image=container.image, image_id=container.image,
+                                   container_id=container.container_id), 1)
+            exposition.add('kube_pod_container_status_running', 'gauge', _labels(**container_labels), 1)
+            exposition.add('kube_pod_container_status_ready', 'gauge', _labels(**container_labels), 1)
+            exposition.add('kube_pod_container_status_waiting', 'gauge', _labels(**container_labels), 0)
+            exposition.add('kube_pod_container_status_terminated', 'gauge', _labels(**container_labels), 0)
+            exposition.add('kube_pod_container_status_restarts_total', 'counter', _labels(**container_labels), 0)
+            for resource, unit, value in (('cpu', 'core', 0.1), ('memory', 'byte', 128 * 2**20)):
+                resource_labels = _labels(**container_labels, node=pod.node, resource=resource, unit=unit)
+                exposition.add('kube_pod_container_resource_requests', 'gauge', resource_labels, value)
+                exposition.add('kube_pod_container_resource_limits', 'gauge', resource_labels, value * 2)
+
+    return exposition
+
+
+def cadvisor_metrics(pods: List[Pod], elapsed: float) -> Exposition:
+    """cAdvisor series of a node's pods, counters grow with `elapsed` seconds."""
+    exposition = Exposition()
+    for pod in pods:
+        pod_cgroup = f"/kubepods/burstable/pod{pod.uid}"
+        pod_labels = dict(namespace=pod.namespace, pod=pod.name)
+        for direction in ('receive', 'transmit'):
+            network_labels = _labels(**pod_labels, container='', id=pod_cgroup, interface='eth0', name='')
+            exposition.add(f'container_network_{direction}_bytes_total', 'counter', network_labels, int(elapsed * 20000))
+            exposition.add(f'container_network_{direction}_packets_total', 'counter', network_labels, int(elapsed * 40))
+            exposition.add(f'container_network_{direction}_packets_dropped_total', 'counter', network_labels, 0)
+
+        for container in pod.containers:
+            container_cgroup = f"{pod_cgroup}/{container.container_id.split('//')[1]}"
+            labels = _labels(**pod_labels, container=container.name, id=container_cgroup, image=container.image,
+                             name=container.container_id.split('//')[1])
+            exposition.add('container_cpu_usage_seconds_total', 'counter', labels, round(elapsed * 0.05, 3))
+            exposition.add('container_cpu_cfs_periods_total', 'counter', labels, int(elapsed * 10))
+            exposition.add('container_cpu_cfs_throttled_periods_total', 'counter', labels, int(elapsed * 0.1))
+            exposition.add('container_spec_cpu_quota', 'gauge', labels, 20000)
+            exposition.add('container_spec_cpu_period', 'gauge', labels, 100000)
+            exposition.add('container_spec_memory_limit_bytes', 'gauge', labels, 256 * 2**20)
+            exposition.add('container_memory_working_set_bytes', 'gauge', labels, 96 * 2**20 + int(elapsed) % 4096)
+            exposition.add('container_memory_usage_bytes', 'gauge', labels, 128 * 2**20 + int(elapsed) % 4096)
+            exposition.add('container_fs_usage_bytes', 'gauge', labels, 16 * 2**20)
+            device_labels = _labels(**pod_labels, container=container.name, id=container_cgroup, image=container.image,
+                                    name=container.container_id.split('//')[1], device='/dev/vda')
+            exposition.add('container_fs_reads_total', 'counter', device_labels, int(elapsed * 2))
+            exposition.add('container_fs_writes_total', 'counter', device_labels, int(elapsed * 3))
+            exposition.add('container_fs_reads_bytes_total', 'counter', device_labels, int(elapsed * 8192))
+            exposition.add('container_fs_writes_bytes_total', 'counter', device_labels, int(elapsed * 12288))
+    return exposition
+
+
+def kubelet_metrics(node: str, pods: List[Pod]) -> Exposition:
+    """kubelet series of a node, every third pod has a persistent volume."""
+    exposition = Exposition()
+    exposition.add('kubelet_running_pods', 'gauge', '', len(pods))
+    exposition.add('kubelet_running_containers', 'gauge', _labels(container_state='running'),
+                   sum(len(pod.containers) for pod in pods))
+    for pod in pods[::3]:
+        labels = _labels(namespace=pod.namespace, persistentvolumeclaim=f"data-{pod.name}")
+        exposition.add('kubelet_volume_stats_capacity_bytes', 'gauge', labels, 10 * 2**30)
+        exposition.add('kubelet_volume_stats_available_bytes', 'gauge', labels, 6 * 2**30)
+        exposition.add('kubelet_volume_stats_used_bytes', 'gauge', labels, 4 * 2**30)
+        exposition.add('kubelet_volume_stats_inodes', 'gauge', labels, 655360)
+        exposition.add('kubelet_volume_stats_inodes_used', 'gauge', labels, 1024)
+    return exposition
+
+
+def container_log_message(pod: Pod, container: Container, sequence: int) -> str:
+    """Message of the `sequence`-th line a container logs."""
+    return f"{pod.name}/{container.name} handled request {sequence} in 12ms status=200"
+
+
+class ContainerLogWriter:
+    """Appends CRI formatted lines to /var/log/pods style files under `log_dir`."""
+
+    def __init__(self, log_dir: Path, pods: List[Pod]):
+        self.files = []
+        for pod in pods:
+            for container in pod.containers:
+                path = log_dir / f"{pod.namespace}_{pod.name}_{pod.uid}" / container.name / '0.log'
+                path.parent.mkdir(parents=True, exist_ok=True)
+                self.files.append((open(path, 'a', buffering=1), pod, container))
+        self.lines = 0
+
+    def write(self, count: int):
+        """Write `count` lines round robin over all containers, stamped with the current time."""
+        for i in range(count):
+            f, pod, container = self.files[(self.lines + i) % len(self.files)]
+            now = time.time()
+            timestamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(now)) + f".{int(now % 1 * 1e9):09d}Z"
+            f.write(f"{timestamp} stdout F {container_log_message(pod, container, self.lines + i)}\n")
+        self.lines += count
+
+    def close(self):
+        """Close all log files."""
+        for f, _, _ in self.files:
+            f.close()
+
+
+def otlp_any_value(value: Any) -> Dict[str, Any]:
+    """Encode a JSON value as an OTLP-JSON AnyValue."""
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    if isinstance(value, dict):
+        return {'kvlistValue': {'values': [{'key': k, 'value': otlp_any_value(v)} for k, v in value.items()]}}
+    if isinstance(value, list):
+        return {'arrayValue': {'values': [otlp_any_value(v) for v in value]}}
+    return {'stringValue': str(value)}
+
+
+def _attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{'key': key, 'value': otlp_any_value(value)} for key, value in attributes.items()]
+
+
+def kubernetes_events(pods: List[Pod], count: int, sequence: int) -> Dict[str, Any]:
+    """OTLP-JSON logs export request with `count` events shaped like the k8s_events receiver output."""
+    now = str(time.time_ns())
+    resource_logs = []
+    for i in range(count):
+        pod = pods[(sequence + i) % len(pods)]
+        container = pod.containers[(sequence + i) % len(pod.containers)]
+        resource_logs.append({
+            'resource': {'attributes': _attributes({
+                'k8s.object.kind': 'Pod',
+                'k8s.object.name': pod.name,
+                'k8s.object.uid': pod.uid,
+                'k8s.object.fieldpath': f"spec.containers{{{container.name}}}",
+                'k8s.object.api_version': 'v1',
+                'k8s.object.resource_version': str(sequence + i),
+                'k8s.node.name': pod.node,
+            })},
+            'scopeLogs': [{'logRecords': [{
+                'timeUnixNano': now,
+                'observedTimeUnixNano': now,
+                'severityNumber': 9,
+                'severityText': 'Normal',
+                'body': {'stringValue': f"Started container {container.name}"},
+                'attributes': _attributes({
+                    'k8s.event.reason': 'Started',
+                    'k8s.event.action': '',
+                    'k8s.event.start_time': time.strftime('%Y-%m-%d %H:%M:%S +0000 UTC', time.gmtime()),
+                    'k8s.event.name': f"{pod.name}.{sequence + i:x}",
+                    'k8s.event.uid': str(uuid.uuid4()),
+                    'k8s.namespace.name': pod.namespace,
+                    'k8s.event.count': 1,
+                }),
+            }]}],
+        })
+    return {'resourceLogs': resource_logs}
+
+
+def pod_manifest(pod: Pod) -> Dict[str, Any]:
+    """Pod object as returned by the Kubernetes API."""
+    return {
+        'apiVersion': 'v1',
+        'kind': 'Pod',
+        'metadata': {
+            'name': pod.name,
+            'namespace': pod.namespace,
+            'uid': pod.uid,
+            'labels': {'app': pod.owner},
+            'annotations': {'kubectl.kubernetes.io/restartedAt': '2024-01-01T00:00:00Z'},
+            'ownerReferences': [{'apiVersion': 'apps/v1', 'kind': 'ReplicaSet', 'name': pod.owner, 'controller': True}],
+        },
+        'spec': {
+            'nodeName': pod.node,
+            'containers': [{'name': c.name, 'image': c.image, 'resources': {'requests': {'cpu': '100m', 'memory': '128Mi'}}}
+                           for c in pod.containers],
+        },
+        'status': {
+            'phase': 'Running',
+            'podIP': pod.ip,
+            'conditions': [{'type': 'Ready', 'status': 'True'}],
+            'containerStatuses': [{'name': c.name, 'image': c.image, 'containerID': c.container_id, 'ready': True,
+                                   'restartCount': 0, 'state': {'running': {'startedAt': '2024-01-01T00:00:00Z'}}}
+                                  for c in pod.containers],
+        },
+    }
+
+
+def pod_manifests(pods: List[Pod], watch_type: Optional[str] = None) -> Dict[str, Any]:
+    """OTLP-JSON logs export request with pod manifests shaped like the swok8sobjects receiver output.
+
+    Pull mode (watch_type None) has the manifest as body, watch mode wraps it with the change type.
+    """
+    now = str(time.time_ns())
+    records = []
+    for pod in pods:
+        body = pod_manifest(pod) if watch_type is None else {'type': watch_type, 'object': pod_manifest(pod)}
+        records.append({
+            'timeUnixNano': now,
+            'observedTimeUnixNano': now,
+            'body': otlp_any_value(body),
+            'attributes': _attributes({'k8s.resource.name': 'pods', 'event.domain': 'k8s', 'event.name': pod.name}),
+        })
+    return {'resourceLogs': [{'resource': {'attributes': []}, 'scopeLogs': [{'logRecords': records}]}]}
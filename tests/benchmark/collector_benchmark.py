@@ -0,0 +1,588 @@
+#!/usr/bin/env python3
+"""Throughput benchmark of the metrics, events and node collector configurations.
+
+Each configuration is rendered from the Helm chart, adapted to run outside of
+Kubernetes and started with a local collector binary. Synthetic cluster traffic
+(see cluster_traffic.py) is fed into its receivers and everything it exports
+lands in the in-memory mock receiver (tests/integration/mock_receiver.py).
+Reported per configuration: sustained datapoints and log records per second,
+p50/p99 end-to-end latency, exporter queue depth and collector RSS.
+
+Adapting the configurations to a local run:
+- Kubernetes API based processors and extensions (k8sattributes,
+  k8seventgeneration, resourcedetection, k8s_observer) are left out
+- scrapes of service discovered nodes get static targets served by the load
+  generator, kube-state-metrics is scraped from it through KUBE_STATE_METRICS_URL
+- k8s_events and swok8sobjects are replaced by OTLP/HTTP receivers fed with
+  events and pod manifests shaped like their output
+- filelog reads container logs written to a temporary /var/log/pods tree
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import requests
+from aiohttp import web
+from ruamel.yaml import YAML
+
+import cluster_traffic
+from cluster_traffic import ClusterShape
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT / 'tests' / 'integration'))
+
+from mock_receiver import TelemetryStore, serve  # noqa: E402
+from telemetry_index import metric_datapoints  # noqa: E402
+
+
+BASELINE_VERSION = 1
+CONFIGS = {
+    'metrics': ('templates/metrics-collector-config-map.yaml', 'metrics.config'),
+    'events': ('templates/events-collector-config-map.yaml', 'events.config'),
+    'node': ('templates/node-collector-config-map.yaml', 'logs.config'),
+}
+KUBE_API_PROCESSORS = ('k8sattributes', 'k8seventgeneration', 'resourcedetection')
+KUBE_API_EXTENSIONS = ('k8s_observer',)
+DROPPED_RECEIVERS = ('journald', 'receiver_creator/discovery')
+
+RECEIVER_GRPC_PORT = 19082
+RECEIVER_HTTP_PORT = 14318
+KUBE_STATE_METRICS_PORT = 19100
+NODE_PORTS_START = 19200
+EVENTS_PORT = 14320
+MANIFESTS_PORT = 14321
+HEALTH_PORT = 23133
+TELEMETRY_PORT = 18888
+LOAD_TICK = 0.1
+MIN_REGRESSION = 0.05
+
+
+def render_config(chart_dir: Path, name: str, values_files: List[Path], set_values: List[str],
+                  scrape_interval: str) -> Dict[str, Any]:
+    """Render the collector configuration `name` with helm template."""
+    template, key = CONFIGS[name]
+    command = [
+        'helm', 'template', 'benchmark', str(chart_dir), '--show-only', template,
+        '--set', 'cluster.name=benchmark',
+        '--set', 'cluster.uid=benchmark',
+        '--set', f'otel.endpoint=localhost:{RECEIVER_GRPC_PORT}',
+        '--set', 'otel.api_token=benchmark',
+        '--set', 'otel.metrics.prometheus_check=false',
+        '--set', f'otel.metrics.prometheus.scrape_interval={scrape_interval}',
+        '--set', f'otel.metrics.kube-state-metrics.scrape_interval={scrape_interval}',
+    ]
+    for values_file in values_files:
+        command += ['--values', str(values_file)]
+    for value in set_values:
+        command += ['--set', value]
+
+    yaml = YAML(typ='safe')
+    manifest = yaml.load(subprocess.run(command, check=True, capture_output=True, text=True).stdout)
+    return yaml.load(manifest['data'][key])
+
+
+def _local_scrape_config(job: Dict[str, Any], nodes: Dict[str, int]) -> Dict[str, Any]:
+    """A node scrape job with static targets of the load generator instead of Kubernetes discovery."""
+    job = dict(job)
+    labels = {}
+    for relabel in job.get('relabel_configs', []):
+        if relabel.get('target_label') == 'scrape_job':
+            labels['scrape_job'] = relabel['replacement']
+    for key in ('kubernetes_sd_configs', 'relabel_configs', 'tls_config', 'authorization', 'bearer_token_file'):
+        job.pop(key, None)
+    job['scheme'] = 'http'
+    job['metrics_path'] = '/metrics/cadvisor' if 'cadvisor' in job['job_name'] else '/metrics'
+    job['static_configs'] = [
+        {'targets': [f'localhost:{port}'], 'labels': {**labels, 'kubernetes_io_hostname': node}}
+        for node, port in nodes.items()
+    ]
+    return job
+
+
+def _prune_pipelines(config: Dict[str, Any]):
+    """Remove pipelines left without receivers or exporters and connector ends they leave dangling."""
+    pipelines = config['service']['pipelines']
+    connectors = set(config.get('connectors') or {})
+    while True:
+        exported = {e for pipeline in pipelines.values() for e in pipeline.get('exporters', []) if e in connectors}
+        received = {r for pipeline in pipelines.values() for r in pipeline.get('receivers', []) if r in connectors}
+        changed = False
+        for name, pipeline in list(pipelines.items()):
+            receivers = [r for r in pipeline.get('receivers', []) if r not in connectors or r in exported]
+            exporters = [e for e in pipeline.get('exporters', []) if e not in connectors or e in received]
+            if not receivers or not exporters:
+                del pipelines[name]
+                changed = True
+            elif receivers != pipeline['receivers'] or exporters != pipeline['exporters']:
+                pipeline['receivers'], pipeline['exporters'] = receivers, exporters
+                changed = True
+        if not changed:
+            return
+
+
+def localize_config(config: Dict[str, Any], nodes: Dict[str, int], work_dir: Path) -> Dict[str, Any]:
+    """Adapt a rendered configuration to run outside of Kubernetes against the load generator."""
+    receivers = config.get('receivers') or {}
+    replacements: Dict[str, List[str]] = {name: [] for name in DROPPED_RECEIVERS if name in receivers}
+
+    for name, receiver in list(receivers.items()):
+        kind = name.split('/')[0]
+        if kind == 'k8s_events':
+            receivers['otlp/events'] = {'protocols': {'http': {'endpoint': f'localhost:{EVENTS_PORT}'}}}
+            replacements[name] = ['otlp/events']
+        elif kind == 'swok8sobjects':
+            receivers['otlp/manifests'] = {'protocols': {'http': {'endpoint': f'localhost:{MANIFESTS_PORT}'}}}
+            replacements[name] = ['otlp/manifests']
+        elif name == 'receiver_creator/node':
+            jobs = receiver['receivers']['prometheus/node']['config']['config']['scrape_configs']
+            local_node = dict(list(nodes.items())[:1])
+            receivers['prometheus/node'] = {'config': {'scrape_configs': [_local_scrape_config(job, local_node) for job in jobs]}}
+            replacements[name] = ['prometheus/node']
+        elif kind == 'prometheus':
+            for i, job in enumerate(receiver['config']['scrape_configs']):
+                if 'kubernetes_sd_configs' in job:
+                    receiver['config']['scrape_configs'][i] = _local_scrape_config(job, nodes)
+        elif kind == 'filelog':
+            receiver['include'] = [str(work_dir / 'pods' / '*' / '*' / '*.log')]
+            receiver.pop('exclude', None)
+            receiver['start_at'] = 'beginning'
+    for name in replacements:
+        receivers.pop(name, None)
+
+    for name, extension in (config.get('extensions') or {}).items():
+        if name.startswith('file_storage'):
+            extension['directory'] = str(work_dir / name.replace('/', '_'))
+            os.makedirs(extension['directory'], exist_ok=True)
+        elif name == 'health_check':
+            extension['endpoint'] = f'localhost:{HEALTH_PORT}'
+
+    service = config['service']
+    service['extensions'] = [e for e in service.get('extensions', []) if e.split('/')[0] not in KUBE_API_EXTENSIONS]
+    for pipeline in service['pipelines'].values():
+        pipeline['receivers'] = [r for receiver in pipeline.get('receivers', []) for r in replacements.get(receiver, [receiver])]
+        pipeline['processors'] = [p for p in pipeline.get('processors', []) if p.split('/')[0] not in KUBE_API_PROCESSORS]
+    _prune_pipelines(config)
+
+    service.setdefault('telemetry', {})['metrics'] = {
+        'readers': [{'pull': {'exporter': {'prometheus': {'host': 'localhost', 'port': TELEMETRY_PORT}}}}]
+    }
+    return config
+
+
+def collector_environment(chart: Dict[str, Any], kube_state_metrics_port: int) -> Dict[str, str]:
+    """Environment variables the configurations expect from the chart's deployments."""
+    return {
+        **os.environ,
+        'OTEL_ENVOY_ADDRESS': f'localhost:{RECEIVER_GRPC_PORT}',
+        'OTEL_ENVOY_ADDRESS_TLS_INSECURE': 'true',
+        'SOLARWINDS_API_TOKEN': 'benchmark',
+        'CLUSTER_NAME': 'benchmark',
+        'CLUSTER_UID': 'benchmark',
+        'APP_VERSION': str(chart.get('appVersion', '')),
+        'MANIFEST_VERSION': str(chart.get('version', '')),
+        'NODE_NAME': 'node-0',
+        'POD_NAME': 'benchmark-collector',
+        'POD_NAMESPACE': 'benchmark',
+        'KUBE_STATE_METRICS_URL': f'localhost:{kube_state_metrics_port}',
+        'PROMETHEUS_URL': f'localhost:{kube_state_metrics_port}',
+    }
+
+
+class Measurement:
+    """Counts items arriving at the mock receiver within the measured window and samples their latency.
+
+    Latency is the receive time minus the datapoint or log record timestamp, which is
+    the scrape time for metrics and the time the load generator created a log or event.
+    """
+
+    def __init__(self, sample_size: int = 100000):
+        self.sample_size = sample_size
+        self.lock = threading.Lock()
+        self.reset(float('inf'), float('inf'))
+
+    def reset(self, start: float, end: float):
+        """Measure arrivals between `start` and `end` (unix seconds) from now on."""
+        with self.lock:
+            self.start, self.end = start, end
+            self.datapoints = 0
+            self.log_records = 0
+            self.latencies: List[float] = []
+            self.seen = 0
+
+    def on_request(self, signal: str, request: Dict[str, Any], received: float):
+        """Mock receiver listener, called once per export request."""
+        if not self.start <= received < self.end:
+            return
+        timestamps = []
+        for resource in request.get('resourceMetrics', []):
+            for scope in resource.get('scopeMetrics', []):
+                for metric in scope.get('metrics', []):
+                    timestamps.extend(int(dp.get('timeUnixNano', 0)) for dp in metric_datapoints(metric))
+        datapoints = len(timestamps)
+        for resource in request.get('resourceLogs', []):
+            for scope in resource.get('scopeLogs', []):
+                for record in scope.get('logRecords', []):
+                    timestamps.append(int(record.get('timeUnixNano') or record.get('observedTimeUnixNano') or 0))
+
+        with self.lock:
+            self.datapoints += datapoints
+            self.log_records += len(timestamps) - datapoints
+            for timestamp in timestamps:
+                if not timestamp:
+                    continue
+                latency = received - timestamp / 1e9
+                self.seen += 1
+                if len(self.latencies) < self.sample_size:
+                    self.latencies.append(latency)
+                else:
+                    slot = random.randrange(self.seen)
+                    if slot < self.sample_size:
+                        self.latencies[slot] = latency
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Latency percentile of the sampled items, None without samples."""
+        with self.lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+
+class LoadGenerator:
+    """Serves kube-state-metrics and per node kubelet/cAdvisor endpoints, counts served samples."""
+
+    def __init__(self, shape: ClusterShape):
+        self.shape = shape
+        self.pods = shape.pods()
+        self.pods_by_node = {node: [pod for pod in self.pods if pod.node == node] for node in shape.node_names()}
+        self.node_ports = {node: NODE_PORTS_START + i for i, node in enumerate(shape.node_names())}
+        self.started = time.time()
+        self.served_samples = 0
+
+    def _respond(self, exposition: cluster_traffic.Exposition) -> web.Response:
+        self.served_samples += exposition.samples
+        return web.Response(text=exposition.text(), content_type='text/plain')
+
+    async def start(self):
+        """Start all endpoints on the running event loop."""
+        async def kube_state_metrics(request):
+            return self._respond(cluster_traffic.kube_state_metrics(self.shape, self.pods))
+        await self._serve(KUBE_STATE_METRICS_PORT, [web.get('/metrics', kube_state_metrics)])
+
+        for node, port in self.node_ports.items():
+            pods = self.pods_by_node[node]
+
+            async def cadvisor(request, pods=pods):
+                return self._respond(cluster_traffic.cadvisor_metrics(pods, time.time() - self.started))
+
+            async def kubelet(request, node=node, pods=pods):
+                return self._respond(cluster_traffic.kubelet_metrics(node, pods))
+            await self._serve(port, [web.get('/metrics/cadvisor', cadvisor), web.get('/metrics', kubelet)])
+
+    async def _serve(self, port: int, routes: List[web.RouteDef]):
+        app = web.Application()
+        app.add_routes(routes)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, 'localhost', port).start()
+
+
+def start_servers(store: TelemetryStore, generator: LoadGenerator):
+    """Run the mock receiver and the load generator endpoints on an event loop in a daemon thread."""
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    async def main():
+        await generator.start()
+        started.set()
+        await serve('localhost', RECEIVER_GRPC_PORT, [RECEIVER_HTTP_PORT], store)
+
+    thread = threading.Thread(target=loop.run_until_complete, args=(main(),), daemon=True)
+    thread.start()
+    if not started.wait(30):
+        raise RuntimeError("Load generator endpoints did not start")
+
+
+def process_rss_bytes(pid: int) -> Optional[int]:
+    """Resident set size of a process from /proc, None where it is not available."""
+    try:
+        with open(os.path.join('/proc', str(pid), 'status')) as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def collector_telemetry(session: requests.Session) -> Dict[str, float]:
+    """Exporter queue size/capacity and refused items from the collector's own metrics."""
+    totals = {'queue_size': 0.0, 'queue_capacity': 0.0, 'refused': 0.0}
+    try:
+        response = session.get(f'http://localhost:{TELEMETRY_PORT}/metrics', timeout=5)
+        response.raise_for_status()
+    except requests.exceptions.RequestException:
+        return totals
+    for line in response.text.splitlines():
+        if line.startswith('#') or ' ' not in line:
+            continue
+        name = line.split('{', 1)[0].split(' ', 1)[0]
+        value = float(line.rsplit(' ', 1)[1])
+        if name == 'otelcol_exporter_queue_size':
+            totals['queue_size'] += value
+        elif name == 'otelcol_exporter_queue_capacity':
+            totals['queue_capacity'] += value
+        elif name.startswith('otelcol_receiver_refused_') or name.startswith('otelcol_processor_refused_'):
+            totals['refused'] += value
+    return totals
+
+
+def wait_healthy(process: subprocess.Popen, timeout: float):
+    """Wait until the collector's health_check extension reports ready."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Collector exited with code {process.returncode}")
+        try:
+            if requests.get(f'http://localhost:{HEALTH_PORT}/', timeout=1).status_code == 200:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("Collector did not become healthy")
+
+
+def run_config(name: str, args: argparse.Namespace, generator: LoadGenerator, measurement: Measurement,
+               chart: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one configuration under load and return its results."""
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        config = render_config(args.chart, name, args.values, args.set, args.scrape_interval)
+        config = localize_config(config, generator.node_ports, work_dir)
+        config_path = work_dir / 'config.yaml'
+        with open(config_path, 'w') as f:
+            YAML(typ='safe').dump(config, f)
+
+        log_writer = None
+        if name == 'node':
+            log_writer = cluster_traffic.ContainerLogWriter(work_dir / 'pods', generator.pods_by_node['node-0'])
+
+        with open(work_dir / 'collector.log', 'w') as collector_log:
+            process = subprocess.Popen([str(args.collector), '--config', str(config_path)],
+                                       env=collector_environment(chart, KUBE_STATE_METRICS_PORT),
+                                       stdout=collector_log, stderr=subprocess.STDOUT)
+            try:
+                wait_healthy(process, 60)
+                return _drive_load(name, args, generator, measurement, process, log_writer)
+            except RuntimeError:
+                with open(work_dir / 'collector.log') as f:
+                    print(f.read()[-4000:])
+                raise
+            finally:
+                process.terminate()
+                try:
+                    process.wait(30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                if log_writer:
+                    log_writer.close()
+
+
+def _drive_load(name: str, args: argparse.Namespace, generator: LoadGenerator, measurement: Measurement,
+                process: subprocess.Popen, log_writer: Optional[cluster_traffic.ContainerLogWriter]) -> Dict[str, Any]:
+    """Generate traffic through warmup and the measured window, sampling the collector every second."""
+    session = requests.Session()
+    start = time.time()
+    window_start = start + args.warmup
+    window_end = window_start + args.duration
+    measurement.reset(window_start, window_end)
+
+    generated = 0
+    served_at_window_start = None
+    events_sent = 0
+    next_manifests = start
+    next_sample = window_start
+    queue_sizes: List[float] = []
+    rss_samples: List[int] = []
+    telemetry = {}
+    tick = start
+
+    while True:
+        now = time.time()
+        if now >= window_end:
+            break
+        in_window = now >= window_start
+        if in_window and served_at_window_start is None:
+            served_at_window_start = generator.served_samples
+
+        if log_writer is not None:
+            lines = int(args.log_rate * LOAD_TICK)
+            log_writer.write(lines)
+            generated += lines if in_window else 0
+        if name == 'events':
+            count = int(args.event_rate * LOAD_TICK)
+            request = cluster_traffic.kubernetes_events(generator.pods, count, events_sent)
+            session.post(f'http://localhost:{EVENTS_PORT}/v1/logs', json=request, timeout=30)
+            events_sent += count
+            generated += count if in_window else 0
+            if now >= next_manifests:
+                session.post(f'http://localhost:{MANIFESTS_PORT}/v1/logs',
+                             json=cluster_traffic.pod_manifests(generator.pods), timeout=30)
+                generated += len(generator.pods) if in_window else 0
+                next_manifests = now + args.manifest_interval
+
+        if in_window and now >= next_sample:
+            telemetry = collector_telemetry(session)
+            queue_sizes.append(telemetry['queue_size'])
+            rss = process_rss_bytes(process.pid)
+            if rss is not None:
+                rss_samples.append(rss)
+            next_sample += 1
+
+        if process.poll() is not None:
+            raise RuntimeError(f"Collector exited with code {process.returncode}")
+        tick += LOAD_TICK
+        time.sleep(max(0.0, tick - time.time()))
+
+    if name == 'metrics' or name == 'node':
+        generated += generator.served_samples - (served_at_window_start or generator.served_samples)
+
+    p50, p99 = measurement.percentile(0.5), measurement.percentile(0.99)
+    return {
+        'datapoints_per_second': round(measurement.datapoints / args.duration, 1),
+        'log_records_per_second': round(measurement.log_records / args.duration, 1),
+        'generated_per_second': round(generated / args.duration, 1),
+        'latency_p50_seconds': round(p50, 3) if p50 is not None else None,
+        'latency_p99_seconds': round(p99, 3) if p99 is not None else None,
+        'queue_size_max': max(queue_sizes, default=0),
+        'queue_size_mean': round(sum(queue_sizes) / len(queue_sizes), 1) if queue_sizes else 0,
+        'queue_capacity': telemetry.get('queue_capacity', 0),
+        'refused': telemetry.get('refused', 0),
+        'rss_max_mib': round(max(rss_samples) / 2**20, 1) if rss_samples else None,
+        'rss_last_mib': round(rss_samples[-1] / 2**20, 1) if rss_samples else None,
+    }
+
+
+def load_parameters(args: argparse.Namespace, shape: ClusterShape) -> Dict[str, Any]:
+    """Parameters results depend on, results are only comparable when these match."""
+    return {
+        'cluster': shape.to_dict(),
+        'scrape_interval': args.scrape_interval,
+        'log_rate': args.log_rate,
+        'event_rate': args.event_rate,
+        'manifest_interval': args.manifest_interval,
+        'duration': args.duration,
+    }
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], parameters: Dict[str, Any],
+                          tolerance: float) -> List[str]:
+    """Return descriptions of results worse than the baseline by more than `tolerance` times.
+
+    Throughput may not drop below baseline / tolerance, p99 latency and peak RSS may not
+    exceed baseline * tolerance. Differences under MIN_REGRESSION (relative) are ignored.
+    """
+    if baseline.get('version') != BASELINE_VERSION or baseline.get('parameters') != parameters:
+        print("Baseline was recorded with a different format or load, not comparing")
+        return []
+
+    regressions = []
+    for name, result in results.items():
+        expected = baseline['results'].get(name)
+        if not expected:
+            continue
+        for key in ('datapoints_per_second', 'log_records_per_second'):
+            if expected.get(key) and result[key] < expected[key] / max(tolerance, 1 + MIN_REGRESSION):
+                regressions.append(f"{name} {key}: {result[key]}, baseline {expected[key]}")
+        for key in ('latency_p99_seconds', 'rss_max_mib'):
+            if expected.get(key) and result[key] is not None and result[key] > expected[key] * max(tolerance, 1 + MIN_REGRESSION):
+                regressions.append(f"{name} {key}: {result[key]}, baseline {expected[key]}")
+    return regressions
+
+
+def collector_version(collector: Path) -> str:
+    """First line of the collector's --version output."""
+    try:
+        output = subprocess.run([str(collector), '--version'], capture_output=True, text=True, timeout=30).stdout
+        return output.strip().splitlines()[0] if output.strip() else ''
+    except (OSError, subprocess.TimeoutExpired):
+        return ''
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark collector configurations under synthetic cluster load")
+    parser.add_argument('--collector', type=Path, required=True, help="collector binary built from this repository")
+    parser.add_argument('--chart', type=Path, default=REPO_ROOT / 'deploy' / 'helm', help="Helm chart directory")
+    parser.add_argument('--configs', default='metrics,events,node', help="comma separated configurations to run")
+    parser.add_argument('--values', type=Path, action='append', default=[], help="additional chart values file")
+    parser.add_argument('--set', action='append', default=[], help="additional chart value, as for helm --set")
+    parser.add_argument('--nodes', type=int, default=3, help="cluster nodes")
+    parser.add_argument('--pods-per-node', type=int, default=30, help="pods per node")
+    parser.add_argument('--containers-per-pod', type=int, default=2, help="containers per pod")
+    parser.add_argument('--scrape-interval', default='15s', help="Prometheus scrape interval")
+    parser.add_argument('--log-rate', type=int, default=1000, help="container log lines per second (node config)")
+    parser.add_argument('--event-rate', type=int, default=50, help="Kubernetes events per second (events config)")
+    parser.add_argument('--manifest-interval', type=float, default=60, help="seconds between pod manifest pulls")
+    parser.add_argument('--warmup', type=float, default=30, help="seconds of load before measuring")
+    parser.add_argument('--duration', type=float, default=120, help="measured seconds per configuration")
+    parser.add_argument('--baseline', type=Path, help="fail if results are worse than in this baseline file")
+    parser.add_argument('--tolerance', type=float, default=1.5, help="allowed slowdown against the baseline")
+    parser.add_argument('--output', type=Path, help="write results as a baseline file, e.g. tests/benchmark/baseline.json")
+    args = parser.parse_args()
+
+    shape = ClusterShape(nodes=args.nodes, pods_per_node=args.pods_per_node, containers_per_pod=args.containers_per_pod)
+    with open(args.chart / 'Chart.yaml') as f:
+        chart = YAML(typ='safe').load(f)
+
+    measurement = Measurement()
+    store = TelemetryStore(keep_lines=False)
+    store.listeners.append(measurement.on_request)
+    generator = LoadGenerator(shape)
+    start_servers(store, generator)
+
+    results = {}
+    for name in args.configs.split(','):
+        print(f"Running {name} collector configuration...")
+        results[name] = run_config(name, args, generator, measurement, chart)
+
+    print(f"{shape.nodes} nodes, {shape.pods_per_node} pods per node, {shape.containers_per_pod} containers per pod")
+    for name, result in results.items():
+        print(f"  {name}")
+        for key, value in result.items():
+            print(f"    {key:<24} {value}")
+
+    parameters = load_parameters(args, shape)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'version': BASELINE_VERSION,
+                'chart_version': str(chart.get('version', '')),
+                'collector_version': collector_version(args.collector),
+                'parameters': parameters,
+                'results': results,
+            }, f, indent=2)
+            f.write('\n')
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare_with_baseline(results, json.load(f), parameters, args.tolerance)
+        if regressions:
+            print("Worse than baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
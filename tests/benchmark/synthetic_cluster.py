@@ -0,0 +1,273 @@
+"""Synthetic telemetry of a cluster of any size in the shape the mock file exporters write.
+
+One OTLP-JSON export request per line, resources as the collector exports them,
+for the pods of a ClusterShape (see cluster_traffic.py), so the helper scale
+benchmark (test_helpers_scale.py) and the collector benchmark use the same
+cluster model. `python synthetic_cluster.py <directory>` writes mock files.
+
+Metrics per workload kind come from the expected_telemetry cases of the
+integration tests, so assertions do the same lookups as against a real cluster,
+and metrics of expected_metric_names.txt not covered by them are exported on
+node and cluster resources. Resources of the expected_telemetry test workloads
+are exported last, assertions have to search through everything before them.
+
+churn is the fraction of pods replaced by new ones (new name and uid, see
+Pod.replaced) in every export round, like rollouts and restarts do.
+"""
+
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from cluster_traffic import ClusterShape, Pod, container_log_message, kubernetes_events, pod_manifest
+
+INTEGRATION_DIR = Path(__file__).resolve().parents[1] / 'integration'
+CLUSTER_NAME = 'cluster name'
+CLUSTER_UID = 'cluster-uid-123456789'
+ROUND_SECONDS = 30
+FIRST_TIMESTAMP = 1700000000000000000
+
+# Resource attribute naming an instance of the kind of an expected_telemetry case
+KIND_ATTRIBUTES = ('k8s.container.name', 'k8s.pod.name', 'k8s.deployment.name', 'k8s.replicaset.name',
+                   'k8s.statefulset.name', 'k8s.daemonset.name', 'k8s.cronjob.name', 'k8s.service.name',
+                   'k8s.persistentvolumeclaim.name', 'k8s.persistentvolume.name')
+
+
+def load_expected_cases() -> Dict[str, Dict[str, Any]]:
+    """expected_telemetry cases of the integration tests by file name."""
+    cases = {}
+    for path in sorted((INTEGRATION_DIR / 'expected_telemetry').glob('*.json')):
+        cases[path.name] = json.loads(path.read_text())
+    return cases
+
+
+def load_expected_metric_names() -> List[str]:
+    """Metric names of expected_metric_names.txt."""
+    return (INTEGRATION_DIR / 'expected_metric_names.txt').read_text().splitlines()
+
+
+def case_kind(case: Dict[str, Any]) -> Optional[str]:
+    """Resource attribute naming the instance a case checks, None for cluster level cases."""
+    keys = {attribute['key'] for attribute in case['resource_attributes'] if isinstance(attribute, dict)}
+    return next((key for key in KIND_ATTRIBUTES if key in keys), None)
+
+
+def attributes(values: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{'key': key, 'value': {'stringValue': str(value)}} for key, value in values.items()]
+
+
+def gauge(name: str, timestamp: str, value: float, datapoint_attribute_keys: Sequence[str] = ()) -> Dict[str, Any]:
+    datapoint: Dict[str, Any] = {'timeUnixNano': timestamp, 'asDouble': value}
+    if datapoint_attribute_keys:
+        datapoint['attributes'] = attributes({key: 'value' for key in datapoint_attribute_keys})
+    return {'name': name, 'gauge': {'dataPoints': [datapoint]}}
+
+
+def resource_metrics(resource_attributes: Dict[str, Any], metrics: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        'resource': {'attributes': attributes(resource_attributes)},
+        'scopeMetrics': [{'scope': {}, 'metrics': metrics}],
+    }
+
+
+def resource_logs(resource_attributes: Dict[str, Any], log_records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        'resource': {'attributes': attributes(resource_attributes)},
+        'scopeLogs': [{'scope': {}, 'logRecords': log_records}],
+    }
+
+
+def round_timestamp(round_index: int) -> str:
+    return str(FIRST_TIMESTAMP + round_index * ROUND_SECONDS * 10**9)
+
+
+class SyntheticCluster:
+    """Mock exporter lines of the pods of `shape`, `resources_per_line` resources per export request."""
+
+    def __init__(self, shape: ClusterShape, churn: float = 0.0, resources_per_line: int = 200):
+        self.shape = shape
+        self.churn = churn
+        self.resources_per_line = resources_per_line
+        self.initial_pods = shape.pods()
+        self.cases = load_expected_cases()
+        self.metric_names = load_expected_metric_names()
+
+    def pods(self, round_index: int) -> List[Pod]:
+        """Pods running in an export round, every round replaces the next `churn` fraction of them."""
+        count = len(self.initial_pods)
+        replaced = int(count * self.churn)
+        pods = []
+        for index, pod in enumerate(self.initial_pods):
+            # rounds in which the pod at index was among the replaced ones, wrapping around
+            generation = sum(1 for r in range(round_index) if (index - r * replaced) % count < replaced)
+            pods.append(pod.replaced(generation))
+        return pods
+
+    @staticmethod
+    def _cluster_attributes(**values: Any) -> Dict[str, Any]:
+        return {'sw.k8s.cluster.uid': CLUSTER_UID, 'k8s.cluster.name': CLUSTER_NAME, **values}
+
+    def _pod_attributes(self, pod: Pod) -> Dict[str, Any]:
+        return self._cluster_attributes(**{
+            'k8s.namespace.name': pod.namespace,
+            'k8s.node.name': pod.node,
+            'k8s.pod.name': pod.name,
+            'k8s.pod.uid': pod.uid,
+        })
+
+    def _kind_instances(self, kind: str, pods: List[Pod]) -> List[Dict[str, str]]:
+        """Namespace and name attributes of the instances of a workload kind, named as in the cluster_traffic scrapes."""
+        if kind in ('k8s.deployment.name', 'k8s.replicaset.name', 'k8s.service.name'):
+            owners = dict.fromkeys((pod.namespace, pod.owner) for pod in pods)
+            return [{'k8s.namespace.name': namespace, kind: owner} for namespace, owner in owners]
+        if kind in ('k8s.persistentvolumeclaim.name', 'k8s.persistentvolume.name'):
+            # every third pod has a persistent volume, like kubelet_metrics reports
+            return [{'k8s.namespace.name': pod.namespace, kind: f"data-{pod.name}"} for pod in pods[::3]]
+        return [{'k8s.namespace.name': f"namespace-{i}", kind: f"{kind.split('.')[1]}-{i}"}
+                for i in range(self.shape.namespaces)]
+
+    def _round_resources(self, round_index: int, timestamp: str) -> List[Dict[str, Any]]:
+        cases_by_kind: Dict[Optional[str], List[Dict[str, Any]]] = {}
+        for case in self.cases.values():
+            cases_by_kind.setdefault(case_kind(case), []).append(case)
+
+        def metrics_of(kind: Optional[str], value: float) -> List[Dict[str, Any]]:
+            return [gauge(metric['name'], timestamp, value, metric.get('attributes', ()))
+                    for case in cases_by_kind.get(kind, []) for metric in case['metrics']]
+
+        pods = self.pods(round_index)
+        resources = []
+        for index, pod in enumerate(pods):
+            pod_attributes = self._pod_attributes(pod)
+            resources.append(resource_metrics(pod_attributes, metrics_of('k8s.pod.name', index)))
+            for c, container in enumerate(pod.containers):
+                resources.append(resource_metrics({**pod_attributes, 'k8s.container.name': container.name},
+                                                  metrics_of('k8s.container.name', c)))
+
+        for kind in KIND_ATTRIBUTES[2:]:
+            for i, instance in enumerate(self._kind_instances(kind, pods)):
+                resources.append(resource_metrics(self._cluster_attributes(**instance), metrics_of(kind, i)))
+
+        covered = {metric['name'] for case in self.cases.values() for metric in case['metrics']}
+        node_metric_names = [name for name in self.metric_names if name not in covered and 'node' in name]
+        cluster_metric_names = [name for name in self.metric_names if name not in covered and 'node' not in name]
+        for n, node in enumerate(self.shape.node_names()):
+            resources.append(resource_metrics(self._cluster_attributes(**{'k8s.node.name': node}),
+                                              [gauge(name, timestamp, n) for name in node_metric_names]))
+        resources.append(resource_metrics(
+            self._cluster_attributes(),
+            metrics_of(None, 1) + [gauge(name, timestamp, 1) for name in cluster_metric_names]))
+        return resources
+
+    def _test_workload_resources(self, timestamp: str) -> List[Dict[str, Any]]:
+        resources = []
+        for case in self.cases.values():
+            resource_attributes = {'sw.k8s.cluster.uid': CLUSTER_UID}
+            for attribute in case['resource_attributes']:
+                if isinstance(attribute, dict):
+                    resource_attributes[attribute['key']] = attribute['value']
+            resources.append(resource_metrics(resource_attributes, [
+                gauge(metric['name'], timestamp, 1, metric.get('attributes', ())) for metric in case['metrics']]))
+        return resources
+
+    def _lines(self, resources: List[Dict[str, Any]], key: str) -> List[Dict[str, Any]]:
+        return [{key: resources[i:i + self.resources_per_line]} for i in range(0, len(resources), self.resources_per_line)]
+
+    def metric_lines(self, rounds: int = 1) -> List[Dict[str, Any]]:
+        """Parsed lines of metrics.json after `rounds` export rounds, ROUND_SECONDS apart."""
+        lines = []
+        for round_index in range(rounds):
+            timestamp = round_timestamp(round_index)
+            resources = self._round_resources(round_index, timestamp)
+            if round_index == rounds - 1:
+                resources += self._test_workload_resources(timestamp)
+            lines += self._lines(resources, 'resourceMetrics')
+        return lines
+
+    def log_lines(self, log_type: str, rounds: int = 1, records_per_container: int = 1) -> List[Dict[str, Any]]:
+        """Parsed lines of logs.json, events.json or manifests.json.
+
+        Container logs, one "Started container" event per container or the Pod
+        manifest of every pod in every round, on resources of the pod.
+        """
+        lines = []
+        for round_index in range(rounds):
+            timestamp = round_timestamp(round_index)
+            resources = []
+            for pod in self.pods(round_index):
+                pod_attributes = {**self._pod_attributes(pod), 'sw.k8s.log.type': log_type}
+                if log_type == 'manifest':
+                    record = {'timeUnixNano': timestamp, 'body': {'stringValue': json.dumps(pod_manifest(pod))}}
+                    resources.append(resource_logs(pod_attributes, [record]))
+                    continue
+                for c, container in enumerate(pod.containers):
+                    if log_type == 'event':
+                        # the k8s_events receiver shape, events of a pod's containers are consecutive
+                        event = kubernetes_events([pod], 1, c)['resourceLogs'][0]
+                        records = event['scopeLogs'][0]['logRecords']
+                        for record in records:
+                            record['timeUnixNano'] = record['observedTimeUnixNano'] = timestamp
+                    else:
+                        records = [{'timeUnixNano': timestamp,
+                                    'body': {'stringValue': container_log_message(pod, container, r)}}
+                                   for r in range(records_per_container)]
+                    resources.append(resource_logs({**pod_attributes, 'k8s.container.name': container.name}, records))
+            lines += self._lines(resources, 'resourceLogs')
+        return lines
+
+    def prometheus_lines(self, lines: List[Dict[str, Any]]) -> Iterator[str]:
+        """Prometheus text exposition of the families in the metric lines as scraped.
+
+        Samples have instance and job labels plus the datapoint attributes valid as label names.
+        """
+        for line in lines:
+            for resource in line.get('resourceMetrics', []):
+                for scope in resource['scopeMetrics']:
+                    for metric in scope['metrics']:
+                        family = metric['name'].replace('k8s.', '', 1)
+                        if '.' in family:
+                            continue
+                        for datapoint in metric['gauge']['dataPoints']:
+                            labels = {'instance': 'kube-state-metrics:8080', 'job': 'kube-state-metrics'}
+                            for attribute in datapoint.get('attributes', []):
+                                if '.' not in attribute['key']:
+                                    labels[attribute['key']] = attribute['value']['stringValue']
+                            label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+                            yield f'{family}{{{label_text}}} {datapoint["asDouble"]}'
+
+
+def dump_lines(lines: List[Dict[str, Any]]) -> bytes:
+    """Lines serialized like the mock file exporters write them."""
+    return ''.join(json.dumps(line, separators=(',', ':')) + '\n' for line in lines).encode()
+
+
+def write_files(cluster: SyntheticCluster, directory: Path, rounds: int):
+    """Write metrics.json, logs.json, events.json and manifests.json like the mock file exporters."""
+    directory.mkdir(parents=True, exist_ok=True)
+    files = {
+        'metrics.json': cluster.metric_lines(rounds),
+        'logs.json': cluster.log_lines('container', rounds),
+        'events.json': cluster.log_lines('event', rounds),
+        'manifests.json': cluster.log_lines('manifest', rounds),
+    }
+    for file_name, lines in files.items():
+        (directory / file_name).write_bytes(dump_lines(lines))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic mock exporter files of a cluster")
+    parser.add_argument('directory', type=Path)
+    parser.add_argument('--nodes', type=int, default=20, help="cluster nodes")
+    parser.add_argument('--pods-per-node', type=int, default=50, help="pods per node")
+    parser.add_argument('--containers-per-pod', type=int, default=2, help="containers per pod")
+    parser.add_argument('--churn', type=float, default=0.0, help="fraction of pods replaced every round")
+    parser.add_argument('--rounds', type=int, default=1, help=f"export rounds, {ROUND_SECONDS} seconds apart")
+    args = parser.parse_args()
+
+    shape = ClusterShape(nodes=args.nodes, pods_per_node=args.pods_per_node, containers_per_pod=args.containers_per_pod)
+    write_files(SyntheticCluster(shape, args.churn), args.directory, args.rounds)
+
+
+if __name__ == '__main__':
+    main()
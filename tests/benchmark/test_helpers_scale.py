@@ -0,0 +1,162 @@
+"""Scale benchmark of the integration test helpers over synthetic cluster telemetry.
+
+Every helper runs against payloads of 1k, 10k and 100k pods (see
+synthetic_cluster.py), so helpers going quadratic show up
+as a time jump between sizes. Times are tracked by pytest-benchmark, the peak
+memory of one extra run is stored in the benchmark's extra_info.
+
+Payloads are large: sizes above SCALE_BENCHMARK_MAX_PODS (default 10000) are
+skipped, set it to 100000 to run all of them.
+"""
+
+import os
+import sys
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'integration'))
+
+import test_metric_collection as metric_collection  # noqa: E402
+import test_utils  # noqa: E402
+from cluster_traffic import ClusterShape  # noqa: E402
+from prometheus_comparison import OtlpLabelIndex  # noqa: E402
+from synthetic_cluster import SyntheticCluster, dump_lines  # noqa: E402
+from telemetry_predicates import LogBodyPredicate, ManifestPredicate, MetricPredicate  # noqa: E402
+
+
+POD_COUNTS = (1000, 10000, 100000)
+PODS_PER_NODE = 50
+MAX_PODS = int(os.getenv('SCALE_BENCHMARK_MAX_PODS', '10000'))
+ROUNDS = 2
+CHURN = 0.05
+
+
+class Payload:
+    """Synthetic telemetry of one cluster size, parsed lines and serialized metrics file."""
+
+    def __init__(self, pods: int):
+        self.cluster = SyntheticCluster(ClusterShape(nodes=pods // PODS_PER_NODE, pods_per_node=PODS_PER_NODE), churn=CHURN)
+        self.metric_lines = self.cluster.metric_lines(ROUNDS)
+        self.metrics_file = dump_lines(self.metric_lines)
+        self.log_lines = self.cluster.log_lines('container', ROUNDS)
+        self.manifest_lines = self.cluster.log_lines('manifest', ROUNDS)
+        # every exported datapoint as a scraped series, the comparison grows with the cluster
+        self.prometheus_lines = list(self.cluster.prometheus_lines(self.metric_lines))
+        self.metric_content = test_utils.SentContent(self.metric_lines)
+        self.metric_content.metric_index()
+
+
+@pytest.fixture(scope='module', params=POD_COUNTS, ids=lambda pods: f'{pods}pods')
+def payload(request):
+    if request.param > MAX_PODS:
+        pytest.skip(f'{request.param} pods is above SCALE_BENCHMARK_MAX_PODS={MAX_PODS}')
+    return Payload(request.param)
+
+
+def run(benchmark, func, *args, setup=None):
+    """Benchmark func, then record the peak memory of one more call in extra_info."""
+    if setup is None:
+        result = benchmark.pedantic(func, args=args, rounds=3, iterations=1)
+    else:
+        result = benchmark.pedantic(func, setup=lambda: (setup(), {}), rounds=3, iterations=1)
+
+    call_args = args if setup is None else setup()
+    tracemalloc.start()
+    try:
+        func(*call_args)
+        benchmark.extra_info['peak_memory_mib'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+    finally:
+        tracemalloc.stop()
+    return result
+
+
+def test_get_merged_json(benchmark, payload):
+    lines = run(benchmark, test_utils.get_merged_json, payload.metrics_file)
+    assert len(lines) == len(payload.metric_lines)
+
+
+def test_metric_index(benchmark, payload):
+    index = run(benchmark, test_utils.get_metric_index, setup=lambda: (test_utils.SentContent(payload.metric_lines),))
+    assert index.metric_names
+
+
+def test_assert_metric_names_found(benchmark, payload):
+    is_ok, _ = run(benchmark, metric_collection.assert_metric_names_found, payload.metric_content,
+                   payload.cluster.metric_names)
+    assert is_ok
+
+
+def test_assert_expected_telemetry_cases(benchmark, payload):
+    def assert_all_cases(content):
+        return all(metric_collection.assert_test_contain_expected_datapoints(content, case['metrics'],
+                                                                             case['resource_attributes'])[0]
+                   for case in payload.cluster.cases.values())
+
+    assert run(benchmark, assert_all_cases, payload.metric_content)
+
+
+def test_assert_no_internal_containers(benchmark, payload):
+    is_ok, _ = run(benchmark, metric_collection.assert_test_no_metric_datapoints_for_internal_containers,
+                   payload.metric_content)
+    assert is_ok
+
+
+def test_prometheus_comparison(benchmark, payload):
+    def compare(lines):
+        otlp_labels = OtlpLabelIndex().update(lines)
+        return metric_collection.assert_prometheus_metrics(iter(payload.prometheus_lines), otlp_labels)
+
+    is_ok, error = run(benchmark, compare, payload.metric_lines)
+    assert is_ok, error
+
+
+def test_get_all_bodies(benchmark, payload):
+    bodies = run(benchmark, test_utils.get_all_bodies_for_all_sent_content, test_utils.SentContent(payload.log_lines))
+    assert bodies
+
+
+def test_get_all_resources(benchmark, payload):
+    resources = run(benchmark, test_utils.get_all_resources_for_all_sent_content,
+                    test_utils.SentContent(payload.log_lines))
+    assert resources
+
+
+def test_resource_attribute_lookup(benchmark, payload):
+    resources = [resource['resource'] for line in payload.log_lines for resource in line['resourceLogs']]
+
+    def lookup_all():
+        return [test_utils.get_attribute_key_and_value(resource, 'k8s.container.name') for resource in resources]
+
+    assert all(run(benchmark, lookup_all))
+
+
+def test_manifest_index(benchmark, payload):
+    last_manifest = payload.manifest_lines[-1]['resourceLogs'][-1]['resource']['attributes']
+    attributes = {attribute['key']: attribute['value']['stringValue'] for attribute in last_manifest}
+
+    def find_last_manifest(content):
+        return test_utils.get_manifest_index(content).find('Pod', attributes['k8s.pod.name'],
+                                                         attributes['k8s.namespace.name'])
+
+    found = run(benchmark, find_last_manifest, setup=lambda: (test_utils.SentContent(payload.manifest_lines),))
+    assert found
+
+
+def test_feed_dispatch(benchmark, payload):
+    # one subscription per expected_telemetry case plus a log and a manifest wait,
+    # all matching only in the last lines, so every line is checked against all of them
+    def dispatch_all():
+        feed = test_utils.TelemetryFeed(source=None)
+        subscriptions = [feed.subscribe(MetricPredicate(case['metrics'][0]['name'], {
+            attribute['key']: attribute['value'] for attribute in case['resource_attributes'] if isinstance(attribute, dict)
+        })) for case in payload.cluster.cases.values()]
+        subscriptions.append(feed.subscribe(LogBodyPredicate('never logged')))
+        subscriptions.append(feed.subscribe(ManifestPredicate('Pod', 'never-created', 'default')))
+        feed.dispatch(payload.metric_lines)
+        feed.dispatch(payload.manifest_lines)
+        return subscriptions
+
+    subscriptions = run(benchmark, dispatch_all)
+    assert all(subscription.matched for subscription in subscriptions[:-2])
@@ -0,0 +1,135 @@
+import asyncio
+import pytest
+import re
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Test modules declare the pods they need as module level `workloads`
+# (kubectl_fixtures.TestWorkloads), they exist for the duration of the module
+@pytest.fixture(scope='module', autouse=True)
+def kubectl_workloads(request):
+    workloads = getattr(request.module, 'workloads', None)
+    if workloads is None:
+        yield None
+        return
+
+    workloads.create()
+    yield workloads
+    workloads.delete()
+
+
+# Serves files from memory like nginx serves the mock exporter files: ETag
+# validators changing with every write, 304 for a matching If-None-Match and
+# `Range: bytes=N-` requests, 416 when N is not before the end of the file.
+# With ignore_range it answers range requests with the whole file.
+# Requests are recorded as (path, Range header, response status).
+class FileServer:
+    def __init__(self):
+        self.files = {}
+        self.versions = {}
+        self.requests = []
+        self.ignore_range = False
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, name):
+        return f'http://127.0.0.1:{self.server.server_port}/{name}'
+
+    def write(self, name, data):
+        self.files[name] = data
+        self.versions[name] = self.versions.get(name, 0) + 1
+
+    def append(self, name, data):
+        self.write(name, self.files.get(name, b'') + data)
+
+    def etag(self, name):
+        return f'"{self.versions[name]}-{len(self.files[name])}"'
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        file_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                name = self.path.lstrip('/')
+                range_header = self.headers.get('Range')
+                status, body, headers = file_server._respond(name, range_header, self.headers.get('If-None-Match'))
+                file_server.requests.append((name, range_header, status))
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _respond(self, name, range_header, if_none_match):
+        if name not in self.files:
+            return 404, b'', {}
+        data = self.files[name]
+        headers = {'ETag': self.etag(name)}
+        if if_none_match == self.etag(name):
+            return 304, b'', headers
+
+        match = re.fullmatch(r'bytes=(\d+)-', range_header or '')
+        if not match or self.ignore_range:
+            return 200, data, headers
+        start = int(match.group(1))
+        if start >= len(data):
+            headers['Content-Range'] = f'bytes */{len(data)}'
+            return 416, b'', headers
+        headers['Content-Range'] = f'bytes {start}-{len(data) - 1}/{len(data)}'
+        return 206, data[start:], headers
+
+
+@pytest.fixture
+def file_server():
+    server = FileServer()
+    yield server
+    server.close()
+
+
+# mock_receiver.py serving on a free port from a background thread, so clients
+# of its endpoints can be tested with blocking requests. aiohttp is imported
+# here, only tests using the fixture need it.
+class ReceiverThread:
+    def __init__(self):
+        from aiohttp import web
+        from mock_receiver import TelemetryStore, create_app
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        self.base_url = f'http://127.0.0.1:{sock.getsockname()[1]}'
+
+        async def start():
+            self.store = TelemetryStore()
+            self.runner = web.AppRunner(create_app(self.store))
+            await self.runner.setup()
+            await web.SockSite(self.runner, sock).start()
+        asyncio.run_coroutine_threadsafe(start(), self.loop).result()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+@pytest.fixture
+def mock_receiver():
+    receiver = ReceiverThread()
+    yield receiver
+    receiver.close()
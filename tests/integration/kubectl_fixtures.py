@@ -0,0 +1,82 @@
+import asyncio
+
+
+async def run_kubectl(*args):
+    print('kubectl ' + ' '.join(args))
+    try:
+        process = await asyncio.create_subprocess_exec(
+            'kubectl', *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    except OSError as e:
+        # like a shell would, report the failed command and return its exit code
+        print(f'Failed to run kubectl: {e}')
+        return 127
+    stdout, stderr = await process.communicate()
+    print(stdout.decode())
+    print(stderr.decode())
+    return process.returncode
+
+
+class Pod:
+    def __init__(self, name, namespace, image, args, labels, annotations, overrides, wait_ready):
+        self.name = name
+        self.namespace = namespace
+        self.image = image
+        self.args = args
+        self.labels = labels
+        self.annotations = annotations
+        self.overrides = overrides
+        self.wait_ready = wait_ready
+
+    def run_args(self):
+        args = ['run', self.name, '--image', self.image, '-n', self.namespace]
+        if self.labels:
+            args += ['--labels', ','.join(f'{key}={value}' for key, value in self.labels.items())]
+        for key, value in (self.annotations or {}).items():
+            args += ['--annotations', f'{key}={value}']
+        if self.overrides:
+            args += ['--overrides', self.overrides]
+        if self.args:
+            args += ['--'] + self.args
+        return args
+
+
+# Workloads a test module needs in the cluster. They are created once per module
+# by the kubectl_workloads fixture in conftest.py, all kubectl calls of a phase
+# run concurrently, readiness is awaited with `kubectl wait` and pods are
+# deleted in bulk, one kubectl call per namespace.
+class TestWorkloads:
+    # not a test class, prevent pytest from collecting it
+    __test__ = False
+
+    def __init__(self, ready_timeout = 120):
+        self.pods = []
+        self.ready_timeout = ready_timeout
+
+    def add_pod(self, name, image, args = None, namespace = 'default', labels = None, annotations = None,
+                overrides = None, wait_ready = True):
+        self.pods.append(Pod(name, namespace, image, args, labels, annotations, overrides, wait_ready))
+
+    def create(self):
+        asyncio.run(self._create())
+
+    def delete(self):
+        asyncio.run(self._delete())
+
+    async def _create(self):
+        await asyncio.gather(*(run_kubectl(*pod.run_args()) for pod in self.pods))
+        await asyncio.gather(*(
+            run_kubectl('wait', '--for=condition=Ready', f'--timeout={self.ready_timeout}s', '-n', namespace,
+                        *(f'pod/{name}' for name in names))
+            for namespace, names in self._pods_by_namespace(lambda pod: pod.wait_ready).items()))
+
+    async def _delete(self):
+        await asyncio.gather(*(
+            run_kubectl('delete', 'pod', '--ignore-not-found', '-n', namespace, *names)
+            for namespace, names in self._pods_by_namespace(lambda pod: True).items()))
+
+    def _pods_by_namespace(self, predicate):
+        result = {}
+        for pod in self.pods:
+            if predicate(pod):
+                result.setdefault(pod.namespace, []).append(pod.name)
+        return result
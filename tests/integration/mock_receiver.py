@@ -0,0 +1,372 @@
+import argparse
+import asyncio
+import json
+import re
+import time
+
+from aiohttp import web
+
+import otlp_json
+from telemetry_index import ManifestIndex, MetricIndex
+from telemetry_predicates import predicate_from_query
+
+# Pure Python stand-in for the timeseries-mock-service collector. It receives
+# OTLP over gRPC and HTTP, keeps every export request in memory and serves it:
+#   GET /<stream>.json            the same newline delimited OTLP-JSON the file
+#                                 exporters write, with Range and ETag support,
+#                                 so test_utils reads it like the nginx files
+#   GET /query/<stream>?since=N   lines from N on, optionally filtered by a
+#                                 predicate (see telemetry_predicates) and, with
+#                                 wait=<seconds>, waiting for lines to arrive,
+#                                 generation=G restarts them after a reset
+#   GET /wait/<stream>?...        long poll until a line matches a predicate
+#   GET /index/metrics?name=...   lookups in the metric and manifest indexes
+#   GET /index/manifests?kind=...
+#   POST /reset                   forget everything received so far
+#
+# OTLP/gRPC needs grpcio and opentelemetry-proto, protobuf payloads over HTTP
+# opentelemetry-proto (see requirements-mock-receiver.txt). Without them only
+# OTLP/HTTP with JSON payloads is received.
+try:
+    from google.protobuf.json_format import MessageToDict
+    from opentelemetry.proto.collector.logs.v1 import logs_service_pb2
+    from opentelemetry.proto.collector.metrics.v1 import metrics_service_pb2
+except ImportError:
+    MessageToDict = None
+
+try:
+    import grpc
+    from opentelemetry.proto.collector.logs.v1 import logs_service_pb2_grpc
+    from opentelemetry.proto.collector.metrics.v1 import metrics_service_pb2_grpc
+except ImportError:
+    grpc = None
+
+
+# Log streams and the sw.k8s.log.type patterns routing resources to them, the
+# IsMatch conditions of the filter/* processors in timeseries-mock-service.
+# Like there, a resource can go to several streams (entitystateevent matches
+# "event" too) and resources matching none of them go to logs.
+log_routes = [
+    ('events', re.compile('event')),
+    ('manifests', re.compile('manifest')),
+    ('entitystateevents', re.compile('entitystateevent')),
+]
+stream_names = ('metrics', 'logs', 'events', 'manifests', 'entitystateevents')
+
+
+def log_type(resource):
+    for attribute in resource.get('resource', {}).get('attributes', []):
+        if attribute['key'] == 'sw.k8s.log.type':
+            return attribute['value'].get('stringValue', '')
+    return ''
+
+
+def message_to_json(message):
+    # int64 values become strings and enums integers, as in OTLP-JSON
+    return MessageToDict(message, use_integers_for_enums=True)
+
+
+# One exported file: serialized lines (what /<stream>.json serves) and their
+# decoded form, metric and manifest indexes are updated lazily on lookup
+class TelemetryStream:
+    def __init__(self, name):
+        self.name = name
+        self.generation = 0
+        self.clear()
+
+    def clear(self):
+        self.generation += 1
+        self.data = bytearray()
+        self.lines = []
+        self._metric_index = MetricIndex()
+        self._manifest_index = ManifestIndex()
+
+    def append(self, line):
+        self.data += json.dumps(line, separators=(',', ':')).encode() + b'\n'
+        self.lines.append(line)
+
+    @property
+    def etag(self):
+        return f'"{self.generation}-{len(self.data)}"'
+
+    def metric_index(self):
+        return self._metric_index.update(self.lines)
+
+    def manifest_index(self):
+        return self._manifest_index.update(self.lines)
+
+
+# listeners are called with (signal, export request, receive time) once for
+# every received request, before logs are routed to streams, so a resource
+# routed to several streams is seen once. keep_lines False only passes
+# requests to them, e.g. for long running benchmarks
+class TelemetryStore:
+    def __init__(self, keep_lines = True):
+        self.streams = {name: TelemetryStream(name) for name in stream_names}
+        self.arrived = asyncio.Condition()
+        self.keep_lines = keep_lines
+        self.listeners = []
+
+    def _received(self, signal, request):
+        received = time.time()
+        for listener in self.listeners:
+            listener(signal, request, received)
+
+    async def add_metrics(self, request):
+        if request.get('resourceMetrics'):
+            self._received('metrics', request)
+            if self.keep_lines:
+                self.streams['metrics'].append(request)
+            await self._notify()
+
+    async def add_logs(self, request):
+        if not request.get('resourceLogs'):
+            return
+        self._received('logs', request)
+        if not self.keep_lines:
+            return
+
+        routed = {}
+        for resource in request['resourceLogs']:
+            resource_log_type = log_type(resource)
+            names = [name for name, pattern in log_routes if pattern.search(resource_log_type)] or ['logs']
+            for name in names:
+                routed.setdefault(name, []).append(resource)
+
+        for name, resources in routed.items():
+            self.streams[name].append({'resourceLogs': resources})
+        await self._notify()
+
+    async def reset(self):
+        for stream in self.streams.values():
+            stream.clear()
+        await self._notify()
+
+    async def _notify(self):
+        async with self.arrived:
+            self.arrived.notify_all()
+
+    # Waits until the stream has more than `since` lines, returns False on timeout
+    async def wait_for_lines(self, stream, since, timeout):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        async with self.arrived:
+            while len(stream.lines) <= since:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(self.arrived.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        return True
+
+    # Returns index of the first line from `since` on matching the predicate, None on timeout.
+    # Each line is checked once, waiting resumes after the last checked line.
+    async def wait_for_match(self, stream, predicate, since, timeout):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        position = since
+        while True:
+            for index in range(position, len(stream.lines)):
+                if predicate.matches(stream.lines[index]):
+                    return index
+            position = max(position, len(stream.lines))
+            remaining = deadline - loop.time()
+            if remaining <= 0 or not await self.wait_for_lines(stream, position, remaining):
+                return None
+
+
+def _stream(request):
+    store = request.app['store']
+    stream = store.streams.get(request.match_info['stream'])
+    if stream is None:
+        raise web.HTTPNotFound(text=f"unknown stream {request.match_info['stream']}")
+    return store, stream
+
+
+async def _export(request, request_type, add):
+    body = await request.read()
+    content_type = request.content_type
+    if content_type == 'application/json':
+        await add(otlp_json.loads(body) if body else {})
+        return web.json_response({})
+    if content_type == 'application/x-protobuf':
+        if MessageToDict is None:
+            raise web.HTTPUnsupportedMediaType(text='opentelemetry-proto is not installed, send JSON')
+        await add(message_to_json(request_type.FromString(body)))
+        return web.Response(body=b'', content_type='application/x-protobuf')
+    raise web.HTTPUnsupportedMediaType(text=f'unsupported content type {content_type}')
+
+
+async def export_metrics(request):
+    request_type = metrics_service_pb2.ExportMetricsServiceRequest if MessageToDict else None
+    return await _export(request, request_type, request.app['store'].add_metrics)
+
+
+async def export_logs(request):
+    request_type = logs_service_pb2.ExportLogsServiceRequest if MessageToDict else None
+    return await _export(request, request_type, request.app['store'].add_logs)
+
+
+# Serves the stream like nginx serves a growing file: conditional requests get
+# 304 while nothing arrived, `Range: bytes=N-` gets the data from N on
+async def get_file(request):
+    _, stream = _stream(request)
+    data = bytes(stream.data)
+    headers = {'ETag': stream.etag, 'Accept-Ranges': 'bytes'}
+    if request.headers.get('If-None-Match') == stream.etag:
+        return web.Response(status=304, headers=headers)
+
+    range_header = request.headers.get('Range', '')
+    match = re.fullmatch(r'bytes=(\d+)-', range_header)
+    if not match:
+        return web.Response(body=data, headers=headers, content_type='application/json')
+
+    start = int(match.group(1))
+    if start >= len(data):
+        headers['Content-Range'] = f'bytes */{len(data)}'
+        return web.Response(status=416, headers=headers)
+    headers['Content-Range'] = f'bytes {start}-{len(data) - 1}/{len(data)}'
+    return web.Response(status=206, body=data[start:], headers=headers, content_type='application/json')
+
+
+# A generation other than the stream's (returned with every response) or since
+# beyond the received lines means the store was reset in the meantime, also
+# while waiting, lines are then returned from the start with restarted set
+async def query(request):
+    store, stream = _stream(request)
+    since = int(request.query.get('since', 0))
+    generation = int(request.query.get('generation', stream.generation))
+    restarted = since > len(stream.lines) or generation != stream.generation
+    if restarted:
+        since = 0
+    wait = float(request.query.get('wait', 0))
+    if wait > 0:
+        generation = stream.generation
+        await store.wait_for_lines(stream, since, wait)
+        if stream.generation != generation:
+            restarted, since = True, 0
+
+    predicate = predicate_from_query(request.query)
+    lines = stream.lines[since:]
+    return web.json_response({
+        'next': since + len(lines),
+        'generation': stream.generation,
+        'restarted': restarted,
+        'lines': [line for line in lines if predicate.matches(line)],
+    })
+
+
+async def wait(request):
+    store, stream = _stream(request)
+    predicate = predicate_from_query(request.query)
+    index = await store.wait_for_match(stream, predicate, int(request.query.get('since', 0)),
+                                       float(request.query.get('timeout', 30)))
+    if index is None:
+        return web.json_response({'matched': False, 'predicate': repr(predicate), 'next': len(stream.lines)}, status=408)
+    return web.json_response({'matched': True, 'index': index, 'line': stream.lines[index]})
+
+
+async def index_metrics(request):
+    index = request.app['store'].streams['metrics'].metric_index()
+    resource_attributes = [{'key': key[len('resource.'):], 'value': value}
+                           for key, value in request.query.items() if key.startswith('resource.')]
+    datapoint_attribute_keys = request.query.getall('datapoint_attribute', [])
+    return web.json_response({
+        'found': index.has_metric(request.query['name'], resource_attributes, datapoint_attribute_keys)
+    })
+
+
+async def index_manifests(request):
+    index = request.app['store'].streams['manifests'].manifest_index()
+    found = index.find(request.query['kind'], request.query.get('name'), request.query.get('namespace'))
+    return web.json_response({'manifests': [raw for raw, _ in found]})
+
+
+async def reset(request):
+    await request.app['store'].reset()
+    return web.json_response({})
+
+
+async def health(request):
+    return web.json_response({'status': 'ok'})
+
+
+def create_app(store):
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app['store'] = store
+    app.add_routes([
+        web.post('/v1/metrics', export_metrics),
+        web.post('/v1/logs', export_logs),
+        web.get('/query/{stream}', query),
+        web.get('/wait/{stream}', wait),
+        web.get('/index/metrics', index_metrics),
+        web.get('/index/manifests', index_manifests),
+        web.post('/reset', reset),
+        web.get('/health', health),
+        web.get('/{stream}.json', get_file),
+    ])
+    return app
+
+
+if grpc is not None:
+    class MetricsService(metrics_service_pb2_grpc.MetricsServiceServicer):
+        def __init__(self, store):
+            self.store = store
+
+        async def Export(self, request, context):
+            await self.store.add_metrics(message_to_json(request))
+            return metrics_service_pb2.ExportMetricsServiceResponse()
+
+    class LogsService(logs_service_pb2_grpc.LogsServiceServicer):
+        def __init__(self, store):
+            self.store = store
+
+        async def Export(self, request, context):
+            await self.store.add_logs(message_to_json(request))
+            return logs_service_pb2.ExportLogsServiceResponse()
+
+
+async def start_grpc_server(store, host, port):
+    if grpc is None:
+        print('grpcio and opentelemetry-proto are not installed, OTLP/gRPC receiver is disabled')
+        return None
+
+    server = grpc.aio.server(options=[('grpc.max_receive_message_length', 64 * 1024 * 1024)])
+    metrics_service_pb2_grpc.add_MetricsServiceServicer_to_server(MetricsService(store), server)
+    logs_service_pb2_grpc.add_LogsServiceServicer_to_server(LogsService(store), server)
+    server.add_insecure_port(f'{host}:{port}')
+    await server.start()
+    return server
+
+
+async def serve(host, grpc_port, http_ports, store = None):
+    store = store or TelemetryStore()
+    runner = web.AppRunner(create_app(store))
+    await runner.setup()
+    for port in dict.fromkeys(http_ports):
+        await web.TCPSite(runner, host, port).start()
+
+    grpc_server = await start_grpc_server(store, host, grpc_port) if grpc_port else None
+    print(f'Receiving OTLP/gRPC on {grpc_port if grpc_server else "-"}, OTLP/HTTP and queries on {", ".join(map(str, http_ports))}')
+    try:
+        await asyncio.Event().wait()
+    finally:
+        if grpc_server is not None:
+            await grpc_server.stop(None)
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OTLP mock receiver keeping telemetry in memory')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--grpc-port', type=int, default=9082, help='OTLP/gRPC port, 0 disables it')
+    parser.add_argument('--http-port', type=int, default=4318, help='OTLP/HTTP port')
+    parser.add_argument('--query-port', type=int, default=8088, help='port serving the received telemetry')
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.grpc_port, [args.http_port, args.query_port]))
+
+
+if __name__ == '__main__':
+    main()
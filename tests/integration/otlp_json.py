@@ -0,0 +1,60 @@
+import functools
+import json
+import os
+
+# Decoder for OTLP-JSON lines and JSON log bodies. The fastest installed
+# library is used unless OTLP_JSON_DECODER selects one (orjson, msgspec, json).
+# All of them produce the same plain dicts/lists, so helpers do not care.
+
+def _orjson_loads():
+    import orjson
+    return orjson.loads
+
+
+def _msgspec_loads():
+    import msgspec
+    decode = msgspec.json.Decoder().decode
+
+    # raise ValueError on invalid JSON like json and orjson do
+    def loads(data):
+        try:
+            return decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+    return loads
+
+
+def _json_loads():
+    return json.loads
+
+
+_decoders = {
+    'orjson': _orjson_loads,
+    'msgspec': _msgspec_loads,
+    'json': _json_loads,
+}
+
+
+def _select_decoder():
+    requested = os.getenv('OTLP_JSON_DECODER')
+    if requested:
+        if requested not in _decoders:
+            raise ValueError(f"Unknown OTLP_JSON_DECODER '{requested}', valid values are: {', '.join(_decoders)}")
+        return requested, _decoders[requested]()
+
+    for name, factory in _decoders.items():
+        try:
+            return name, factory()
+        except ImportError:
+            continue
+
+
+decoder_name, loads = _select_decoder()
+
+
+# Log bodies such as manifests are JSON documents serialized into stringValue.
+# They stay strings in decoded lines and are decoded only when an assertion
+# asks for them, the same body polled again is served from the cache.
+@functools.lru_cache(maxsize=4096)
+def decode_body(raw_body):
+    return loads(raw_body)
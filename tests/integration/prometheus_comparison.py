@@ -0,0 +1,83 @@
+import re
+from telemetry_index import metric_datapoints
+
+# Labels Prometheus adds to scraped series which are not part of the OTLP output.
+# prometheus, prometheus_replica and endpoint are removed from all datapoints by
+# the collector, instance and job are dropped by the mock receiver.
+ignored_labels = frozenset(['prometheus', 'prometheus_replica', 'endpoint', 'instance', 'job'])
+
+
+def otlp_family_name(metric_name):
+    return metric_name.replace('k8s.', '')
+
+
+# Canonical label sets (label names) of OTLP datapoints per Prometheus metric
+# family, a datapoint is labeled by its resource and datapoint attributes.
+# Prometheus series are compared by their label names minus ignored_labels,
+# the result is memoized per (family, label names) so a scrape with many
+# series sharing the same label names costs one hash lookup per series.
+class OtlpLabelIndex:
+    def __init__(self):
+        self.line_count = 0
+        self.families = {}
+        self._missing = {}
+
+    def update(self, lines):
+        new_lines = lines[self.line_count:]
+        for json_line in new_lines:
+            for resource in json_line.get('resourceMetrics', []):
+                resource_keys = frozenset(attr['key'] for attr in resource.get('resource', {}).get('attributes', []))
+                for scope in resource.get('scopeMetrics', []):
+                    for metric in scope.get('metrics', []):
+                        self._add_metric(resource_keys, metric)
+        self.line_count = len(lines)
+        if new_lines:
+            self._missing = {}
+        return self
+
+    def _add_metric(self, resource_keys, metric):
+        family_name = otlp_family_name(metric['name'])
+        if '.' in family_name:
+            return
+
+        label_sets = self.families.setdefault(family_name, set())
+        for datapoint in metric_datapoints(metric):
+            label_sets.add(resource_keys | frozenset(attr['key'] for attr in datapoint.get('attributes', [])))
+
+    def __contains__(self, family_name):
+        return family_name in self.families
+
+    # Returns names of labels of the series missing on the closest OTLP datapoint, empty if there is one having all of them
+    def missing_labels(self, family_name, label_names):
+        label_names = frozenset(label_names) - ignored_labels
+        key = (family_name, label_names)
+        missing = self._missing.get(key)
+        if missing is None:
+            missing = min((label_names - label_set for label_set in self.families.get(family_name, ())),
+                          key=len, default=label_names)
+            self._missing[key] = missing
+        return missing
+
+
+_sample_name = re.compile(r'[^{\s]+')
+_sample_suffixes = ('_total', '_bucket', '_count', '_sum', '_created', '_info')
+
+
+def _is_wanted_sample(name, families):
+    if name in families:
+        return True
+    return any(name.endswith(suffix) and name[:-len(suffix)] in families for suffix in _sample_suffixes)
+
+
+# Passes through lines of Prometheus text exposition, dropping samples of
+# families not in `families` before they get parsed. HELP/TYPE lines are kept,
+# so the parser still splits families correctly and yields them without samples.
+def filter_exposition_lines(lines, families):
+    for line in lines:
+        if not line or line.startswith('#'):
+            yield line
+            continue
+
+        match = _sample_name.match(line.strip())
+        if match and _is_wanted_sample(match.group(), families):
+            yield line
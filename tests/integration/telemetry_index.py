@@ -0,0 +1,156 @@
+from otlp_json import decode_body
+
+
+def attribute_value(value):
+    for value_type in ('stringValue', 'boolValue', 'intValue', 'doubleValue'):
+        if value_type in value:
+            return value[value_type]
+    return None
+
+
+def attributes_to_dict(attributes):
+    return {attr['key']: attribute_value(attr['value']) for attr in attributes}
+
+
+def metric_datapoints(metric):
+    for data_type in ('gauge', 'sum', 'histogram', 'exponentialHistogram', 'summary'):
+        if data_type in metric:
+            return metric[data_type].get('dataPoints', [])
+    return []
+
+
+# Index over OTLP-JSON metric lines as written by the mock file exporter.
+# Every distinct resource (by its attribute set) gets an id and metrics are
+# indexed by name and resource id, resources by attribute key and key/value,
+# so assertions do lookups instead of scanning every line on every poll.
+# update() indexes only lines added since the previous call.
+class MetricIndex:
+    def __init__(self):
+        self.line_count = 0
+        self.resources = []
+        self.resource_ids = {}
+        # resource attribute (key, value) -> ids of resources having it
+        self.resources_by_attribute = {}
+        # resource attribute key -> ids of resources having non-empty value for it
+        self.resources_by_key = {}
+        # metric name -> resource id -> distinct sets of datapoint attribute keys with non-empty values
+        self.metrics = {}
+
+    def update(self, lines):
+        for json_line in lines[self.line_count:]:
+            for resource in json_line.get('resourceMetrics', []):
+                resource_id = self._add_resource(resource.get('resource', {}))
+                for scope in resource.get('scopeMetrics', []):
+                    for metric in scope.get('metrics', []):
+                        self._add_metric(resource_id, metric)
+        self.line_count = len(lines)
+        return self
+
+    def _add_resource(self, resource):
+        attributes = attributes_to_dict(resource.get('attributes', []))
+        identity = frozenset((key, repr(value)) for key, value in attributes.items())
+        resource_id = self.resource_ids.get(identity)
+        if resource_id is not None:
+            return resource_id
+
+        resource_id = len(self.resources)
+        self.resource_ids[identity] = resource_id
+        self.resources.append(attributes)
+        for key, value in attributes.items():
+            if isinstance(value, (str, bool, int, float)):
+                self.resources_by_attribute.setdefault((key, value), set()).add(resource_id)
+            if value:
+                self.resources_by_key.setdefault(key, set()).add(resource_id)
+        return resource_id
+
+    def _add_metric(self, resource_id, metric):
+        key_sets = self.metrics.setdefault(metric['name'], {}).setdefault(resource_id, set())
+        for datapoint in metric_datapoints(metric):
+            key_sets.add(frozenset(attr['key'] for attr in datapoint.get('attributes', [])
+                                   if attribute_value(attr['value'])))
+
+    @property
+    def metric_names(self):
+        return set(self.metrics)
+
+    # resource_attributes follow the expected_telemetry format: a plain string
+    # requires non-empty value for the key, {"key": ..., "value": ...} an exact value
+    def find_resources(self, resource_attributes):
+        candidates = None
+        for attribute in resource_attributes:
+            if isinstance(attribute, dict):
+                matching = self.resources_by_attribute.get((attribute['key'], attribute['value']), set())
+            else:
+                matching = self.resources_by_key.get(attribute, set())
+            candidates = set(matching) if candidates is None else candidates & matching
+            if not candidates:
+                return set()
+
+        if candidates is None:
+            return set(range(len(self.resources)))
+        return candidates
+
+    def has_metric(self, name, resource_attributes=(), datapoint_attribute_keys=()):
+        by_resource = self.metrics.get(name)
+        if not by_resource:
+            return False
+
+        resource_ids = self.find_resources(resource_attributes)
+        required_keys = frozenset(datapoint_attribute_keys)
+        for resource_id in resource_ids & by_resource.keys():
+            if not required_keys:
+                return True
+            if any(required_keys <= keys for keys in by_resource[resource_id]):
+                return True
+        return False
+
+
+# Returns (kind, metadata.name, metadata.namespace) of a serialized manifest,
+# watch events ({"type": ..., "object": <manifest>}) are identified by their object.
+# The body is decoded through the cached decode_body, assertions reading the
+# matching manifests afterwards get them without decoding again.
+def manifest_identity(raw_manifest):
+    try:
+        manifest = decode_body(raw_manifest)
+    except ValueError:
+        return None
+    if not isinstance(manifest, dict):
+        return None
+    if 'kind' not in manifest and isinstance(manifest.get('object'), dict):
+        manifest = manifest['object']
+    metadata = manifest.get('metadata')
+    if not isinstance(metadata, dict):
+        metadata = {}
+    return (manifest.get('kind'), metadata.get('name'), metadata.get('namespace'))
+
+
+# Index over OTLP-JSON manifest log lines by (kind, name, namespace) of the manifest
+# in the log body. Each distinct body is indexed once, together with the resource
+# of its first occurrence, repeated sends of an unchanged manifest are skipped.
+class ManifestIndex:
+    def __init__(self):
+        self.line_count = 0
+        self.seen_bodies = set()
+        self.manifests = {}
+
+    def update(self, lines):
+        for json_line in lines[self.line_count:]:
+            for resource in json_line.get('resourceLogs', []):
+                for scope in resource.get('scopeLogs', []):
+                    for log_record in scope.get('logRecords', []):
+                        self._add(resource, log_record.get('body', {}).get('stringValue'))
+        self.line_count = len(lines)
+        return self
+
+    def _add(self, resource, raw_manifest):
+        if raw_manifest is None or raw_manifest in self.seen_bodies:
+            return
+        self.seen_bodies.add(raw_manifest)
+
+        identity = manifest_identity(raw_manifest)
+        if identity is not None:
+            self.manifests.setdefault(identity, []).append((raw_manifest, resource))
+
+    # returns list of (raw manifest, OTLP resourceLogs item) pairs
+    def find(self, kind, name, namespace):
+        return self.manifests.get((kind, name, namespace), [])
@@ -0,0 +1,108 @@
+from telemetry_index import attributes_to_dict, manifest_identity
+
+# Conditions on a single OTLP-JSON line, one export request as the mock file
+# exporter writes it. They are what tests wait for: a metric on a resource
+# with given attributes, a log body containing a text, a manifest.
+
+
+def _as_text(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def _log_bodies(line):
+    for resource in line.get('resourceLogs', []):
+        for scope in resource.get('scopeLogs', []):
+            for log_record in scope.get('logRecords', []):
+                body = log_record.get('body', {}).get('stringValue')
+                if body is not None:
+                    yield resource, body
+
+
+class AnyLine:
+    def matches(self, line):
+        return True
+
+    def __repr__(self):
+        return 'any line'
+
+
+# resource_attributes maps attribute keys to expected values compared as text,
+# so that they can come from URL query parameters
+class MetricPredicate:
+    def __init__(self, name, resource_attributes = None):
+        self.name = name
+        self.resource_attributes = {key: _as_text(value) for key, value in (resource_attributes or {}).items()}
+
+    def matches(self, line):
+        for resource in line.get('resourceMetrics', []):
+            if not self._resource_matches(resource):
+                continue
+            for scope in resource.get('scopeMetrics', []):
+                for metric in scope.get('metrics', []):
+                    if metric.get('name') == self.name:
+                        return True
+        return False
+
+    def _resource_matches(self, resource):
+        if not self.resource_attributes:
+            return True
+        attributes = attributes_to_dict(resource.get('resource', {}).get('attributes', []))
+        return all(key in attributes and _as_text(attributes[key]) == value
+                   for key, value in self.resource_attributes.items())
+
+    def __repr__(self):
+        return f'metric {self.name} {self.resource_attributes}'
+
+
+# exact requires the whole body to equal text, otherwise it has to contain it
+class LogBodyPredicate:
+    def __init__(self, text, exact = False):
+        self.text = text
+        self.exact = exact
+
+    def matches(self, line):
+        if self.exact:
+            return any(body == self.text for _, body in _log_bodies(line))
+        return any(self.text in body for _, body in _log_bodies(line))
+
+    def __repr__(self):
+        return f'log body {"equal to" if self.exact else "containing"} {self.text!r}'
+
+
+# namespace None matches manifests of any namespace, cluster scoped ones included
+class ManifestPredicate:
+    def __init__(self, kind, name, namespace = None):
+        self.kind = kind
+        self.name = name
+        self.namespace = namespace
+
+    def matches(self, line):
+        for _, body in _log_bodies(line):
+            identity = manifest_identity(body)
+            if identity is None:
+                continue
+            kind, name, namespace = identity
+            if kind == self.kind and name == self.name and (self.namespace is None or namespace == self.namespace):
+                return True
+        return False
+
+    def __repr__(self):
+        return f'manifest {self.kind} {self.namespace}/{self.name}'
+
+
+# Builds a predicate from query parameters:
+#   metric=<name>&resource.<key>=<value>...  metric on a matching resource
+#   body=<text>[&exact=true]                 log body containing (or equal to) the text
+#   kind=<kind>&name=<name>[&namespace=<ns>] manifest
+# without any of them every line matches
+def predicate_from_query(query):
+    if 'metric' in query:
+        resource_attributes = {key[len('resource.'):]: value for key, value in query.items() if key.startswith('resource.')}
+        return MetricPredicate(query['metric'], resource_attributes)
+    if 'body' in query:
+        return LogBodyPredicate(query['body'], query.get('exact', '').lower() in ('1', 'true'))
+    if 'kind' in query:
+        return ManifestPredicate(query['kind'], query.get('name'), query.get('namespace'))
+    return AnyLine()
@@ -1,7 +1,8 @@
 import json
 import os
+from kubectl_fixtures import TestWorkloads
 
-from test_utils import get_all_bodies_for_all_sent_content, get_all_resources_for_all_sent_content, get_attribute_key_and_value, get_attributes_of_kvmap, has_attribute_with_key_and_value, retry_until_ok, run_shell_command
+from test_utils import get_all_bodies_for_all_sent_content, get_all_resources_for_all_sent_content, get_attribute_key_and_value, get_attributes_of_kvmap, has_attribute_with_key_and_value, retry_until_ok
 
 
 endpoint = os.getenv("TIMESERIES_MOCK_ENDPOINT", "localhost:8088")
@@ -27,12 +28,11 @@ pod_manifest = {
     }
 }
 
-def setup_function():
-    run_shell_command(f"kubectl run multi-container-pod --overrides '{json.dumps(pod_manifest)}' --image bash:alpine3.19 -n {namespace_name} -- -ec \"while :; do sleep 5 ; done\"")
-
-
-def teardown_function():
-    run_shell_command(f'kubectl delete pod {pod_name} -n {namespace_name}')
+# overrides replace the container with one using an image which cannot be pulled,
+# the test only needs its status to be reported, so readiness is not awaited
+workloads = TestWorkloads()
+workloads.add_pod(pod_name, 'bash:alpine3.19', ['-ec', 'while :; do sleep 5 ; done'], namespace=namespace_name,
+                  overrides=json.dumps(pod_manifest), wait_ready=False)
 
 
 def test_entity_state_events_generated():
@@ -42,8 +42,8 @@ def test_entity_state_events_generated():
 def print_failure(content):
     raw_bodies = get_all_bodies_for_all_sent_content(content)
     print(f'Failed to find expected container within {pod_name}')
-    print('All logs in raw_bodies_dump.txt')
-    with open('raw_bodies_dump.txt', 'w') as file:
+    print('All logs in raw_bodies_dump_entitystateevents.txt')
+    with open('raw_bodies_dump_entitystateevents.txt', 'w') as file:
         json.dump(raw_bodies, file, indent=4)
 
 
@@ -0,0 +1,111 @@
+import json
+from test_utils import IncrementalReader
+
+# Unit tests of IncrementalReader against the file_server fixture (conftest.py),
+# they need no cluster
+
+
+def line(number, text = 'line'):
+    # longer than IncrementalReader.overlap, so re-requested bytes stay within the last line
+    return json.dumps({'number': number, 'text': text, 'padding': 'x' * 80}).encode() + b'\n'
+
+
+def numbers(lines):
+    return [line['number'] for line in lines]
+
+
+def test_appended_lines_are_read_with_overlap(file_server):
+    file_server.write('logs.json', line(1) + line(2))
+    reader = IncrementalReader(file_server.url('logs.json'))
+
+    assert numbers(reader.read()) == [1, 2]
+    offset = reader.offset
+    assert offset == len(file_server.files['logs.json'])
+
+    file_server.append('logs.json', line(3))
+    assert numbers(reader.read()) == [3]
+    assert numbers(reader.lines) == [1, 2, 3]
+    assert file_server.requests == [
+        ('logs.json', None, 200),
+        # the last overlap bytes already read are requested again to detect a rewritten file
+        ('logs.json', f'bytes={offset - IncrementalReader.overlap}-', 206),
+    ]
+
+
+def test_unchanged_file_gets_not_modified(file_server):
+    file_server.write('logs.json', line(1))
+    reader = IncrementalReader(file_server.url('logs.json'))
+    reader.read()
+
+    assert reader.read() == []
+    assert file_server.requests[-1][2] == 304
+    assert numbers(reader.lines) == [1]
+
+
+def test_partially_written_line_is_read_once_complete(file_server):
+    second = line(2)
+    file_server.write('logs.json', line(1) + second[:10])
+    reader = IncrementalReader(file_server.url('logs.json'))
+
+    assert numbers(reader.read()) == [1]
+    assert reader.offset == len(line(1))
+
+    file_server.append('logs.json', second[10:])
+    assert numbers(reader.read()) == [2]
+    assert numbers(reader.lines) == [1, 2]
+
+
+def test_truncated_file_is_read_from_start(file_server):
+    file_server.write('logs.json', line(1) + line(2) + line(3))
+    reader = IncrementalReader(file_server.url('logs.json'))
+    reader.read()
+    old_lines = reader.lines
+
+    file_server.write('logs.json', line(4))
+    assert numbers(reader.read()) == [4]
+    assert numbers(reader.lines) == [4]
+    # readers sharing the lines see the restart as a new list
+    assert reader.lines is not old_lines
+    assert reader.content().lines is reader.lines
+    assert [status for _, _, status in file_server.requests] == [200, 416, 200]
+
+
+def test_rotated_file_is_read_from_start(file_server):
+    file_server.write('logs.json', line(1) + line(2))
+    reader = IncrementalReader(file_server.url('logs.json'))
+    reader.read()
+
+    # longer than what was read, but the already read bytes differ
+    file_server.write('logs.json', line(1, 'rotated') + line(2, 'rotated') + line(3, 'rotated'))
+    new_lines = reader.read()
+
+    assert numbers(new_lines) == [1, 2, 3]
+    assert [line['text'] for line in reader.lines] == ['rotated'] * 3
+    assert reader.offset == len(file_server.files['logs.json'])
+    assert [status for _, _, status in file_server.requests] == [200, 206, 200]
+
+
+def test_rewrite_within_overlap_is_detected(file_server):
+    file_server.write('logs.json', line(1) + line(2))
+    reader = IncrementalReader(file_server.url('logs.json'))
+    reader.read()
+
+    # only the end of the last read line changes, within the re-requested bytes
+    data = file_server.files['logs.json']
+    file_server.write('logs.json', data[:-3] + b'y"}\n' + line(3))
+
+    assert numbers(reader.read()) == [1, 2, 3]
+    assert reader.lines[1]['padding'].endswith('y')
+
+
+def test_whole_file_sent_for_range_request_replaces_lines(file_server):
+    file_server.write('logs.json', line(1))
+    reader = IncrementalReader(file_server.url('logs.json'))
+    reader.read()
+
+    file_server.ignore_range = True
+    file_server.append('logs.json', line(2))
+
+    assert numbers(reader.read()) == [1, 2]
+    assert numbers(reader.lines) == [1, 2]
+    assert reader.offset == len(file_server.files['logs.json'])
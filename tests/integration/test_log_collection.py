@@ -1,34 +1,28 @@
 import pytest
 import os
 import json
-from test_utils import get_all_bodies_for_all_sent_content, retry_until_ok, run_shell_command
+from kubectl_fixtures import TestWorkloads
+from telemetry_predicates import LogBodyPredicate
+from test_utils import get_all_bodies_for_all_sent_content, get_feed
 
 endpoint = os.getenv("TIMESERIES_MOCK_ENDPOINT", "localhost:8088")
 url = f'http://{endpoint}/logs.json'
 pod_name = 'dummy-logging-pod'
 tested_log = 'testlog-swo-k8s-collector-integration-test'
 
-def setup_function():
-    run_shell_command(f'kubectl run {pod_name} --image bash:alpine3.19 -n default -- -ec "while :; do echo \'{tested_log}\'; sleep 5 ; done"')
-
-def teardown_function():
-    run_shell_command(f'kubectl delete pod {pod_name} -n default')
+workloads = TestWorkloads()
+workloads.add_pod(pod_name, 'bash:alpine3.19', ['-ec', f"while :; do echo '{tested_log}'; sleep 5 ; done"])
 
 def test_logs_generated():
-    retry_until_ok(url, assert_test_log_found, print_failure)
-
-def assert_test_log_found(content):
-    raw_bodies = get_all_bodies_for_all_sent_content(content)
-    test_log_found = any(f'{tested_log}' in body for body in raw_bodies)
-    return test_log_found
+    get_feed(url).wait_for(LogBodyPredicate(tested_log, exact=True), print_failure)
 
 def print_failure(content):
     raw_bodies = get_all_bodies_for_all_sent_content(content)
     print(f'Failed to find {tested_log}')
-    print('All logs in raw_bodies_dump.txt')
+    print('All logs in raw_bodies_dump_logs.txt')
     #print(raw_bodies)
     # Dump the raw_bodies to a file
-    with open('raw_bodies_dump.txt', 'w') as file:
+    with open('raw_bodies_dump_logs.txt', 'w') as file:
         # Convert the list to a JSON string for better formatting
         json.dump(raw_bodies, file, indent=4)
 
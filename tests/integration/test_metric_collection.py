@@ -1,10 +1,9 @@
-from prometheus_client import Gauge, Metric
 import pytest
 import os
 import json
-from test_utils import retry_until_ok, get_merged_json, datapoint_value
-from prometheus_client.parser import text_string_to_metric_families
-import difflib
+from prometheus_comparison import OtlpLabelIndex, filter_exposition_lines
+from test_utils import BatchedAssertions, retry_until_ok, get_merged_json, get_metric_index
+from prometheus_client.parser import text_fd_to_metric_families
 
 endpoint = os.getenv("TIMESERIES_MOCK_ENDPOINT", "localhost:8088")
 ci = os.getenv("CI", "")
@@ -25,120 +24,76 @@ def test_expected_metric_names_are_generated():
                    lambda content: assert_metric_names_found(content, expected_metric_names),
                    lambda content: print_failure_metric_names(content, expected_metric_names))
     
-test_cases = [
-]
+expected_telemetry_dir = os.path.join(os.path.dirname(__file__), 'expected_telemetry')
 
 
-@pytest.mark.parametrize("file_name", os.listdir(os.path.join(os.path.dirname(__file__), 'expected_telemetry')))
-def test_expected_otel_message_content_is_generated(file_name):
-    # Skip files that are not JSON
-    if not file_name.endswith('.json'):
-        pytest.skip("Skipping non-JSON file")
+def load_expected_telemetry_case(file_name):
+    with open(os.path.join(expected_telemetry_dir, file_name), 'r') as file:
+        return json.load(file)
 
-    # Construct the full file path
-    file_path = os.path.join(os.path.dirname(__file__), 'expected_telemetry', file_name)
 
-    # Read the JSON file and parse the test case
-    with open(file_path, 'r') as file:
-        test_case = json.load(file)
-
-    # Continue with the rest of the test using the parsed test_case
+def expected_telemetry_assertion(test_case):
     resource_attributes = test_case["resource_attributes"]
     metrics = test_case["metrics"]
+    return lambda content: assert_test_contain_expected_datapoints(content, metrics, resource_attributes)
 
-    metric_names = [item['name'] for item in metrics]
-    print("Checking metrics {} with resource attributes {}".format(metric_names, resource_attributes))
 
-    retry_until_ok(url, 
-                   lambda content: assert_test_contain_expected_datapoints(content, metrics, resource_attributes),
-                   print_failure_otel_content,
-                   timeout=120)
+# All expected_telemetry cases are evaluated together on every download of metrics.json
+expected_telemetry = BatchedAssertions(url)
+for file_name in os.listdir(expected_telemetry_dir):
+    if file_name.endswith('.json'):
+        expected_telemetry.add(file_name, expected_telemetry_assertion(load_expected_telemetry_case(file_name)))
+
+
+@pytest.mark.parametrize("file_name", os.listdir(expected_telemetry_dir))
+def test_expected_otel_message_content_is_generated(file_name):
+    # Skip files that are not JSON
+    if not file_name.endswith('.json'):
+        pytest.skip("Skipping non-JSON file")
+
+    test_case = load_expected_telemetry_case(file_name)
+    metric_names = [item['name'] for item in test_case["metrics"]]
+    print("Checking metrics {} with resource attributes {}".format(metric_names, test_case["resource_attributes"]))
+
+    expected_telemetry.wait_for(file_name, print_failure_otel_content, timeout=120)
 
 def test_no_metric_datapoints_for_internal_containers():
     retry_until_ok(url, assert_test_no_metric_datapoints_for_internal_containers,
                    print_failure_internal_containers)
 
 def assert_test_original_metrics(otelContent):     
-    merged_json = get_merged_json(otelContent)
-
-    #transpose otel to metrics again so we can compare
-    # it will be record "name"-[metrics]
-    metrics = {}
-    for json_line in merged_json:
-        for resource in json_line['resourceMetrics']:
-            resAttributes={}
-            for attr in resource['resource']['attributes']: 
-                resAttributes[attr['key']] = attr['value']['stringValue']
-            for scope in resource['scopeMetrics']:
-                for metric in scope['metrics']:        
-                    metricName = metric['name'].replace('k8s.', '')
-                    if( '.' in metricName ):
-                        continue
-                    m = Metric(metricName, '', 'gauge')
-                    list = metrics.setdefault(m.name, [])
-                    list.append(m)
-                    dataPoints = {}
-                    if( 'gauge' in metric ):
-                        dataPoints = metric['gauge']['dataPoints']
-                    elif ('sum' in metric) :
-                        dataPoints = metric['sum']['dataPoints']                                        
-                    else :
-                        raise Exception('unknown data')
-                
-                    for dataPoint in dataPoints:
-                        attributes = resAttributes.copy()
-                        for attr in dataPoint['attributes']:                    
-                            attributes[attr['key']] = attr['value']['stringValue']
-                        m.add_sample(m.name, attributes, datapoint_value(dataPoint), dataPoint['timeUnixNano'])            
-    
+    # index label sets of otel datapoints by metric name so we can compare them with prometheus series
+    otlp_labels = OtlpLabelIndex().update(get_merged_json(otelContent))
+
     for url in urlMetrics :
-        retry_until_ok(url, lambda metricsContent: assert_prometheus_metrics(metricsContent, metrics), '')
+        retry_until_ok(url, lambda metricsLines: assert_prometheus_metrics(metricsLines, otlp_labels), '', incremental=False, stream=True)
         
     return (True, '')
 
-def assert_prometheus_metrics(metricsContent, metrics):     
-    ok = True
-    error = ''
-    for family in text_string_to_metric_families(metricsContent.decode('utf-8')):
-        if( family.name in metrics):
-            list = metrics[family.name]
-            for sample in family.samples:
-                # try to find metric which has same labels
-                found = False
-                missing_items={}
-                for m in list: 
-                    for s in m.samples:
-                        missing_items = {key: sample.labels[key] for key in set(sample.labels) - set(s.labels) if sample.labels[key] != s.labels.get(key)}
-
-                        # we are dropping metrics with this attribute
-                        if( missing_items.get('container') == 'POD'):
-                            found = True
-                            break
-
-                        # we are removing these prometheus attributes from all datapoints
-                        missing_items.pop('prometheus_replica')
-                        missing_items.pop('prometheus')
-                        missing_items.pop('endpoint', '')
-
-                        #ignore instance,job as they are dropped by mock receiver
-                        missing_items.pop('instance')
-                        missing_items.pop('job')
-
-                        if len(missing_items.items()) == 0:
-                            found = True
-                            break
-                if not found :                    
-                    ok = False
-                    error = f'Metric {sample.name} is missing following attributes:'
-                    for key in missing_items:
-                        error += f'\n\t{key}:{missing_items[key]}'                        
-    
-    return (ok, error)
+# metricsLines are lines of the scrape as they are downloaded, only families
+# present in OTLP output are parsed and only one family is held in memory at a time
+def assert_prometheus_metrics(metricsLines, otlp_labels):     
+    errors = []
+    for family in text_fd_to_metric_families(filter_exposition_lines(metricsLines, otlp_labels)):
+        if family.name not in otlp_labels:
+            continue
 
-def assert_metric_names_found(content, expected_metric_names):
-    merged_json = get_merged_json(content)
+        for sample in family.samples:
+            # we are dropping metrics with this attribute
+            if sample.labels.get('container') == 'POD':
+                continue
+
+            missing_labels = otlp_labels.missing_labels(family.name, sample.labels)
+            if missing_labels:
+                error = f'Metric {sample.name} is missing following attributes:'
+                for key in sorted(missing_labels):
+                    error += f'\n\t{key}:{sample.labels[key]}'
+                errors.append(error)
 
-    metric_names = get_unique_metric_names(merged_json)
+    return (len(errors) == 0, '\n'.join(errors))
+
+def assert_metric_names_found(content, expected_metric_names):
+    metric_names = get_metric_index(content).metric_names
     if len(metric_names) == 0:
         return False
 
@@ -166,109 +121,25 @@ def print_failure_metric_names(content, expected_metric_names):
     print(expected_metric_names)
 
 def assert_test_contain_expected_datapoints(content, metrics, resource_attributes):
-    merged_json = get_merged_json(content)
+    index = get_metric_index(content)
 
     for metric_in_test_case in metrics:
-        test_case_passed = False
-
-        # Loop through each resource
-        for json_line in merged_json:
-            for resource in json_line["resourceMetrics"]:
-                # If the test case has passed, no need to check further resources
-                if test_case_passed:
-                    break
-
-                # Create a dictionary of resource attributes for easier access
-                resource_attr_dict = {
-                    attr["key"]: attr["value"]["stringValue"]
-                    for attr in resource["resource"]["attributes"]
-                }
-
-                # Check if resource has all attributes with non-empty values or specific values
-                attributes_match = True
-                for attribute in resource_attributes:
-                    if isinstance(attribute, dict):
-                        # Check both key and value for dict-type attributes
-                        key = attribute['key']
-                        value = attribute['value']
-                        if not (key in resource_attr_dict and resource_attr_dict[key] == value):
-                            attributes_match = False
-                            break
-                    else:
-                        # Check only key for string-type attributes
-                        if not (attribute in resource_attr_dict and resource_attr_dict[attribute]):
-                            attributes_match = False
-                            break
-
-                if attributes_match:
-                    # Loop through each scope
-                    for scope in resource["scopeMetrics"]:
-                        # Loop through each metric
-                        for metric in scope["metrics"]:
-                            if metric["name"] == metric_in_test_case["name"]:
-                                print(f'Found metric {metric_in_test_case["name"]}')
-                                test_case_passed = True
-
-                                # Default to empty list if 'attributes' key is not present
-                                metric_attributes = metric_in_test_case.get("attributes", [])
-                                if metric_attributes:  # If attributes list is not empty
-                                    
-                                    test_case_passed = False
-
-                                    if 'gauge' in metric:
-                                        dataPoints = metric['gauge']['dataPoints']
-                                    elif 'sum' in metric:
-                                        dataPoints = metric['sum']['dataPoints']
-                                    else:
-                                        raise Exception('unknown data type for metric')
-
-                                    # Loop through each datapoint
-                                    for datapoint in dataPoints:
-                                        datapoint_attr_dict = {
-                                            attr["key"]: attr["value"]["stringValue"]
-                                            for attr in datapoint["attributes"]
-                                        }
-                                        # Check datapoints for the specified attribute keys
-                                        if all(key in datapoint_attr_dict and datapoint_attr_dict[key] for key in metric_in_test_case["attributes"]):
-                                            print("Found datapoint with all attributes")
-                                            test_case_passed = True
-                                            break  # Found the required datapoint, break the loop
-
-                                # If metric is found and no attributes are specified, no need to check datapoints
-                                if test_case_passed:
-                                    break  # Metric found, break the metric loop
-
-                        if test_case_passed:
-                            break  # Metric found, break the scope loop
-
-                if test_case_passed:
-                    break  # Metric found, break the resource loop
-
-            if test_case_passed:
-                break  # Metric found, break the resource loop            
-
-        if not test_case_passed:
+        # Default to empty list if 'attributes' key is not present
+        metric_attributes = metric_in_test_case.get("attributes", [])
+        if not index.has_metric(metric_in_test_case["name"], resource_attributes, metric_attributes):
             return (False, f'Failed to find metric {metric_in_test_case["name"]}')
 
+        print(f'Found metric {metric_in_test_case["name"]}')
+
     return (True, '')
 
 def print_failure_otel_content(content):
     print(f'Failed to find some metrics in some resource groups')
 
-def get_unique_metric_names(merged_json):
-    result = list(set([metric["name"]
-                       for json_line in merged_json
-                       for resource in json_line["resourceMetrics"]
-                       for metric in resource["scopeMetrics"][0]["metrics"]
-                       ]))
-    return result
-
-
 def assert_test_no_metric_datapoints_for_internal_containers(content):
-    merged_json = get_merged_json(content)
+    index = get_metric_index(content)
 
-    container_names = get_unique_container_names(merged_json)
-    if "POD" in container_names:        
+    if index.find_resources([{"key": "k8s.container.name", "value": "POD"}]):
         return (False, 'The response contains datapoints for internal "POD" containers')
     else:
         return (True, '')
@@ -276,13 +147,3 @@ def assert_test_no_metric_datapoints_for_internal_containers(content):
 
 def print_failure_internal_containers(content):
     print(f'Failed to find some of internal pod containers')
-
-def get_unique_container_names(merged_json):
-    container_names = set()
-    for json_line in merged_json:
-        for resource in json_line["resourceMetrics"]:
-            if 'attributes' in resource['resource']:
-                for resource_attribute in resource['resource']['attributes']:
-                    if resource_attribute["key"] == "k8s.container.name":
-                        container_names.add(resource_attribute["value"]["stringValue"])
-    return list(container_names)
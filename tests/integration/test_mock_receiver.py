@@ -0,0 +1,288 @@
+import asyncio
+from aiohttp.test_utils import TestClient, TestServer
+from mock_receiver import TelemetryStore, create_app
+
+# Unit tests of mock_receiver.py, they need no cluster
+
+
+def run_with_client(test):
+    async def run():
+        store = TelemetryStore()
+        async with TestClient(TestServer(create_app(store))) as client:
+            await test(client, store)
+    asyncio.run(run())
+
+
+def log_request(body, log_type = None):
+    attributes = [{'key': 'sw.k8s.log.type', 'value': {'stringValue': log_type}}] if log_type is not None else []
+    return {'resourceLogs': [{
+        'resource': {'attributes': attributes},
+        'scopeLogs': [{'logRecords': [{'body': {'stringValue': body}}]}],
+    }]}
+
+
+def metric_request(name):
+    return {'resourceMetrics': [{
+        'resource': {'attributes': [{'key': 'k8s.pod.name', 'value': {'stringValue': 'pod-1'}}]},
+        'scopeMetrics': [{'metrics': [{'name': name, 'gauge': {'dataPoints': [{'asDouble': 1}]}}]}],
+    }]}
+
+
+async def send_logs(client, *bodies):
+    for body in bodies:
+        response = await client.post('/v1/logs', json=log_request(body))
+        assert response.status == 200
+
+
+def test_file_is_served_with_etag():
+    async def test(client, store):
+        await send_logs(client, 'first')
+
+        response = await client.get('/logs.json')
+        assert response.status == 200
+        assert await response.read() == bytes(store.streams['logs'].data)
+        assert (await response.read()).endswith(b'\n')
+        assert response.headers['ETag'] == store.streams['logs'].etag
+        assert response.headers['Accept-Ranges'] == 'bytes'
+    run_with_client(test)
+
+
+def test_matching_etag_gets_not_modified_until_data_arrives():
+    async def test(client, store):
+        await send_logs(client, 'first')
+        etag = (await client.get('/logs.json')).headers['ETag']
+
+        response = await client.get('/logs.json', headers={'If-None-Match': etag})
+        assert response.status == 304
+
+        await send_logs(client, 'second')
+        response = await client.get('/logs.json', headers={'If-None-Match': etag})
+        assert response.status == 200
+        assert response.headers['ETag'] != etag
+    run_with_client(test)
+
+
+def test_range_gets_partial_content():
+    async def test(client, store):
+        await send_logs(client, 'first')
+        first_length = len(store.streams['logs'].data)
+        await send_logs(client, 'second')
+        length = len(store.streams['logs'].data)
+
+        response = await client.get('/logs.json', headers={'Range': f'bytes={first_length}-'})
+        assert response.status == 206
+        assert response.headers['Content-Range'] == f'bytes {first_length}-{length - 1}/{length}'
+        body = await response.read()
+        assert body == bytes(store.streams['logs'].data[first_length:])
+        assert b'second' in body and b'first' not in body
+    run_with_client(test)
+
+
+def test_range_past_end_is_not_satisfiable():
+    async def test(client, store):
+        await send_logs(client, 'first')
+        length = len(store.streams['logs'].data)
+
+        for start in (length, length + 100):
+            response = await client.get('/logs.json', headers={'Range': f'bytes={start}-'})
+            assert response.status == 416
+            assert response.headers['Content-Range'] == f'bytes */{length}'
+    run_with_client(test)
+
+
+def test_reset_changes_etag_and_shrinks_file():
+    async def test(client, store):
+        await send_logs(client, 'first', 'second')
+        before = await client.get('/logs.json')
+        etag, length = before.headers['ETag'], len(await before.read())
+
+        assert (await client.post('/reset')).status == 200
+        await send_logs(client, 'x')
+
+        response = await client.get('/logs.json', headers={'If-None-Match': etag})
+        assert response.status == 200
+        assert response.headers['ETag'] != etag
+        assert len(await response.read()) < length
+        # a reader continuing at its old offset is told the file got shorter
+        response = await client.get('/logs.json', headers={'Range': f'bytes={length}-'})
+        assert response.status == 416
+    run_with_client(test)
+
+
+def test_etag_differs_after_reset_to_same_length():
+    async def test(client, store):
+        await send_logs(client, 'first')
+        etag = (await client.get('/logs.json')).headers['ETag']
+
+        await client.post('/reset')
+        await send_logs(client, 'other')
+
+        response = await client.get('/logs.json', headers={'If-None-Match': etag})
+        assert response.status == 200
+        assert b'other' in await response.read()
+    run_with_client(test)
+
+
+def test_unknown_stream_is_not_found():
+    async def test(client, store):
+        assert (await client.get('/unknown.json')).status == 404
+        assert (await client.get('/query/unknown')).status == 404
+    run_with_client(test)
+
+
+def test_logs_are_routed_like_filter_processors():
+    async def test(client, store):
+        for body, log_type in (('container log', None), ('pod event', 'event'), ('pod manifest', 'manifest'),
+                               ('entity state', 'entitystateevent'), ('other type', 'other')):
+            response = await client.post('/v1/logs', json=log_request(body, log_type))
+            assert response.status == 200
+
+        async def bodies(stream):
+            response = await client.get(f'/query/{stream}')
+            return [resource['scopeLogs'][0]['logRecords'][0]['body']['stringValue']
+                    for line in (await response.json())['lines'] for resource in line['resourceLogs']]
+
+        assert await bodies('logs') == ['container log', 'other type']
+        # entitystateevent matches the event filter too
+        assert await bodies('events') == ['pod event', 'entity state']
+        assert await bodies('manifests') == ['pod manifest']
+        assert await bodies('entitystateevents') == ['entity state']
+        assert await bodies('metrics') == []
+    run_with_client(test)
+
+
+def test_resources_of_one_request_are_routed_together():
+    async def test(client, store):
+        request = log_request('container log')
+        request['resourceLogs'] += log_request('pod event', 'event')['resourceLogs']
+        await client.post('/v1/logs', json=request)
+
+        assert len(store.streams['logs'].lines) == 1
+        assert len(store.streams['events'].lines) == 1
+        assert len(store.streams['logs'].lines[0]['resourceLogs']) == 1
+    run_with_client(test)
+
+
+def test_query_returns_lines_since_and_filters_them():
+    async def test(client, store):
+        await send_logs(client, 'first', 'second', 'third')
+
+        result = await (await client.get('/query/logs', params={'since': 1})).json()
+        assert result['next'] == 3
+        assert not result['restarted']
+        assert len(result['lines']) == 2
+
+        result = await (await client.get('/query/logs', params={'since': 0, 'body': 'ir'})).json()
+        assert result['next'] == 3
+        assert len(result['lines']) == 2
+
+        # since beyond the received lines, the store was reset in the meantime
+        result = await (await client.get('/query/logs', params={'since': 10})).json()
+        assert result['restarted']
+        assert result['next'] == 3
+    run_with_client(test)
+
+
+def test_query_with_earlier_generation_restarts():
+    async def test(client, store):
+        await send_logs(client, 'first')
+        result = await (await client.get('/query/logs')).json()
+
+        await client.post('/reset')
+        await send_logs(client, 'after reset', 'and more')
+        # since is within the lines received after the reset, only the generation tells
+        response = await client.get('/query/logs', params={'since': result['next'], 'generation': result['generation']})
+        restarted = await response.json()
+        assert restarted['restarted']
+        assert restarted['next'] == 2
+        assert restarted['generation'] != result['generation']
+        assert len(restarted['lines']) == 2
+    run_with_client(test)
+
+
+def test_query_waiting_across_reset_restarts():
+    async def test(client, store):
+        await send_logs(client, 'first')
+        result = await (await client.get('/query/logs')).json()
+        waiting = asyncio.ensure_future(client.get('/query/logs', params={
+            'since': result['next'], 'generation': result['generation'], 'wait': 10}))
+        await asyncio.sleep(0.2)
+
+        await client.post('/reset')
+        await send_logs(client, 'after reset', 'and more')
+        restarted = await (await asyncio.wait_for(waiting, 5)).json()
+        assert restarted['restarted']
+        assert len(restarted['lines']) == 2
+    run_with_client(test)
+
+
+def test_wait_returns_when_matching_line_arrives():
+    async def test(client, store):
+        await send_logs(client, 'unrelated')
+        waiting = asyncio.ensure_future(client.get('/wait/logs', params={'body': 'expected', 'timeout': 10}))
+        await asyncio.sleep(0.2)
+        assert not waiting.done()
+
+        await send_logs(client, 'not yet', 'the expected line')
+        response = await asyncio.wait_for(waiting, 5)
+        assert response.status == 200
+        result = await response.json()
+        assert result['matched']
+        assert result['index'] == 2
+    run_with_client(test)
+
+
+def test_wait_matches_already_received_lines():
+    async def test(client, store):
+        await send_logs(client, 'the expected line', 'later')
+
+        response = await client.get('/wait/logs', params={'body': 'expected', 'timeout': 0})
+        assert response.status == 200
+        assert (await response.json())['index'] == 0
+
+        # since skips lines a caller already saw
+        response = await client.get('/wait/logs', params={'body': 'expected', 'since': 1, 'timeout': 0.2})
+        assert response.status == 408
+    run_with_client(test)
+
+
+def test_wait_times_out_without_match():
+    async def test(client, store):
+        await send_logs(client, 'the expected line is not exactly this')
+
+        response = await client.get('/wait/logs', params={'body': 'the expected line', 'exact': 'true', 'timeout': 0.3})
+        assert response.status == 408
+        result = await response.json()
+        assert not result['matched']
+        assert result['next'] == 1
+    run_with_client(test)
+
+
+def test_metrics_are_indexed():
+    async def test(client, store):
+        await client.post('/v1/metrics', json=metric_request('k8s.pod.cpu.usage'))
+
+        response = await client.get('/index/metrics', params={'name': 'k8s.pod.cpu.usage', 'resource.k8s.pod.name': 'pod-1'})
+        assert (await response.json())['found']
+        response = await client.get('/index/metrics', params={'name': 'k8s.pod.cpu.usage', 'resource.k8s.pod.name': 'pod-2'})
+        assert not (await response.json())['found']
+    run_with_client(test)
+
+
+def test_unsupported_content_type_is_rejected():
+    async def test(client, store):
+        response = await client.post('/v1/logs', data=b'logs', headers={'Content-Type': 'text/plain'})
+        assert response.status == 415
+        assert store.streams['logs'].lines == []
+    run_with_client(test)
+
+
+def test_listeners_see_each_request_once():
+    async def test(client, store):
+        seen = []
+        store.listeners.append(lambda signal, request, received: seen.append(signal))
+        await client.post('/v1/logs', json=log_request('entity state', 'entitystateevent'))
+        await client.post('/v1/metrics', json=metric_request('k8s.pod.cpu.usage'))
+
+        assert seen == ['logs', 'metrics']
+    run_with_client(test)
@@ -0,0 +1,120 @@
+from prometheus_client.parser import text_fd_to_metric_families
+from prometheus_comparison import OtlpLabelIndex, filter_exposition_lines
+
+# Unit tests of the Prometheus/OTLP comparison helpers, they need no cluster
+
+
+def attributes(**values):
+    return [{'key': key, 'value': {'stringValue': value}} for key, value in values.items()]
+
+
+def metrics_line(name, resource_attributes, datapoint_attributes):
+    return {'resourceMetrics': [{
+        'resource': {'attributes': attributes(**resource_attributes)},
+        'scopeMetrics': [{'metrics': [{
+            'name': name,
+            'gauge': {'dataPoints': [{'asDouble': 1, 'attributes': attributes(**datapoint_attributes)}]},
+        }]}],
+    }]}
+
+
+def label_index():
+    return OtlpLabelIndex().update([
+        metrics_line('k8s.container_cpu_usage_seconds_total', {'k8s.pod.name': 'a', 'namespace': 'default'}, {'cpu': 'total'}),
+        metrics_line('k8s.container_spec_cpu_quota', {'namespace': 'default'}, {}),
+        # OTLP only metrics keep their dots and are not compared
+        metrics_line('k8s.pod.cpu.usage', {'namespace': 'default'}, {}),
+    ])
+
+
+def test_families_are_named_without_k8s_prefix():
+    index = label_index()
+
+    assert 'container_cpu_usage_seconds_total' in index
+    assert 'container_spec_cpu_quota' in index
+    assert 'pod.cpu.usage' not in index
+    assert 'k8s.container_spec_cpu_quota' not in index
+
+
+def test_series_with_labels_of_a_datapoint_is_not_missing_any():
+    index = label_index()
+
+    assert index.missing_labels('container_cpu_usage_seconds_total', ['k8s.pod.name', 'namespace', 'cpu']) == frozenset()
+    assert index.missing_labels('container_cpu_usage_seconds_total', ['namespace']) == frozenset()
+
+
+def test_labels_added_by_prometheus_are_ignored():
+    index = label_index()
+    labels = ['namespace', 'prometheus', 'prometheus_replica', 'endpoint', 'instance', 'job']
+
+    assert index.missing_labels('container_spec_cpu_quota', labels) == frozenset()
+
+
+def test_labels_not_on_any_datapoint_are_missing():
+    index = label_index()
+
+    assert index.missing_labels('container_spec_cpu_quota', ['namespace', 'container', 'job']) == frozenset(['container'])
+    # compared with the closest datapoint
+    assert index.missing_labels('container_cpu_usage_seconds_total', ['namespace', 'cpu', 'image']) == frozenset(['image'])
+    # all labels are missing for an unknown family
+    assert index.missing_labels('unknown', ['namespace', 'instance']) == frozenset(['namespace'])
+
+
+def test_lines_added_later_are_indexed():
+    lines = [metrics_line('k8s.container_spec_cpu_quota', {'namespace': 'default'}, {})]
+    index = OtlpLabelIndex().update(lines)
+    assert index.missing_labels('container_spec_cpu_quota', ['namespace', 'container']) == frozenset(['container'])
+
+    lines.append(metrics_line('k8s.container_spec_cpu_quota', {'namespace': 'default'}, {'container': 'app'}))
+    index.update(lines)
+
+    assert index.line_count == 2
+    assert index.missing_labels('container_spec_cpu_quota', ['namespace', 'container']) == frozenset()
+
+
+exposition = '''# HELP container_cpu_usage_seconds_total Cumulative cpu time consumed
+# TYPE container_cpu_usage_seconds_total counter
+container_cpu_usage_seconds_total{cpu="total",namespace="default",instance="node-1"} 3.5
+# HELP container_memory_working_set_bytes Current working set
+# TYPE container_memory_working_set_bytes gauge
+container_memory_working_set_bytes{namespace="default"} 1024
+# HELP apiserver_request_duration_seconds Response latency
+# TYPE apiserver_request_duration_seconds histogram
+apiserver_request_duration_seconds_bucket{le="1"} 2
+apiserver_request_duration_seconds_bucket{le="+Inf"} 3
+apiserver_request_duration_seconds_count 3
+apiserver_request_duration_seconds_sum 1.5
+'''
+
+
+def test_samples_of_other_families_are_dropped():
+    lines = list(filter_exposition_lines(exposition.splitlines(), {'container_cpu_usage_seconds_total'}))
+
+    assert 'container_cpu_usage_seconds_total{cpu="total",namespace="default",instance="node-1"} 3.5' in lines
+    assert not any(line.startswith('container_memory_working_set_bytes') for line in lines)
+    assert not any(line.startswith('apiserver_request_duration_seconds') for line in lines)
+    # HELP and TYPE lines are kept
+    assert '# TYPE container_memory_working_set_bytes gauge' in lines
+
+
+def test_samples_with_suffixes_belong_to_their_family():
+    lines = list(filter_exposition_lines(exposition.splitlines(), {'apiserver_request_duration_seconds'}))
+
+    samples = [line for line in lines if not line.startswith('#')]
+    assert samples == [
+        'apiserver_request_duration_seconds_bucket{le="1"} 2',
+        'apiserver_request_duration_seconds_bucket{le="+Inf"} 3',
+        'apiserver_request_duration_seconds_count 3',
+        'apiserver_request_duration_seconds_sum 1.5',
+    ]
+
+
+def test_filtered_exposition_parses_into_wanted_samples():
+    index = label_index()
+
+    families = {family.name: family for family in text_fd_to_metric_families(filter_exposition_lines(exposition.splitlines(), index))}
+
+    # families without wanted samples are still split correctly, but empty
+    assert [sample.value for sample in families['container_cpu_usage_seconds'].samples] == [3.5]
+    assert families['container_memory_working_set_bytes'].samples == []
+    assert families['apiserver_request_duration_seconds'].samples == []
@@ -0,0 +1,169 @@
+import json
+import threading
+import pytest
+from telemetry_predicates import LogBodyPredicate, predicate_from_query
+from test_utils import FileSource, ReceiverSource, TelemetryFeed, get_feed, session
+
+# Unit tests of TelemetryFeed and its sources against the file_server and
+# mock_receiver fixtures (conftest.py), they need no cluster
+
+
+def log_request(*bodies):
+    return {'resourceLogs': [{
+        'resource': {'attributes': []},
+        'scopeLogs': [{'logRecords': [{'body': {'stringValue': body}} for body in bodies]}],
+    }]}
+
+
+def log_line(*bodies):
+    return json.dumps(log_request(*bodies)).encode() + b'\n'
+
+
+def send_logs(receiver, *bodies):
+    session.post(f'{receiver.base_url}/v1/logs', json=log_request(*bodies)).raise_for_status()
+
+
+def later(seconds, func, *args, **kwargs):
+    timer = threading.Timer(seconds, func, args, kwargs)
+    timer.start()
+    return timer
+
+
+def bodies(line):
+    return [record['body']['stringValue'] for resource in line['resourceLogs']
+            for scope in resource['scopeLogs'] for record in scope['logRecords']]
+
+
+def test_exact_body_predicate_matches_whole_body_only():
+    line = log_request('Started container test-container-1')
+
+    assert LogBodyPredicate('test-container').matches(line)
+    assert not LogBodyPredicate('test-container', exact=True).matches(line)
+    assert LogBodyPredicate('Started container test-container-1', exact=True).matches(line)
+    assert predicate_from_query({'body': 'test-container', 'exact': 'true'}).exact
+    assert not predicate_from_query({'body': 'test-container'}).exact
+
+
+def test_subscription_is_notified_of_already_received_line():
+    feed = TelemetryFeed(source=None)
+    feed.lines.append(log_request('already there'))
+    received = []
+
+    subscription = feed.subscribe(LogBodyPredicate('already'), received.append)
+
+    assert subscription.matched
+    assert received == [feed.lines[0]]
+    assert feed.subscriptions == []
+
+
+def test_dispatch_notifies_each_subscription_once():
+    feed = TelemetryFeed(source=None)
+    first = feed.subscribe(LogBodyPredicate('first'))
+    any_line = feed.subscribe(LogBodyPredicate('line'))
+
+    feed.dispatch([log_request('second line'), log_request('first line')])
+
+    assert bodies(first.line) == ['first line']
+    assert bodies(any_line.line) == ['second line']
+    assert feed.subscriptions == []
+
+
+def test_file_feed_waits_for_late_line(file_server):
+    file_server.write('logs.json', log_line('unrelated'))
+    feed = TelemetryFeed(FileSource(file_server.url('logs.json'), poll_interval=0.05))
+
+    later(0.3, file_server.append, 'logs.json', log_line('Started container late'))
+    line = feed.wait_for(LogBodyPredicate('Started container late', exact=True), timeout=10)
+
+    assert bodies(line) == ['Started container late']
+    # the feed shares the lines the reader keeps
+    assert feed.lines is feed.source.reader.lines
+    assert len(feed.lines) == 2
+
+
+def test_file_feed_does_not_match_substring_of_exact_body(file_server):
+    file_server.write('logs.json', log_line('Started container late-1'))
+    feed = TelemetryFeed(FileSource(file_server.url('logs.json'), poll_interval=0.05))
+    failures = []
+
+    with pytest.raises(ValueError):
+        feed.wait_for(LogBodyPredicate('Started container late', exact=True), failures.append, timeout=0.3)
+
+    assert failures == [feed.content]
+    assert feed.subscriptions == []
+    assert feed.wait_for(LogBodyPredicate('Started container late'), timeout=1)
+
+
+def test_file_feed_restarts_with_rewritten_file(file_server):
+    file_server.write('logs.json', log_line('first') + log_line('second'))
+    feed = TelemetryFeed(FileSource(file_server.url('logs.json'), poll_interval=0.05))
+    feed.wait_for(LogBodyPredicate('second'), timeout=5)
+
+    file_server.write('logs.json', log_line('after rotation'))
+    feed.wait_for(LogBodyPredicate('after rotation'), timeout=5)
+
+    assert [bodies(line) for line in feed.lines] == [['after rotation']]
+    assert feed.content.lines is feed.lines
+
+
+def test_receiver_feed_waits_for_late_line(mock_receiver):
+    send_logs(mock_receiver, 'unrelated')
+    feed = TelemetryFeed(ReceiverSource(mock_receiver.base_url, 'logs', max_wait=5))
+
+    later(0.3, send_logs, mock_receiver, 'Started container late')
+    line = feed.wait_for(LogBodyPredicate('Started container late', exact=True), timeout=10)
+
+    assert bodies(line) == ['Started container late']
+    assert [bodies(line) for line in feed.lines] == [['unrelated'], ['Started container late']]
+
+
+def test_receiver_feed_times_out_without_match(mock_receiver):
+    send_logs(mock_receiver, 'Started container late-1')
+    feed = TelemetryFeed(ReceiverSource(mock_receiver.base_url, 'logs', max_wait=5))
+    failures = []
+
+    with pytest.raises(ValueError):
+        feed.wait_for(LogBodyPredicate('Started container late', exact=True), failures.append, timeout=0.5)
+
+    assert len(failures) == 1
+    assert len(failures[0].lines) == 1
+
+
+def test_receiver_feed_restarts_after_reset(mock_receiver):
+    send_logs(mock_receiver, 'first')
+    send_logs(mock_receiver, 'second')
+    feed = TelemetryFeed(ReceiverSource(mock_receiver.base_url, 'logs', max_wait=5))
+    feed.wait_for(LogBodyPredicate('second'), timeout=5)
+
+    session.post(f'{mock_receiver.base_url}/reset').raise_for_status()
+    # more lines than the feed read before the reset
+    send_logs(mock_receiver, 'after reset')
+    send_logs(mock_receiver, 'and more')
+    send_logs(mock_receiver, 'and even more')
+    feed.wait_for(LogBodyPredicate('even more'), timeout=5)
+
+    assert [bodies(line) for line in feed.lines] == [['after reset'], ['and more'], ['and even more']]
+
+
+def test_get_feed_polls_files_of_other_servers(file_server):
+    file_server.write('logs.json', log_line('first'))
+    url = file_server.url('logs.json')
+
+    feed = get_feed(url)
+
+    assert isinstance(feed.source, FileSource)
+    assert feed.source.reader.url == url
+    assert get_feed(url) is feed
+
+
+def test_get_feed_long_polls_mock_receiver(mock_receiver):
+    feed = get_feed(f'{mock_receiver.base_url}/events.json')
+
+    assert isinstance(feed.source, ReceiverSource)
+    assert feed.source.url == f'{mock_receiver.base_url}/query/events'
+
+    later(0.3, session.post, f'{mock_receiver.base_url}/v1/logs', json={'resourceLogs': [{
+        'resource': {'attributes': [{'key': 'sw.k8s.log.type', 'value': {'stringValue': 'event'}}]},
+        'scopeLogs': [{'logRecords': [{'body': {'stringValue': 'pod scheduled'}}]}],
+    }]})
+    assert bodies(feed.wait_for(LogBodyPredicate('pod scheduled', exact=True), timeout=10)) == ['pod scheduled']
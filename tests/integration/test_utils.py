@@ -1,9 +1,10 @@
-import json
+import otlp_json
 import time
+import random
 import requests
 import traceback
-import subprocess
 import re
+from telemetry_index import ManifestIndex, MetricIndex
 
 def get_all_log_resources(log_bulk):
     result = [resource
@@ -20,67 +21,461 @@ def get_all_bodies(log_bulk):
     return result
 
 def get_all_bodies_for_all_sent_content(content):
-    lines = content.splitlines()
-    log_bulks = [json.loads(line) for line in lines]
+    log_bulks = get_merged_json(content)
     return [get_all_bodies(log_bulk) for log_bulk in log_bulks]
 
 def get_all_resources_for_all_sent_content(content):
-    lines = content.splitlines()
-    log_bulks = [json.loads(line) for line in lines]
+    log_bulks = get_merged_json(content)
     return [get_all_log_resources(log_bulk) for log_bulk in log_bulks]
 
 
-def retry_until_ok(url, func, print_failure, timeout = 600):
-    start_time = time.time()
+# Parsed content of a file written by the mock file exporters, one OTLP-JSON object per line
+# The same instance is handed out by IncrementalReader on every poll, so the
+# index is only updated with lines that arrived since the previous poll.
+class SentContent:
+    def __init__(self, lines):
+        self.lines = lines
+        self._metric_index = None
+        self._manifest_index = None
+
+    def __len__(self):
+        return len(self.lines)
+
+    def metric_index(self):
+        if self._metric_index is None:
+            self._metric_index = MetricIndex()
+        return self._metric_index.update(self.lines)
+
+    def manifest_index(self):
+        if self._manifest_index is None:
+            self._manifest_index = ManifestIndex()
+        return self._manifest_index.update(self.lines)
+
+
+def get_metric_index(content):
+    if not isinstance(content, SentContent):
+        content = SentContent(get_merged_json(content))
+    return content.metric_index()
+
+def get_manifest_index(content):
+    if not isinstance(content, SentContent):
+        content = SentContent(get_merged_json(content))
+    return content.manifest_index()
+
+
+# Shared session so that polling reuses keep-alive connections to the mock services
+session = requests.Session()
+session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=10))
+
+
+# Keeps a byte offset into a file served by the timeseries mock and downloads
+# only data appended since the last read using HTTP Range requests.
+# Offset always points right after a line break, so partially written lines
+# are downloaded again on the next read and only complete lines get parsed.
+# Requests are conditional (ETag/Last-Modified), unchanged file costs a 304.
+class IncrementalReader:
+    # number of already read bytes requested again to detect rotated or rewritten file
+    overlap = 64
+
+    def __init__(self, url):
+        self.url = url
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.tail = b''
+        self.etag = None
+        self.last_modified = None
+        self.lines = []
+        self._content = SentContent(self.lines)
+
+    def read(self):
+        data = self._fetch_new_data()
+        end = data.rfind(b'\n') + 1
+        new_lines = [otlp_json.loads(line) for line in data[:end].splitlines() if line.strip()]
+        self.offset += end
+        self.tail = (self.tail + data[:end])[-self.overlap:]
+        self.lines.extend(new_lines)
+        return new_lines
+
+    def content(self):
+        return self._content
+
+    def _conditional_headers(self):
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def _remember_validators(self, response):
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+
+    def _fetch_new_data(self):
+        if self.offset == 0:
+            return self._fetch_full(self._conditional_headers())
+
+        # Ask for the end of already read data as well, it must be unchanged,
+        # otherwise the file was rotated or rewritten
+        start = self.offset - len(self.tail)
+        headers = self._conditional_headers()
+        headers['Range'] = f'bytes={start}-'
+        response = session.get(self.url, headers=headers)
+        if response.status_code == 304:
+            return b''
+        if response.status_code == 416:
+            print(f'{self.url} is shorter than already read {self.offset} bytes, reading it from start')
+            return self._fetch_full()
+        response.raise_for_status()
+
+        if response.status_code != 206:
+            # server ignored the range and sent the whole file
+            self.reset()
+            self._remember_validators(response)
+            return response.content
+
+        if not response.content.startswith(self.tail):
+            print(f'{self.url} was rewritten, reading it from start')
+            return self._fetch_full()
+
+        self._remember_validators(response)
+        return response.content[len(self.tail):]
+
+    def _fetch_full(self, headers = None):
+        response = session.get(self.url, headers=headers)
+        if response.status_code == 304:
+            return b''
+        response.raise_for_status()
+        self.reset()
+        self._remember_validators(response)
+        return response.content
+
+
+_readers = {}
+
+def get_incremental_reader(url):
+    reader = _readers.get(url)
+    if reader is None:
+        reader = IncrementalReader(url)
+        _readers[url] = reader
+    return reader
+
+
+def stream_lines(response):
+    try:
+        yield from response.iter_lines(decode_unicode=True)
+    finally:
+        response.close()
+
+
+def download_content(url, incremental, stream = False):
+    if incremental:
+        reader = get_incremental_reader(url)
+        reader.read()
+        return reader.content()
+
+    if stream:
+        response = session.get(url, stream=True)
+        response.raise_for_status()
+        response.encoding = response.encoding or 'utf-8'
+        return stream_lines(response)
+
+    response = session.get(url)
+    response.raise_for_status()
+    return response.content
+
+
+# How retry_until_ok waits between attempts: starts with short intervals so
+# that quickly passing asserts do not wait long, backs off exponentially up
+# to max_interval, randomizes intervals by jitter (a fraction of the interval)
+# and gives up once timeout seconds have passed since start(). A policy only
+# holds settings, every start() returns the state of one wait, so one policy
+# can be shared by concurrent waits.
+class PollingPolicy:
+    def __init__(self, initial_interval = 1, max_interval = 10, backoff = 2, jitter = 0.1, timeout = 600):
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.timeout = timeout
+
+    # timeout overrides the policy's timeout for this wait
+    def start(self, timeout = None):
+        return PollingState(self, self.timeout if timeout is None else timeout)
+
+
+class PollingState:
+    def __init__(self, policy, timeout):
+        self.policy = policy
+        self.deadline = time.time() + timeout
+        self.interval = policy.initial_interval
+
+    def expired(self):
+        return time.time() >= self.deadline
+
+    def wait(self):
+        interval = self.interval * random.uniform(1 - self.policy.jitter, 1 + self.policy.jitter)
+        time.sleep(max(0, min(interval, self.deadline - time.time())))
+        self.interval = min(self.interval * self.policy.backoff, self.policy.max_interval)
+
+
+# timeout defaults to the policy's timeout (600 seconds without a policy)
+def retry_until_ok(url, func, print_failure, timeout = None, incremental = True, policy = None, stream = False):
+    state = (policy or PollingPolicy()).start(timeout)
     last_exception = None
     last_error = ''
-    while time.time() - start_time < timeout:
-        is_ok = False
-        response = None
+    content = None
+    evaluated = None
+    is_ok = False
+    while not state.expired():
+        downloaded = False
         try:
-            try: 
-                response = requests.get(url)
-                response.raise_for_status()
+            try:
+                content = download_content(url, incremental, stream)
+                downloaded = True
             except requests.exceptions.RequestException as e:
                 print(f"An error occurred while making the request: {e}")
         except Exception as e:
             last_exception = e
             print(e, traceback.format_exc())
 
-        if response is not None and response.status_code == 200:
-            if( last_error != ''): 
+        # incremental content only grows, the same object with the same length
+        # was already evaluated and nothing new arrived since
+        unchanged = isinstance(content, SentContent) and evaluated == (id(content), len(content))
+        if downloaded and not unchanged:
+            if( last_error != ''):
                 print(last_error)
-            result = func(response.content)
+            result = func(content)
+            if isinstance(content, SentContent):
+                evaluated = (id(content), len(content))
             if( type(result) != tuple):
                 is_ok = result
             else:
                 is_ok = result[0]
                 if( last_error != result[1]):
                     last_error = result[1]
-                    print(last_error)            
-        else:
-            if response is not None:
-                print('Failed to download otel messages. Response code:',
-                    response.status_code)
-
+                    print(last_error)
+        elif not downloaded:
             print('Failed to download otel messages')
-        
+
         if is_ok:
             print(f'Succesfully passed assert')
             return True
         else:
             print('Retrying...')
-            time.sleep(10)
+            state.wait()
+
+    if last_exception is not None:
+        print('Last exception: {}'.format(last_exception))
+
+    if content is not None:
+        print_failure(content)
+
+    raise ValueError("Timed out waiting")
+
+
+# Runs several assertions against the same url, every poll downloads the content
+# once and evaluates all assertions which have not passed yet. A test waiting for
+# one assertion therefore usually finds it already passed by an earlier wait.
+class BatchedAssertions:
+    def __init__(self, url):
+        self.url = url
+        self.assertions = {}
+        self.passed = set()
+        self.errors = {}
+
+    def add(self, name, func):
+        self.assertions[name] = func
+
+    def wait_for(self, name, print_failure, timeout = None, policy = None):
+        if name in self.passed:
+            print(f'Succesfully passed assert')
+            return True
+        return retry_until_ok(self.url, lambda content: self._evaluate(content, name), print_failure, timeout, policy=policy)
+
+    def _evaluate(self, content, name):
+        for pending_name, func in self.assertions.items():
+            if pending_name in self.passed:
+                continue
+            result = func(content)
+            is_ok, error = result if type(result) == tuple else (result, '')
+            if is_ok:
+                self.passed.add(pending_name)
+                self.errors.pop(pending_name, None)
+            else:
+                self.errors[pending_name] = error
+
+        return (name in self.passed, self.errors.get(name, ''))
+
+
+# Push style waiting for telemetry: a test subscribes a predicate (see
+# telemetry_predicates) and is notified once a line matching it arrives.
+# Every arriving line is checked once against all pending subscriptions of
+# the feed instead of every test re-scanning all data received so far, only a
+# new subscription checks the already received lines, once.
+class Subscription:
+    def __init__(self, predicate, callback = None):
+        self.predicate = predicate
+        self.callback = callback
+        self.line = None
+
+    @property
+    def matched(self):
+        return self.line is not None
+
+    def notify(self, line):
+        self.line = line
+        if self.callback is not None:
+            self.callback(line)
+
+
+# Lines of a file served by nginx, polled with IncrementalReader. The reader
+# is shared with retry_until_ok, so the source keeps its own position in it.
+class FileSource:
+    def __init__(self, url, poll_interval = 1):
+        self.reader = get_incremental_reader(url)
+        self.poll_interval = poll_interval
+        self.read_lines = None
+        self.position = 0
+
+    # returns (new lines, whether the file was rewritten and lines start from its beginning)
+    def fetch(self, timeout):
+        self.reader.read()
+        restarted = self.reader.lines is not self.read_lines
+        if restarted:
+            self.read_lines = self.reader.lines
+            self.position = 0
+        lines = self.read_lines[self.position:]
+        self.position = len(self.read_lines)
+        if not lines:
+            time.sleep(max(0, min(self.poll_interval, timeout)))
+        return lines, restarted
+
+    # all lines read so far, kept by the reader anyway, feeds share them instead of copying
+    def content(self):
+        return self.reader.content()
+
+
+# Lines of a stream of mock_receiver.py, long polled so they come right as they arrive.
+# The stream's generation is sent back, so a reset is noticed however many lines arrived after it.
+class ReceiverSource:
+    def __init__(self, base_url, stream, max_wait = 10):
+        self.url = f'{base_url}/query/{stream}'
+        self.max_wait = max_wait
+        self.next = 0
+        self.generation = None
+
+    def fetch(self, timeout):
+        wait = max(0, min(timeout, self.max_wait))
+        params = {'since': self.next, 'wait': wait}
+        if self.generation is not None:
+            params['generation'] = self.generation
+        response = session.get(self.url, params=params, timeout=wait + 30)
+        response.raise_for_status()
+        result = otlp_json.loads(response.content)
+        self.next = result['next']
+        self.generation = result.get('generation')
+        return result['lines'], result.get('restarted', False)
+
+
+class TelemetryFeed:
+    def __init__(self, source):
+        self.source = source
+        self.lines = []
+        self.content = SentContent(self.lines)
+        self.subscriptions = []
+        self._share_source_lines()
+
+    def subscribe(self, predicate, callback = None):
+        subscription = Subscription(predicate, callback)
+        for line in self.lines:
+            if predicate.matches(line):
+                subscription.notify(line)
+                return subscription
+        self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+
+    # Fetches lines arrived since the last call, waiting at most timeout seconds for them
+    def pump(self, timeout):
+        try:
+            lines, restarted = self.source.fetch(timeout)
+        except requests.exceptions.RequestException as e:
+            print(f"An error occurred while making the request: {e}")
+            time.sleep(max(0, min(1, timeout)))
+            return
+        if not self._share_source_lines():
+            if restarted:
+                self.lines.clear()
+            self.lines.extend(lines)
+        self.dispatch(lines)
+
+    # sources keeping all their lines (FileSource) provide them as content, the
+    # feed uses that content instead of a second copy of every line
+    def _share_source_lines(self):
+        if not hasattr(self.source, 'content'):
+            return False
+        self.content = self.source.content()
+        self.lines = self.content.lines
+        return True
+
+    def dispatch(self, lines):
+        for line in lines:
+            if not self.subscriptions:
+                return
+            matched = [subscription for subscription in self.subscriptions if subscription.predicate.matches(line)]
+            for subscription in matched:
+                subscription.notify(line)
+            if matched:
+                self.subscriptions = [subscription for subscription in self.subscriptions if not subscription.matched]
+
+    # Returns the first line matching predicate, print_failure gets the received
+    # content (like with retry_until_ok) before timing out
+    def wait_for(self, predicate, print_failure = None, timeout = 600):
+        subscription = self.subscribe(predicate)
+        deadline = time.time() + timeout
+        while not subscription.matched:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self.unsubscribe(subscription)
+                if print_failure is not None:
+                    print_failure(self.content)
+                raise ValueError(f"Timed out waiting for {predicate}")
+            self.pump(remaining)
+
+        print(f'Succesfully passed assert')
+        return subscription.line
+
+
+def is_mock_receiver(base_url):
+    try:
+        response = session.get(f'{base_url}/health', timeout=5)
+        return response.status_code == 200 and response.json().get('status') == 'ok'
+    except (requests.exceptions.RequestException, ValueError):
+        return False
+
+
+_feeds = {}
+
+# Feed of a mock service file url like http://localhost:8088/metrics.json, fed
+# by mock_receiver.py when it serves the endpoint, otherwise by polling the file
+def get_feed(url):
+    feed = _feeds.get(url)
+    if feed is None:
+        base_url, _, file_name = url.rpartition('/')
+        if is_mock_receiver(base_url):
+            feed = TelemetryFeed(ReceiverSource(base_url, file_name.removesuffix('.json')))
+        else:
+            feed = TelemetryFeed(FileSource(url))
+        _feeds[url] = feed
+    return feed
 
-    if time.time() - start_time >= timeout:
-        if last_exception is not None:
-            print('Last exception: {}'.format(last_exception))
-        
-        if response is not None:
-            print_failure(response.content)
 
-        raise ValueError("Timed out waiting")
-    
 def datapoint_value(datapoint):    
     if "asDouble" in datapoint:
         return datapoint["asDouble"]
@@ -92,19 +487,15 @@ def datapoint_value(datapoint):
         raise Exception('Unknown data point value')
 
 def get_merged_json(content):
+    if isinstance(content, SentContent):
+        return content.lines
+
     result = []
     for line in content.splitlines():
-        result.append(json.loads(line))
+        result.append(otlp_json.loads(line))
 
     return result
 
-# Function to run a shell command and print its output and errors
-def run_shell_command(command):
-    print(f"{command}")
-    result = subprocess.run(command, shell=True, capture_output=True, text=True)
-    print(result.stdout)
-    print(result.stderr)
-
 def has_attribute_with_key_and_value(resource, target_key, expected_value):
     attributes = resource.get("attributes", [])
     for attribute in attributes:
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""Sending queue, batch, memory limiter and disk sizing of the collectors from measured traffic.
+
+values.yaml asks operators to compute every sending queue as
+num_seconds * requests_per_second / requests_per_batch by hand. This computes it,
+and the settings depending on it, from traffic measured by the collectors' own
+telemetry (otelcol_* Prometheus metrics, port 8888) or by
+tests/benchmark/collector_benchmark.py, for a backend outage the collectors should
+ride out without dropping data:
+- send_batch_size grows above the chart default only when a batch fills before the
+  batch timeout, queue_size holds the batches exported during the outage
+- num_consumers keeps up with the traffic and drains the filled queue in --drain-time,
+  assuming --export-latency seconds per export request
+- memory_limiter leaves room for the queued data on top of the measured memory use,
+  the container memory limit for the memory limiter
+- with --offload-to-disk the queue is kept on disk instead: an ephemeral-storage
+  request for the emptyDir of the metrics and events collectors, free space on
+  every node for the node collector's hostPath
+- retry_on_failure.max_elapsed_time covers the outage, otherwise queued batches
+  are dropped after retrying for it
+
+The result is a values overlay for `helm upgrade -f`, validated against
+values.schema.json merged over the chart values.
+"""
+
+import argparse
+import json
+import math
+import re
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from jsonschema import Draft7Validator
+from prometheus_client.parser import text_string_to_metric_families
+from ruamel.yaml import YAML
+
+
+CHART_DIR = Path(__file__).resolve().parent.parent / 'deploy' / 'helm'
+
+# Items the collector got to export: sent, failed to send and refused by a full queue
+METRIC_POINT_COUNTERS = (
+    'otelcol_exporter_sent_metric_points',
+    'otelcol_exporter_send_failed_metric_points',
+    'otelcol_exporter_enqueue_failed_metric_points',
+)
+LOG_RECORD_COUNTERS = (
+    'otelcol_exporter_sent_log_records',
+    'otelcol_exporter_send_failed_log_records',
+    'otelcol_exporter_enqueue_failed_log_records',
+)
+UPTIME_COUNTER = 'otelcol_process_uptime'
+RSS_GAUGES = ('otelcol_process_memory_rss_bytes', 'otelcol_process_memory_rss')
+
+MAX_BATCH_SIZE = 8192
+MIN_CONSUMERS = 2
+# memory_limiter recommends a spike limit of 20% of the limit and the limit at about 80% of the container memory
+SPIKE_FRACTION = 0.2
+LIMITER_SHARE = 0.8
+# Memory of a collector with an empty queue when not measured
+DEFAULT_BASELINE_MIB = 256
+# ephemeral-storage of the collector container besides the queue (logs, writable layer)
+EPHEMERAL_STORAGE_MARGIN_MIB = 256
+
+
+@dataclass(frozen=True)
+class Collector:
+    """Where the settings of one collector live in the chart values.
+
+    `queue` holds sending_queue and retry_on_failure, `memory` holds memory_limiter and
+    resources, `batches` maps each exported signal to the parent of its batch settings.
+    """
+
+    queue: Tuple[str, ...]
+    memory: Tuple[str, ...]
+    batches: Tuple[Tuple[str, Tuple[str, ...]], ...]
+    disk: Optional[str]
+
+
+DISCOVERY = ('otel', 'metrics', 'autodiscovery', 'discovery_collector')
+
+COLLECTORS = {
+    'metrics': Collector(('otel', 'metrics'), ('otel', 'metrics'), (('metrics', ('otel', 'metrics')),),
+                         'offload_to_disk'),
+    'events': Collector(('otel', 'events'), ('otel', 'events'), (('logs', ('otel', 'events')),), 'offload_to_disk'),
+    # the node collector runs on every node, rates are per node
+    'node': Collector(('otel', 'node_collector'), ('otel', 'logs'),
+                      (('logs', ('otel', 'logs')), ('metrics', ('otel', 'metrics'))), 'persistent_storage'),
+    'discovery': Collector(DISCOVERY, DISCOVERY, (('metrics', DISCOVERY),), None),
+}
+
+
+@dataclass
+class Traffic:
+    """Items one collector instance exports per second and its memory use."""
+
+    metric_points: float = 0.0
+    log_records: float = 0.0
+    memory_mib: Optional[float] = None
+
+    def rate(self, signal: str) -> float:
+        return self.metric_points if signal == 'metrics' else self.log_records
+
+    def busiest(self, other: 'Traffic') -> 'Traffic':
+        """Combine measurements of instances of the same collector, sizing for the busiest one."""
+        memory = [m for m in (self.memory_mib, other.memory_mib) if m is not None]
+        return Traffic(max(self.metric_points, other.metric_points), max(self.log_records, other.log_records),
+                       max(memory) if memory else None)
+
+
+def parse_duration(text: Any) -> float:
+    """Seconds of a Go style duration like 300s, 1m30s or 500ms (plain numbers are seconds)."""
+    if isinstance(text, (int, float)):
+        return float(text)
+    units = {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', text)
+    if not parts or ''.join(number + unit for number, unit in parts) != text.strip():
+        if re.fullmatch(r'\d+(\.\d+)?', text.strip()):
+            return float(text)
+        raise ValueError(f"Invalid duration: {text}")
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+def parse_mebibytes(quantity: Any) -> float:
+    """MiB of a Kubernetes quantity like 512Mi, 3Gi or 1G (plain numbers are bytes)."""
+    units = {'Ki': 2**10, 'Mi': 2**20, 'Gi': 2**30, 'Ti': 2**40, 'k': 10**3, 'M': 10**6, 'G': 10**9, 'T': 10**12}
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([KMGT]i|[kMGT])?', str(quantity).strip())
+    if not match:
+        raise ValueError(f"Invalid quantity: {quantity}")
+    return float(match.group(1)) * units.get(match.group(2), 1) / 2**20
+
+
+def parse_exposition(text: str) -> Dict[str, List[Tuple[Dict[str, str], float]]]:
+    """Samples of a Prometheus text exposition by sample name."""
+    samples: Dict[str, List[Tuple[Dict[str, str], float]]] = {}
+    for family in text_string_to_metric_families(text):
+        for sample in family.samples:
+            samples.setdefault(sample.name, []).append((sample.labels, sample.value))
+    return samples
+
+
+def counter_value(samples: Dict[str, List[Tuple[Dict[str, str], float]]], name: str,
+                  exporter: Optional[str] = None) -> float:
+    """Sum of a counter over its series, of one exporter only when given.
+
+    Collectors expose counters with or without the _total suffix depending on their version.
+    """
+    series = samples.get(f'{name}_total', samples.get(name, []))
+    return sum(value for labels, value in series if exporter is None or labels.get('exporter') == exporter)
+
+
+def traffic_between(before: Optional[Dict[str, List[Tuple[Dict[str, str], float]]]],
+                    after: Dict[str, List[Tuple[Dict[str, str], float]]], seconds: Optional[float],
+                    exporter: str) -> Traffic:
+    """Traffic between two scrapes, or the average since the collector started without an earlier one."""
+    if before is None or counter_value(after, UPTIME_COUNTER) < counter_value(before, UPTIME_COUNTER):
+        before, seconds = {}, counter_value(after, UPTIME_COUNTER)
+    if not seconds:
+        raise ValueError(f"No {UPTIME_COUNTER} in the collector telemetry, cannot compute rates")
+
+    def rate(names):
+        return sum(counter_value(after, name, exporter) - counter_value(before, name, exporter) for name in names) / seconds
+
+    rss = next((after[name][0][1] for name in RSS_GAUGES if after.get(name)), None)
+    return Traffic(rate(METRIC_POINT_COUNTERS), rate(LOG_RECORD_COUNTERS), rss / 2**20 if rss is not None else None)
+
+
+def measure_collector(source: str, interval: float, exporter: str) -> Traffic:
+    """Traffic of one collector instance from its telemetry endpoint (scraped twice) or a saved scrape."""
+    if source.startswith(('http://', 'https://')):
+        def scrape():
+            response = requests.get(source, timeout=30)
+            response.raise_for_status()
+            return parse_exposition(response.text)
+
+        before = scrape()
+        time.sleep(interval)
+        return traffic_between(before, scrape(), interval, exporter)
+
+    with open(source, 'r') as f:
+        return traffic_between(None, parse_exposition(f.read()), None, exporter)
+
+
+def traffic_from_benchmark(path: Path) -> Dict[str, Traffic]:
+    """Traffic per configuration of a collector_benchmark.py --output file.
+
+    The benchmark runs one node collector with the traffic of a single node, its results are per node already.
+    """
+    with open(path, 'r') as f:
+        benchmark = json.load(f)
+    return {
+        name: Traffic(result['datapoints_per_second'], result['log_records_per_second'], result.get('rss_max_mib'))
+        for name, result in benchmark['results'].items()
+    }
+
+
+def deep_merge(base: Dict[str, Any], overlay: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge values like Helm does, maps recursively and everything else replaced."""
+    merged = dict(base)
+    for key, value in overlay.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def get_path(values: Dict[str, Any], path: Tuple[str, ...]) -> Dict[str, Any]:
+    for key in path:
+        values = values.get(key) or {}
+    return values
+
+
+def set_path(values: Dict[str, Any], path: Tuple[str, ...], settings: Dict[str, Any]):
+    for key in path:
+        values = values.setdefault(key, {})
+    values.update(deep_merge(values, settings))
+
+
+def batch_size(rate: float, timeout: float, default: int) -> int:
+    """Batch size filled within the batch timeout, never below the chart default."""
+    if rate * timeout <= default:
+        return default
+    return min(MAX_BATCH_SIZE, 2 ** math.ceil(math.log2(rate * timeout)))
+
+
+def batches_per_second(rate: float, size: int, timeout: float) -> float:
+    """Batches a batch processor sends, by size under load and by timeout otherwise."""
+    return max(rate / size, 1 / timeout) if rate > 0 else 0.0
+
+
+def recommend_batches(traffic: Dict[str, Traffic], values: Dict[str, Any]) -> Dict[Tuple[str, ...], Dict[str, Any]]:
+    """Batch settings per batch values path, sized for the busiest collector sharing them."""
+    batches = {}
+    for name, collector_traffic in traffic.items():
+        for signal, path in COLLECTORS[name].batches:
+            current = get_path(values, path)['batch']
+            timeout = parse_duration(current.get('timeout', '1s'))
+            size = batch_size(collector_traffic.rate(signal), timeout, current['send_batch_size'])
+            if path not in batches or size > batches[path]['send_batch_size']:
+                batches[path] = {'send_batch_size': size, 'send_batch_max_size': size, 'timeout': timeout}
+    return batches
+
+
+def recommend_collector(name: str, traffic: Traffic, values: Dict[str, Any],
+                        batches: Dict[Tuple[str, ...], Dict[str, Any]],
+                        args: argparse.Namespace) -> Tuple[Dict[str, Any], List[str]]:
+    """Values overlay of one collector and the lines summarizing how it was sized."""
+    collector = COLLECTORS[name]
+    offload = args.offload_to_disk and collector.disk is not None
+    overlay: Dict[str, Any] = {}
+
+    batch_rate = sum(batches_per_second(traffic.rate(signal), batches[path]['send_batch_size'], batches[path]['timeout'])
+                     for signal, path in collector.batches)
+    queued_mib = args.outage * args.headroom * (traffic.metric_points * args.metric_point_bytes
+                                               + traffic.log_records * args.log_record_bytes) / 2**20
+    queue_size = max(1, math.ceil(args.outage * args.headroom * batch_rate))
+    consumers = max(MIN_CONSUMERS, math.ceil((batch_rate + queue_size / args.drain_time) * args.export_latency))
+    queue: Dict[str, Any] = {'enabled': True, 'num_consumers': consumers, 'queue_size': queue_size}
+    if collector.disk == 'offload_to_disk':
+        queue['offload_to_disk'] = offload
+    elif collector.disk == 'persistent_storage':
+        queue['persistent_storage'] = {'enabled': offload}
+    set_path(overlay, collector.queue, {'sending_queue': queue})
+
+    retry = get_path(values, collector.queue)['retry_on_failure']
+    max_elapsed_time = parse_duration(retry.get('max_elapsed_time', 0))
+    if not retry.get('enabled') or 0 < max_elapsed_time < args.outage:
+        set_path(overlay, collector.queue, {'retry_on_failure': {
+            'enabled': True, 'max_elapsed_time': f'{math.ceil(max(args.outage, max_elapsed_time))}s'}})
+
+    baseline_mib = traffic.memory_mib if traffic.memory_mib is not None else DEFAULT_BASELINE_MIB
+    limit_mib = math.ceil((baseline_mib + (0 if offload else queued_mib)) / (1 - SPIKE_FRACTION))
+    container_mib = math.ceil(limit_mib / LIMITER_SHARE)
+    resources: Dict[str, Any] = {'limits': {'memory': f'{container_mib}Mi'}}
+    requested_memory = get_path(values, collector.memory).get('resources', {}).get('requests', {}).get('memory')
+    if requested_memory is not None and parse_mebibytes(requested_memory) > container_mib:
+        resources['requests'] = {'memory': f'{container_mib}Mi'}
+    disk_mib = math.ceil(queued_mib)
+    if offload and collector.disk == 'offload_to_disk':
+        resources.setdefault('requests', {})['ephemeral-storage'] = f'{disk_mib + EPHEMERAL_STORAGE_MARGIN_MIB}Mi'
+    set_path(overlay, collector.memory, {
+        'memory_limiter': {'limit_mib': limit_mib, 'spike_limit_mib': math.ceil(limit_mib * SPIKE_FRACTION)},
+        'resources': resources,
+    })
+
+    summary = [
+        f"{name}: {traffic.metric_points:.1f} metric points/s, {traffic.log_records:.1f} log records/s, "
+        f"{batch_rate:.2f} batches/s",
+        f"  queue of {queue_size} batches, about {disk_mib} MiB {'on disk' if offload else 'in memory'}",
+        f"  memory with empty queue {baseline_mib:.0f} MiB" + ('' if traffic.memory_mib is not None else ' (assumed)'),
+    ]
+    if offload and collector.disk == 'persistent_storage':
+        directory = get_path(values, collector.queue)['sending_queue']['persistent_storage']['directory']
+        summary.append(f"  needs {disk_mib} MiB free in {directory} on every node")
+    if args.offload_to_disk and collector.disk is None:
+        summary.append("  cannot offload its queue to disk, kept in memory")
+    return overlay, summary
+
+
+def validate(values: Dict[str, Any], schema_path: Path) -> List[str]:
+    """Descriptions of the violations of the chart's values schema."""
+    with open(schema_path, 'r') as f:
+        validator = Draft7Validator(json.load(f))
+    errors = sorted(validator.iter_errors(values), key=lambda error: [str(part) for part in error.absolute_path])
+    return [f"{'.'.join(str(part) for part in error.absolute_path)}: {error.message}" for error in errors]
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Size sending queues and collector memory from measured traffic")
+    parser.add_argument('--outage', required=True, help="backend outage to buffer without data loss, e.g. 30m")
+    parser.add_argument('--prometheus', action='append', default=[], metavar='COLLECTOR=SOURCE',
+                        help=f"telemetry of a collector ({', '.join(COLLECTORS)}): URL of its otelcol_* metrics, "
+                             f"scraped twice, or a file with a saved scrape; repeat for more instances")
+    parser.add_argument('--benchmark', type=Path, help="results of tests/benchmark/collector_benchmark.py --output")
+    parser.add_argument('--interval', type=float, default=60, help="seconds between the two scrapes of a URL")
+    parser.add_argument('--exporter', default='otlp', help="exporter sending to SolarWinds Observability")
+    parser.add_argument('--values', type=Path, action='append', default=[], help="values file the chart is deployed with")
+    parser.add_argument('--chart', type=Path, default=CHART_DIR, help="Helm chart directory")
+    parser.add_argument('--drain-time', help="time to send the filled queue after the outage (default: --outage)")
+    parser.add_argument('--export-latency', type=float, default=0.5, help="seconds of one export request")
+    parser.add_argument('--headroom', type=float, default=1.2, help="factor of traffic growth to size for")
+    parser.add_argument('--metric-point-bytes', type=int, default=600, help="memory of a queued metric point")
+    parser.add_argument('--log-record-bytes', type=int, default=1500, help="memory of a queued log record")
+    parser.add_argument('--offload-to-disk', action='store_true', help="keep the queues on disk instead of in memory")
+    parser.add_argument('--output', type=Path, help="write the values overlay to this file instead of stdout")
+    args = parser.parse_args()
+    args.outage = parse_duration(args.outage)
+    args.drain_time = parse_duration(args.drain_time) if args.drain_time else args.outage
+
+    traffic = traffic_from_benchmark(args.benchmark) if args.benchmark else {}
+    for measurement in args.prometheus:
+        name, _, source = measurement.partition('=')
+        if name not in COLLECTORS or not source:
+            parser.error(f"--prometheus expects COLLECTOR=SOURCE with COLLECTOR one of {', '.join(COLLECTORS)}")
+        measured = measure_collector(source, args.interval, args.exporter)
+        traffic[name] = traffic[name].busiest(measured) if name in traffic else measured
+    traffic = {name: measured for name, measured in traffic.items() if name in COLLECTORS}
+    if not traffic:
+        parser.error("no traffic measured, pass --prometheus or --benchmark")
+
+    yaml = YAML(typ='safe')
+    with open(args.chart / 'values.yaml', 'r') as f:
+        values = yaml.load(f)
+    for values_file in args.values:
+        with open(values_file, 'r') as f:
+            values = deep_merge(values, yaml.load(f) or {})
+
+    batches = recommend_batches(traffic, values)
+    overlay: Dict[str, Any] = {}
+    for path, batch in batches.items():
+        set_path(overlay, path, {'batch': {key: batch[key] for key in ('send_batch_size', 'send_batch_max_size')}})
+    summary = [f"Sized for a {args.outage:.0f}s outage drained in {args.drain_time:.0f}s"]
+    for name, measured in traffic.items():
+        collector_overlay, collector_summary = recommend_collector(name, measured, values, batches, args)
+        overlay = deep_merge(overlay, collector_overlay)
+        summary += collector_summary
+
+    errors = validate(deep_merge(values, overlay), args.chart / 'values.schema.json')
+    if errors:
+        print("Values overlay does not match values.schema.json:", file=sys.stderr)
+        for error in errors:
+            print(f"  {error}", file=sys.stderr)
+        sys.exit(1)
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        output.write(''.join(f'# {line}\n' for line in summary))
+        yaml = YAML()
+        yaml.default_flow_style = False
+        yaml.dump(overlay, output)
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
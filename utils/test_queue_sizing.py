@@ -0,0 +1,55 @@
+import json
+import sys
+
+import pytest
+from ruamel.yaml import YAML
+
+import queue_sizing
+
+
+BENCHMARK = {
+    'version': 1,
+    'parameters': {'cluster': {'nodes': 10, 'pods_per_node': 30, 'containers_per_pod': 2}},
+    'results': {
+        'metrics': {'datapoints_per_second': 2000.0, 'log_records_per_second': 0.0, 'rss_max_mib': 300.0},
+        'node': {'datapoints_per_second': 3000.0, 'log_records_per_second': 500.0, 'rss_max_mib': 200.0},
+    },
+}
+
+
+def run_calculator(tmp_path, monkeypatch, *args):
+    benchmark_path = tmp_path / 'benchmark.json'
+    benchmark_path.write_text(json.dumps(BENCHMARK))
+    output_path = tmp_path / 'overlay.yaml'
+    monkeypatch.setattr(sys, 'argv', ['queue_sizing.py', '--benchmark', str(benchmark_path),
+                                      '--output', str(output_path), *args])
+    queue_sizing.main()
+    return YAML(typ='safe').load(output_path.read_text())
+
+
+def test_node_results_are_used_per_node(tmp_path, monkeypatch):
+    overlay = run_calculator(tmp_path, monkeypatch, '--outage', '10m')
+
+    # 3000 metric points/s in batches of 4096 (filled within the 1s timeout) and 500 log records/s
+    # sent every second by timeout, 2 batches/s * 600s * 1.2 headroom
+    assert overlay['otel']['metrics']['batch']['send_batch_size'] == 4096
+    assert overlay['otel']['node_collector']['sending_queue']['queue_size'] == 1440
+    # (200 MiB + 600s * 1.2 * (3000 * 600 + 500 * 1500) bytes) / 0.8
+    assert overlay['otel']['logs']['memory_limiter']['limit_mib'] == 2439
+    assert overlay['otel']['node_collector']['retry_on_failure']['max_elapsed_time'] == '600s'
+
+
+def test_offloaded_queue_gets_disk_instead_of_memory(tmp_path, monkeypatch):
+    overlay = run_calculator(tmp_path, monkeypatch, '--outage', '10m', '--offload-to-disk')
+
+    metrics = overlay['otel']['metrics']
+    assert metrics['sending_queue']['offload_to_disk'] is True
+    # memory with an empty queue only, 600s * 1.2 * 2000 * 600 bytes of queue on disk
+    assert metrics['memory_limiter']['limit_mib'] == 375
+    assert metrics['resources']['requests']['ephemeral-storage'] == f'{824 + queue_sizing.EPHEMERAL_STORAGE_MARGIN_MIB}Mi'
+    assert overlay['otel']['node_collector']['sending_queue']['persistent_storage'] == {'enabled': True}
+
+
+@pytest.mark.parametrize('text,seconds', [('300s', 300), ('1m30s', 90), ('500ms', 0.5), ('1h', 3600), ('45', 45)])
+def test_parse_duration(text, seconds):
+    assert queue_sizing.parse_duration(text) == seconds